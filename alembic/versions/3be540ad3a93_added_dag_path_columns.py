@@ -0,0 +1,55 @@
+"""Added dag_path columns to DAGMixin tables
+
+Revision ID: 3be540ad3a93
+Revises: ed0167fff399
+Create Date: 2026-10-18 10:12:31.105000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3be540ad3a93'
+down_revision = 'ed0167fff399'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+tables = ['Tasks', 'Versions', 'Budgets']
+
+
+def upgrade():
+    for table in tables:
+        op.add_column(
+            table,
+            sa.Column('dag_path', sa.String(), nullable=True)
+        )
+        # varchar_pattern_ops lets LIKE 'prefix%' queries use the index
+        op.create_index(
+            op.f('ix_%s_dag_path' % table), table, ['dag_path'],
+            unique=False,
+            postgresql_ops={'dag_path': 'varchar_pattern_ops'}
+        )
+
+        # fill the paths of the existing data
+        op.execute("""
+            with recursive paths(id, dag_path) as (
+                select id, '|'::varchar
+                from "%(table)s"
+                where parent_id is null
+              union all
+                select child.id,
+                    (paths.dag_path || paths.id || '|')::varchar
+                from "%(table)s" as child
+                join paths on child.parent_id = paths.id
+            )
+            update "%(table)s"
+            set dag_path = paths.dag_path
+            from paths
+            where "%(table)s".id = paths.id
+        """ % {'table': table})
+
+
+def downgrade():
+    for table in tables:
+        op.drop_index(op.f('ix_%s_dag_path' % table), table_name=table)
+        op.drop_column(table, 'dag_path')
@@ -0,0 +1,24 @@
+"""Added an index on the resource_id and start columns of TimeLogs
+
+Revision ID: 8f1e2d0c7b4a
+Revises: 3be540ad3a93
+Create Date: 2026-10-18 14:02:47.381000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8f1e2d0c7b4a'
+down_revision = '3be540ad3a93'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index(
+        'ix_TimeLogs_resource_id_start', 'TimeLogs', ['resource_id', 'start'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_TimeLogs_resource_id_start', table_name='TimeLogs')
@@ -0,0 +1,35 @@
+"""Added the ticket number sequence and counter
+
+Revision ID: a7c3e9f1b5d2
+Revises: e2b4d6f8a1c3
+Create Date: 2026-10-18 19:08:54.126000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f1b5d2'
+down_revision = 'e2b4d6f8a1c3'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'Ticket_Number_Counter',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('number', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    op.execute(sa.schema.CreateSequence(sa.Sequence('Tickets_number_seq')))
+    # continue from the current tickets
+    op.execute(
+        'SELECT setval(\'"Tickets_number_seq"\', MAX(number)) '
+        'FROM "Tickets"'
+    )
+
+
+def downgrade():
+    op.execute(sa.schema.DropSequence(sa.Sequence('Tickets_number_seq')))
+    op.drop_table('Ticket_Number_Counter')
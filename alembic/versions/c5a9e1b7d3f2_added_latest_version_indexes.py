@@ -0,0 +1,39 @@
+"""Added indexes to find the latest versions of a take
+
+Revision ID: c5a9e1b7d3f2
+Revises: 8f1e2d0c7b4a
+Create Date: 2026-10-18 15:21:09.204000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c5a9e1b7d3f2'
+down_revision = '8f1e2d0c7b4a'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_index(
+        'ix_Versions_task_id_take_name_version_number', 'Versions',
+        ['task_id', 'take_name', 'version_number'],
+        unique=False
+    )
+    op.create_index(
+        'ix_Versions_published_task_id_take_name_version_number', 'Versions',
+        ['task_id', 'take_name', 'version_number'],
+        unique=False,
+        postgresql_where=sa.text('is_published')
+    )
+
+
+def downgrade():
+    op.drop_index(
+        'ix_Versions_published_task_id_take_name_version_number',
+        table_name='Versions'
+    )
+    op.drop_index(
+        'ix_Versions_task_id_take_name_version_number',
+        table_name='Versions'
+    )
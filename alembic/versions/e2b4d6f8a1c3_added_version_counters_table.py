@@ -0,0 +1,38 @@
+"""Added the Version_Counters table to allocate version numbers
+
+Revision ID: e2b4d6f8a1c3
+Revises: c5a9e1b7d3f2
+Create Date: 2026-10-18 17:42:31.518000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e2b4d6f8a1c3'
+down_revision = 'c5a9e1b7d3f2'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'Version_Counters',
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('take_name', sa.String(length=256), nullable=False),
+        sa.Column('version_number', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['task_id'], ['Tasks.id'], ondelete='CASCADE'
+        ),
+        sa.PrimaryKeyConstraint('task_id', 'take_name')
+    )
+
+    # fill the counters with the current version numbers
+    op.execute(
+        'INSERT INTO "Version_Counters" (task_id, take_name, version_number) '
+        'SELECT task_id, take_name, MAX(version_number) '
+        'FROM "Versions" GROUP BY task_id, take_name'
+    )
+
+
+def downgrade():
+    op.drop_table('Version_Counters')
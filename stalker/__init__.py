@@ -71,7 +71,8 @@ from stalker.models.project import (Project, ProjectUser, ProjectClient,
 from stalker.models.review import Review, Daily, DailyLink
 from stalker.models.repository import Repository
 from stalker.models.scene import Scene
-from stalker.models.schedulers import SchedulerBase, TaskJugglerScheduler
+from stalker.models.schedulers import (SchedulerBase, TaskJugglerScheduler,
+                                      NativeScheduler)
 from stalker.models.sequence import Sequence
 from stalker.models.shot import Shot
 from stalker.models.status import Status, StatusList
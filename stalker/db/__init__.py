@@ -29,7 +29,7 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging_level)
 
 # TODO: Try to get it from the API (it was not working inside a package before)
-alembic_version = 'ed0167fff399'
+alembic_version = 'a7c3e9f1b5d2'
 
 
 def setup(settings=None):
@@ -189,6 +189,8 @@ def create_repo_vars():
     # get all the repositories
     import os
     from stalker import defaults, Repository
+    # the database could be a different one, drop the cached repository roots
+    Repository.clear_repo_cache()
     all_repos = Repository.query.all()
     for repo in all_repos:
         os.environ[defaults.repo_env_var_template % {'id': repo.id}] = \
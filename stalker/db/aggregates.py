@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Stalker a Production Asset Management System
+# Copyright (C) 2009-2018 Erkan Ozgur Yilmaz
+#
+# This file is part of Stalker.
+#
+# Stalker is free software: you can redistribute it and/or modify
+# it under the terms of the Lesser GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+#
+# Stalker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# Lesser GNU General Public License for more details.
+#
+# You should have received a copy of the Lesser GNU General Public License
+# along with Stalker.  If not, see <http://www.gnu.org/licenses/>
+"""Dialect aware aggregation helpers.
+
+The functions in this module emit the native SQL of the database in use to
+aggregate date ranges, so the data doesn't need to be loaded as ORM objects.
+PostgreSQL and SQLite3 are supported natively, the other databases fallback to
+summing the raw column values in Python.
+"""
+
+from sqlalchemy import func, select
+
+from stalker.log import logging_level
+
+import logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging_level)
+
+
+def sum_of_durations(start, end, dialect_name):
+    """Returns an SQL expression that sums the durations between the given
+    start and end columns in seconds, or None if the given dialect is not
+    supported.
+
+    :param start: The start column.
+    :param end: The end column.
+    :param str dialect_name: The name of the database dialect, ``postgresql``
+      or ``sqlite``.
+    """
+    if dialect_name == 'postgresql':
+        return func.extract('epoch', func.sum(end - start))
+    elif dialect_name == 'sqlite':
+        # the dates are stored as UTC strings
+        return func.sum(
+            (func.julianday(end) - func.julianday(start)) * 86400.0
+        )
+    return None
+
+
+def to_seconds(value):
+    """Converts the result of a duration sum to an integer.
+
+    :param value: The result of the :func:`sum_of_durations` expression.
+    """
+    if not value:
+        return 0
+    # julianday arithmetic is not exact
+    return int(round(value))
+
+
+def sum_durations_by(key, start, end, from_obj=None, where=None,
+                     connection=None):
+    """Sums the durations between the given start and end columns, grouped
+    by the given key column, in one query.
+
+    :param key: The column to group the durations with.
+    :param start: The start column.
+    :param end: The end column.
+    :param from_obj: The selectable to select from, use it to join other
+      tables. The default is None which uses the table of the key column.
+    :param where: An optional where clause.
+    :param connection: The connection to run the query with. The default is
+      None which uses the connection of the :class:`.DBSession`, so the query
+      runs in the same transaction with the session.
+    :returns: A dictionary of key values and total seconds, keys with no
+      rows are not included.
+    """
+    if connection is None:
+        from stalker.db.session import DBSession
+        connection = DBSession.connection()
+
+    if from_obj is None:
+        from_obj = key.table
+
+    total = sum_of_durations(start, end, connection.dialect.name)
+    if total is not None:
+        query = select([key, total]).select_from(from_obj).group_by(key)
+        if where is not None:
+            query = query.where(where)
+        return dict(
+            (k, to_seconds(seconds))
+            for k, seconds in connection.execute(query)
+        )
+
+    # fallback to Python, but do not create ORM objects
+    logger.debug(
+        'no native duration sum for %s, summing in Python' %
+        connection.dialect.name
+    )
+    query = select([key, start, end]).select_from(from_obj)
+    if where is not None:
+        query = query.where(where)
+    seconds = {}
+    for k, s, e in connection.execute(query):
+        delta = e - s
+        seconds[k] = seconds.get(k, 0) + delta.days * 86400 + delta.seconds
+    return seconds
+
+
+def logged_seconds(task_ids, connection=None):
+    """Returns the total logged seconds of the given tasks in one query.
+
+    :param list task_ids: A list of Task ids.
+    :param connection: The connection to run the query with. The default is
+      None which uses the connection of the :class:`.DBSession`.
+    :returns: A dictionary of task ids and total logged seconds, every given
+      task id is included.
+    """
+    task_ids = list(task_ids)
+    if not task_ids:
+        return {}
+
+    from stalker.models.task import TimeLog
+    time_logs = TimeLog.__table__
+    seconds = sum_durations_by(
+        time_logs.c.task_id,
+        time_logs.c.start,
+        time_logs.c.end,
+        where=time_logs.c.task_id.in_(task_ids),
+        connection=connection
+    )
+    return dict((task_id, seconds.get(task_id, 0)) for task_id in task_ids)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Stalker a Production Asset Management System
+# Copyright (C) 2009-2018 Erkan Ozgur Yilmaz
+#
+# This file is part of Stalker.
+#
+# Stalker is free software: you can redistribute it and/or modify
+# it under the terms of the Lesser GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+#
+# Stalker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# Lesser GNU General Public License for more details.
+#
+# You should have received a copy of the Lesser GNU General Public License
+# along with Stalker.  If not, see <http://www.gnu.org/licenses/>
+"""Named eager loading profiles.
+
+The relationships of the Stalker models are loaded lazily, so listing a
+couple of hundred tasks and showing their resources, statuses and
+dependencies runs a query per task and per relationship. A loading profile is
+a named bundle of ``joinedload`` / ``selectinload`` options for one of these
+list views, which loads the related data in a fixed number of queries::
+
+  from stalker import Task
+  from stalker.db.loading import with_loading_profile
+  tasks = with_loading_profile(
+      Task.query.filter(Task.project == project), 'task_grid'
+  ).all()
+
+The many-to-one relations to small tables are joined, the collections are
+loaded with ``selectinload`` so the rows of the main query are not
+multiplied. Use :func:`register_loading_profile` to add new profiles.
+"""
+
+from stalker.log import logging_level
+
+import logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging_level)
+
+
+def task_grid_options():
+    """The loader options for listing tasks with their status, type, project,
+    parent, children, resources, responsible, watchers and dependencies.
+    """
+    from sqlalchemy.orm import joinedload, selectinload
+    from stalker.models.task import Task, TaskDependency
+    return [
+        joinedload(Task.status),
+        joinedload(Task.type),
+        selectinload(Task._project),
+        # the responsible of the parent is used when the task has none
+        selectinload(Task.parent).selectinload(Task._responsible),
+        selectinload(Task.children),
+        selectinload(Task.resources),
+        selectinload(Task._responsible),
+        selectinload(Task.watchers),
+        selectinload(Task.task_depends_to)
+        .joinedload(TaskDependency.depends_to),
+    ]
+
+
+def version_browser_options():
+    """The loader options for listing versions with their task, creator,
+    parent, inputs and outputs.
+    """
+    from sqlalchemy.orm import joinedload, selectinload
+    from stalker.models.version import Version
+    return [
+        joinedload(Version.created_by),
+        joinedload(Version.type),
+        selectinload(Version.task),
+        selectinload(Version.parent),
+        selectinload(Version.inputs),
+        selectinload(Version.outputs),
+    ]
+
+
+def review_queue_options():
+    """The loader options for listing reviews with their status, reviewer and
+    task with the status and the project of the task.
+    """
+    from sqlalchemy.orm import joinedload, selectinload
+    from stalker.models.review import Review
+    from stalker.models.task import Task
+    return [
+        joinedload(Review.status),
+        joinedload(Review.reviewer),
+        joinedload(Review.created_by),
+        selectinload(Review.task).joinedload(Task.status),
+        selectinload(Review.task).selectinload(Task._project),
+    ]
+
+
+# the name of the profile -> (the name of the class, options function)
+loading_profiles = {
+    'task_grid': ('Task', task_grid_options),
+    'version_browser': ('Version', version_browser_options),
+    'review_queue': ('Review', review_queue_options),
+}
+
+
+def register_loading_profile(name, class_name, options_function):
+    """Registers a new loading profile or replaces an existing one.
+
+    :param str name: The name of the profile.
+    :param str class_name: The name of the class that the profile can be used
+      with, the queries of the derived classes can also use it.
+    :param options_function: A callable that returns a list of loader options.
+      It is called each time the profile is used, so the models can be
+      imported inside it.
+    """
+    if not callable(options_function):
+        raise TypeError(
+            'options_function should be a callable, not %s' %
+            options_function.__class__.__name__
+        )
+    loading_profiles[name] = (class_name, options_function)
+
+
+def loading_options(name):
+    """Returns the loader options of the given profile.
+
+    :param str name: The name of the profile.
+    """
+    if name not in loading_profiles:
+        raise ValueError(
+            'name should be one of %s, not %s' %
+            (sorted(loading_profiles), name)
+        )
+    return loading_profiles[name][1]()
+
+
+def with_loading_profile(query, name):
+    """Applies the loader options of the given profile to the given query and
+    returns the new query.
+
+    :param query: A query of the class of the profile, like ``Task.query``.
+    :param str name: The name of the profile.
+    """
+    options = loading_options(name)
+    class_name = loading_profiles[name][0]
+    entity = query.column_descriptions[0]['entity']
+    if not any(cls.__name__ == class_name
+               for cls in getattr(entity, '__mro__', [])):
+        raise TypeError(
+            'the %s profile can only be used with %s queries, not %s' %
+            (name, class_name, getattr(entity, '__name__', entity))
+        )
+    return query.options(*options)
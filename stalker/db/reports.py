@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+# Stalker a Production Asset Management System
+# Copyright (C) 2009-2018 Erkan Ozgur Yilmaz
+#
+# This file is part of Stalker.
+#
+# Stalker is free software: you can redistribute it and/or modify
+# it under the terms of the Lesser GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+#
+# Stalker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# Lesser GNU General Public License for more details.
+#
+# You should have received a copy of the Lesser GNU General Public License
+# along with Stalker.  If not, see <http://www.gnu.org/licenses/>
+"""TimeLog reports.
+
+The functions in this module sum the :class:`.TimeLog` durations per user,
+task, project or department over day, week or month buckets in the database,
+without creating any ORM objects, and return compact columnar results.
+
+The time logs are clipped to the working hours of the :class:`.Studio` (or
+the ones given) and every clipped part is counted in the bucket of the day it
+falls in. So a time log that passes midnight is split between two days and
+the overtime is not counted unless ``working_hours_only`` is set to False::
+
+  from stalker.db import reports
+  grid = reports.timesheet(start, end, users=[user1, user2])
+  # grid['keys']    -> [user1.id, user2.id]
+  # grid['buckets'] -> [datetime.date(2018, 1, 1), ...]
+  # grid['seconds'] -> [[28800, 0, ...], [14400, 3600, ...]]
+"""
+
+import datetime
+
+import pytz
+from sqlalchemy import and_, func, literal, select, union_all, Integer
+
+from stalker.log import logging_level
+
+import logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging_level)
+
+
+BUCKETS = ['day', 'week', 'month']
+GROUPS = ['user', 'task', 'project', 'department']
+
+# the windows are summed in chunks of this many windows, one query per chunk,
+# as SQLite allows 500 terms in a compound SELECT
+WINDOWS_PER_QUERY = 400
+
+
+def bucket_of(date, bucket):
+    """Returns the first day of the bucket that the given date is in.
+
+    :param date: A :class:`datetime.date` instance.
+    :param str bucket: One of ``day``, ``week`` (starting on Monday) or
+      ``month``.
+    """
+    if bucket == 'day':
+        return date
+    elif bucket == 'week':
+        return date - datetime.timedelta(days=date.weekday())
+    elif bucket == 'month':
+        return date.replace(day=1)
+    raise ValueError(
+        'bucket should be one of %s, not %s' % (BUCKETS, bucket)
+    )
+
+
+def get_working_hours(working_hours=None):
+    """Returns the working hours dictionary to clip the time logs with.
+
+    :param working_hours: A :class:`.WorkingHours` instance or a dictionary
+      in the same format. The default is None, which uses the working hours
+      of the :class:`.Studio` if there is one or the default working hours.
+    """
+    if working_hours is None:
+        from stalker import Studio
+        from stalker.db.session import DBSession
+        with DBSession.no_autoflush:
+            studio = Studio.query.first()
+        if studio is not None and studio.working_hours is not None:
+            working_hours = studio.working_hours
+
+    if working_hours is None:
+        from stalker import defaults
+        return defaults.working_hours
+
+    # a WorkingHours instance
+    return getattr(working_hours, 'working_hours', working_hours)
+
+
+def working_windows(start, end, bucket='day', working_hours=None,
+                    working_hours_only=True, timezone=None):
+    """Returns the time windows that the time logs are clipped with.
+
+    :param start: The start of the report as a :class:`datetime.datetime`.
+    :param end: The end of the report as a :class:`datetime.datetime`.
+    :param str bucket: One of ``day``, ``week`` or ``month``.
+    :param working_hours: The working hours, see :func:`get_working_hours`.
+    :param bool working_hours_only: If False the whole days are used.
+    :param timezone: The timezone of the working hours and the buckets. The
+      default is None which means UTC.
+    :returns: A tuple of the sorted list of buckets and a list of (bucket
+      index, window start, window end) tuples, the dates are in UTC.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(
+            'bucket should be one of %s, not %s' % (BUCKETS, bucket)
+        )
+
+    if timezone is None:
+        timezone = pytz.utc
+
+    from stalker import defaults
+    if working_hours_only:
+        working_hours = get_working_hours(working_hours)
+
+    def localize(day, minutes):
+        midnight = datetime.datetime.combine(day, datetime.time())
+        if hasattr(timezone, 'localize'):
+            # pytz
+            midnight = timezone.localize(midnight)
+        else:
+            midnight = midnight.replace(tzinfo=timezone)
+        return (midnight + datetime.timedelta(minutes=minutes))\
+            .astimezone(pytz.utc)
+
+    buckets = []
+    windows = []
+    day = start.astimezone(timezone).date()
+    last_day = end.astimezone(timezone).date()
+    while day <= last_day:
+        day_bucket = bucket_of(day, bucket)
+        if not buckets or buckets[-1] != day_bucket:
+            buckets.append(day_bucket)
+
+        if working_hours_only:
+            ranges = working_hours[defaults.day_order[day.weekday()]]
+        else:
+            ranges = [[0, 1440]]
+
+        for range_start, range_end in ranges:
+            window_start = max(localize(day, range_start), start)
+            window_end = min(localize(day, range_end), end)
+            if window_start < window_end:
+                windows.append(
+                    (len(buckets) - 1, window_start, window_end)
+                )
+        day += datetime.timedelta(days=1)
+
+    return buckets, windows
+
+
+def _greatest(a, b, dialect_name):
+    """Returns the SQL expression of the greater one of the given values.
+    """
+    if dialect_name == 'sqlite':
+        return func.max(a, b)
+    return func.greatest(a, b)
+
+
+def _least(a, b, dialect_name):
+    """Returns the SQL expression of the lesser one of the given values.
+    """
+    if dialect_name == 'sqlite':
+        return func.min(a, b)
+    return func.least(a, b)
+
+
+def time_log_totals(by, start, end, bucket='day', keys=None, where=None,
+                    working_hours=None, working_hours_only=True,
+                    timezone=None, connection=None):
+    """Sums the time logs between the given dates per key and bucket in the
+    database. The working windows are summed in chunks of
+    :data:`WINDOWS_PER_QUERY` windows, with one query per chunk.
+
+    :param str by: The key to group the time logs with, one of ``user``,
+      ``task``, ``project`` or ``department``.
+    :param start: The start of the report as a :class:`datetime.datetime`.
+    :param end: The end of the report as a :class:`datetime.datetime`.
+    :param str bucket: One of ``day``, ``week`` (starting on Monday) or
+      ``month``.
+    :param list keys: The ids of the users, tasks, projects or departments to
+      report. The default is None which reports every key that has a time
+      log in the given range.
+    :param where: An optional where clause for the TimeLogs table.
+    :param working_hours: The working hours to clip the time logs with, see
+      :func:`get_working_hours`.
+    :param bool working_hours_only: If False the time logs are not clipped to
+      the working hours but only split between the days.
+    :param timezone: The timezone of the working hours and the buckets. The
+      default is None which means UTC.
+    :param connection: The connection to run the query with. The default is
+      None which uses the connection of the :class:`.DBSession`.
+    :returns: A dictionary with ``keys``, ``buckets`` and ``seconds`` keys.
+      ``seconds`` is a list of rows, one for each key, and each row has the
+      total seconds for each bucket.
+    """
+    if by not in GROUPS:
+        raise ValueError(
+            'by should be one of %s, not %s' % (GROUPS, by)
+        )
+
+    if not isinstance(start, datetime.datetime) \
+       or not isinstance(end, datetime.datetime):
+        raise TypeError(
+            'start and end should be datetime.datetime instances, not %s '
+            'and %s' % (start.__class__.__name__, end.__class__.__name__)
+        )
+
+    buckets, windows = working_windows(
+        start, end, bucket=bucket, working_hours=working_hours,
+        working_hours_only=working_hours_only, timezone=timezone
+    )
+
+    if connection is None:
+        from stalker.db.session import DBSession
+        connection = DBSession.connection()
+
+    from stalker import Task, TimeLog, DepartmentUser
+    time_logs = TimeLog.__table__
+    tasks = Task.__table__
+    department_users = DepartmentUser.__table__
+
+    from_obj = time_logs
+    if by == 'user':
+        key = time_logs.c.resource_id
+    elif by == 'task':
+        key = time_logs.c.task_id
+    elif by == 'project':
+        from_obj = from_obj.join(tasks, time_logs.c.task_id == tasks.c.id)
+        key = tasks.c.project_id
+    else:
+        from_obj = from_obj.join(
+            department_users,
+            time_logs.c.resource_id == department_users.c.uid
+        )
+        key = department_users.c.did
+
+    conditions = [time_logs.c.start < end, time_logs.c.end > start]
+    if keys is not None:
+        keys = list(keys)
+        conditions.append(key.in_(keys))
+    if where is not None:
+        conditions.append(where)
+
+    totals = {}
+    if windows and (keys is None or keys):
+        totals = _sum_over_windows(
+            key, from_obj, and_(*conditions), windows, connection
+        )
+
+    if keys is None:
+        keys = sorted(set(k for k, _ in totals))
+
+    return {
+        'keys': keys,
+        'buckets': buckets,
+        'seconds': [
+            [totals.get((k, i), 0) for i in range(len(buckets))]
+            for k in keys
+        ]
+    }
+
+
+def _sum_over_windows(key, from_obj, where, windows, connection):
+    """Sums the overlapping parts of the time logs and the given windows per
+    key and bucket index.
+
+    :returns: A dictionary of (key, bucket index) tuples and seconds.
+    """
+    from stalker import TimeLog
+    from stalker.db.aggregates import sum_of_durations, to_seconds
+    time_logs = TimeLog.__table__
+    date_type = time_logs.c.start.type
+    dialect_name = connection.dialect.name
+
+    if sum_of_durations(time_logs.c.start, time_logs.c.end,
+                        dialect_name) is not None:
+        # the windows are sent as a compound SELECT and SQLite allows 500
+        # terms at most in it, so long reports are summed in chunks
+        totals = {}
+        for i in range(0, len(windows), WINDOWS_PER_QUERY):
+            chunk = windows[i:i + WINDOWS_PER_QUERY]
+            for k, bucket_index, seconds in _sum_over_window_chunk(
+                    key, from_obj, where, chunk, date_type, dialect_name,
+                    connection):
+                totals[(k, bucket_index)] = \
+                    totals.get((k, bucket_index), 0) + to_seconds(seconds)
+        return totals
+
+    # fallback to Python, but do not create ORM objects
+    logger.debug(
+        'no native duration sum for %s, summing in Python' % dialect_name
+    )
+    query = select([key, time_logs.c.start, time_logs.c.end])\
+        .select_from(from_obj)\
+        .where(where)
+    totals = {}
+    for k, tlog_start, tlog_end in connection.execute(query):
+        for bucket_index, window_start, window_end in windows:
+            delta = min(tlog_end, window_end) - max(tlog_start, window_start)
+            if delta > datetime.timedelta(0):
+                totals[(k, bucket_index)] = \
+                    totals.get((k, bucket_index), 0) + \
+                    delta.days * 86400 + delta.seconds
+    return totals
+
+
+def _sum_over_window_chunk(key, from_obj, where, windows, date_type,
+                           dialect_name, connection):
+    """Runs the native sum of the overlapping parts of the time logs and the
+    given windows and returns the (key, bucket index, seconds) rows.
+    """
+    from stalker import TimeLog
+    from stalker.db.aggregates import sum_of_durations
+    time_logs = TimeLog.__table__
+
+    windows_table = union_all(*[
+        select([
+            literal(bucket_index, Integer).label('bucket'),
+            literal(window_start, date_type).label('window_start'),
+            literal(window_end, date_type).label('window_end')
+        ])
+        for bucket_index, window_start, window_end in windows
+    ]).alias('Windows')
+
+    windowed = from_obj.join(
+        windows_table,
+        and_(
+            time_logs.c.start < windows_table.c.window_end,
+            time_logs.c.end > windows_table.c.window_start
+        )
+    )
+
+    total = sum_of_durations(
+        _greatest(time_logs.c.start, windows_table.c.window_start,
+                  dialect_name),
+        _least(time_logs.c.end, windows_table.c.window_end, dialect_name),
+        dialect_name
+    )
+
+    # only the time logs overlapping this chunk
+    chunk_start = min(window[1] for window in windows)
+    chunk_end = max(window[2] for window in windows)
+    query = select([key, windows_table.c.bucket, total])\
+        .select_from(windowed)\
+        .where(and_(
+            where,
+            time_logs.c.start < chunk_end,
+            time_logs.c.end > chunk_start
+        ))\
+        .group_by(key, windows_table.c.bucket)
+    return connection.execute(query)
+
+
+def timesheet(start, end, users=None, **kwargs):
+    """Returns the timesheet grid of the given users, the working time they
+    logged for each day between the given dates.
+
+    :param start: The start of the report as a :class:`datetime.datetime`.
+    :param end: The end of the report as a :class:`datetime.datetime`.
+    :param list users: A list of :class:`.User` instances or ids. The
+      default is None which reports every user that has a time log in the
+      given range.
+    :param kwargs: The other arguments of :func:`time_log_totals`.
+    :returns: A dictionary with ``keys`` (the user ids), ``buckets`` (the
+      days) and ``seconds`` keys, see :func:`time_log_totals`.
+    """
+    keys = None
+    if users is not None:
+        keys = [getattr(user, 'id', user) for user in users]
+    kwargs.setdefault('bucket', 'day')
+    return time_log_totals('user', start, end, keys=keys, **kwargs)
+
+
+def burn_down(project, start, end, bucket='week', working_hours_only=False,
+              **kwargs):
+    """Returns the burn-down data of the given project, the logged time for
+    each week between the given dates and the remaining schedule after each
+    week.
+
+    :param project: A :class:`.Project` instance.
+    :param start: The start of the report as a :class:`datetime.datetime`.
+    :param end: The end of the report as a :class:`datetime.datetime`.
+    :param str bucket: The default is ``week``.
+    :param bool working_hours_only: The default is False so all the logged
+      time is burned.
+    :param kwargs: The other arguments of :func:`time_log_totals`.
+    :returns: A dictionary with ``buckets``, ``logged_seconds``,
+      ``remaining_seconds`` and ``schedule_seconds`` keys.
+    """
+    from stalker import Task, TimeLog
+    from stalker.db.aggregates import sum_durations_by
+    from stalker.db.session import DBSession
+
+    totals = time_log_totals(
+        'project', start, end, bucket=bucket, keys=[project.id],
+        working_hours_only=working_hours_only, **kwargs
+    )
+    logged_seconds = totals['seconds'][0]
+
+    # the time logged before the report
+    time_logs = TimeLog.__table__
+    tasks = Task.__table__
+    connection = kwargs.get('connection') or DBSession.connection()
+    before = sum_durations_by(
+        tasks.c.project_id,
+        time_logs.c.start,
+        _least(
+            time_logs.c.end, literal(start, time_logs.c.start.type),
+            connection.dialect.name
+        ),
+        from_obj=time_logs.join(tasks, time_logs.c.task_id == tasks.c.id),
+        where=and_(
+            tasks.c.project_id == project.id,
+            time_logs.c.start < start
+        ),
+        connection=connection
+    ).get(project.id, 0)
+
+    schedule_seconds = project.schedule_seconds or 0
+    remaining_seconds = []
+    burned = before
+    for seconds in logged_seconds:
+        burned += seconds
+        remaining_seconds.append(max(schedule_seconds - burned, 0))
+
+    return {
+        'buckets': totals['buckets'],
+        'logged_seconds': logged_seconds,
+        'remaining_seconds': remaining_seconds,
+        'schedule_seconds': schedule_seconds
+    }
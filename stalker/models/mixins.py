@@ -20,10 +20,10 @@ import logging
 
 import pytz
 from sqlalchemy import (Table, Column, String, Integer, ForeignKey, Interval,
-                        Float, Enum)
+                        Float, Enum, Index, event)
 from sqlalchemy.exc import UnboundExecutionError, OperationalError
 from sqlalchemy.ext.declarative import declared_attr
-from sqlalchemy.orm import synonym, relationship, validates
+from sqlalchemy.orm import synonym, relationship, validates, Session
 
 
 from stalker.db.declarative import Base
@@ -562,69 +562,7 @@ class DateRangeMixin(object):
     def _validate_dates(self, start, end, duration):
         """updates the date values
         """
-        # logger.debug('start    : %s' % start)
-        # logger.debug('end      : %s' % end)
-        # logger.debug('duration : %s' % duration)
-
-        from stalker import defaults
-        import datetime
-        if not isinstance(start, datetime.datetime):
-            start = None
-
-        if not isinstance(end, datetime.datetime):
-            end = None
-
-        if not isinstance(duration, datetime.timedelta):
-            duration = None
-
-        # check start
-        if start is None:
-            # try to calculate the start from end and duration
-            if end is None:
-                # set the defaults
-                start = datetime.datetime.now(pytz.utc)
-
-                if duration is None:
-                    # set the defaults
-                    duration = defaults.timing_resolution
-
-                end = start + duration
-            else:
-                if duration is None:
-                    duration = defaults.timing_resolution
-
-                # try:
-                start = end - duration
-                # except OverflowError: # end is datetime.datetime.min
-                #     start = end
-
-        # check end
-        if end is None:
-            if duration is None:
-                duration = defaults.timing_resolution
-
-            end = start + duration
-
-        if end < start:
-            # check duration
-            if duration is None or duration < datetime.timedelta(1):
-                duration = datetime.timedelta(1)
-
-            # try:
-            end = start + duration
-            # except OverflowError: # start is datetime.datetime.max
-            #     end = start
-
-        # round the dates to the timing_resolution
-        rounded_start = self.round_time(start)
-        rounded_end = self.round_time(end)
-        rounded_duration = rounded_end - rounded_start
-
-        if rounded_duration < defaults.timing_resolution:
-            rounded_duration = defaults.timing_resolution
-            rounded_end = rounded_start + rounded_duration
-
-        return rounded_start, rounded_end, rounded_duration
+        return normalize_dates(start, end, duration)
 
     @declared_attr
     def computed_start(cls):
@@ -689,6 +627,81 @@ class DateRangeMixin(object):
             self.computed_duration.seconds
 
 
+def normalize_dates(start, end, duration):
+    """Calculates the missing one of the given start, end and duration values
+    from the others or the defaults and rounds them to the
+    ``defaults.timing_resolution``.
+
+    :param start: A datetime.datetime instance or None.
+    :param end: A datetime.datetime instance or None.
+    :param duration: A datetime.timedelta instance or None.
+    :returns: A tuple of the start, end and duration values.
+    """
+    # logger.debug('start    : %s' % start)
+    # logger.debug('end      : %s' % end)
+    # logger.debug('duration : %s' % duration)
+
+    from stalker import defaults
+    import datetime
+    if not isinstance(start, datetime.datetime):
+        start = None
+
+    if not isinstance(end, datetime.datetime):
+        end = None
+
+    if not isinstance(duration, datetime.timedelta):
+        duration = None
+
+    # check start
+    if start is None:
+        # try to calculate the start from end and duration
+        if end is None:
+            # set the defaults
+            start = datetime.datetime.now(pytz.utc)
+
+            if duration is None:
+                # set the defaults
+                duration = defaults.timing_resolution
+
+            end = start + duration
+        else:
+            if duration is None:
+                duration = defaults.timing_resolution
+
+            # try:
+            start = end - duration
+            # except OverflowError: # end is datetime.datetime.min
+            #     start = end
+
+    # check end
+    if end is None:
+        if duration is None:
+            duration = defaults.timing_resolution
+
+        end = start + duration
+
+    if end < start:
+        # check duration
+        if duration is None or duration < datetime.timedelta(1):
+            duration = datetime.timedelta(1)
+
+        # try:
+        end = start + duration
+        # except OverflowError: # start is datetime.datetime.max
+        #     end = start
+
+    # round the dates to the timing_resolution
+    rounded_start = DateRangeMixin.round_time(start)
+    rounded_end = DateRangeMixin.round_time(end)
+    rounded_duration = rounded_end - rounded_start
+
+    if rounded_duration < defaults.timing_resolution:
+        rounded_duration = defaults.timing_resolution
+        rounded_end = rounded_start + rounded_duration
+
+    return rounded_start, rounded_end, rounded_duration
+
+
 class ProjectMixin(object):
     """Allows connecting a :class:`.Project` to the mixed in object.
 
@@ -1315,15 +1328,16 @@ class ScheduleMixin(object):
         if not unit:
             return None
 
-        lut = {
-            'min': 60,
-            'h': 3600,
-            'd': 86400,
-            'w': 604800,
-            'm': 2419200,
-            'y': 31536000
-        }
+        return timing * cls._get_unit_seconds(model)[unit]
+
+    @classmethod
+    def _get_unit_seconds(cls, model):
+        """Returns a dictionary of the schedule units and their values in
+        seconds for the given schedule model.
 
+        :param str model: The schedule model, for 'effort' and 'length' the
+          units are interpreted as work time, for 'duration' as calendar time.
+        """
         if model in ['effort', 'length']:
             from stalker import defaults
             day_wt = defaults.daily_working_hours * 3600
@@ -1331,7 +1345,7 @@ class ScheduleMixin(object):
             month_wt = 4 * week_wt
             year_wt = int(defaults.yearly_working_days) * day_wt
 
-            lut = {
+            return {
                 'min': 60,
                 'h': 3600,
                 'd': day_wt,
@@ -1340,7 +1354,38 @@ class ScheduleMixin(object):
                 'y': year_wt
             }
 
-        return timing * lut[unit]
+        return {
+            'min': 60,
+            'h': 3600,
+            'd': 86400,
+            'w': 604800,
+            'm': 2419200,
+            'y': 31536000
+        }
+
+    @classmethod
+    def to_seconds_expression(cls, timing, unit, model):
+        """The SQL counterpart of the :meth:`.to_seconds` method. Returns an
+        SQL expression that converts the given schedule columns to seconds,
+        so it can be used in aggregations.
+
+        :param timing: The schedule timing column.
+        :param unit: The schedule unit column.
+        :param model: The schedule model column.
+        """
+        from sqlalchemy import case
+        work_time = cls._get_unit_seconds('effort')
+        calendar_time = cls._get_unit_seconds('duration')
+        return timing * case(
+            [
+                (unit == u, case(
+                    [(model.in_(['effort', 'length']), work_time[u])],
+                    else_=calendar_time[u]
+                ))
+                for u in sorted(calendar_time)
+            ],
+            else_=None
+        )
 
     @property
     def schedule_seconds(self):
@@ -1370,6 +1415,13 @@ class DAGMixin(object):
           __id_column__ = id
 
     Use the :attr:``.__dag_cascade__`` to control the cascade behaviour.
+
+    The ids of the parents of each instance are also stored in the
+    :attr:`.dag_path` column as a materialized path (``|1|5|`` for an instance
+    whose parent has the id 5 and whose grand parent has the id 1, ``|`` for a
+    root instance). It is kept up to date automatically on every flush, and it
+    lets the :attr:`.parents` attribute to be answered with one query instead
+    of one query per level.
     """
 
     __dag_cascade__ = 'all, delete'
@@ -1415,6 +1467,29 @@ class DAGMixin(object):
             """
         )
 
+    @declared_attr
+    def dag_path(cls):
+        dag_path = Column(
+            'dag_path',
+            String,
+            doc="""The materialized path of this %(c)s. It is the ids of the
+            parents of this %(c)s starting from the root and separated with
+            ``|`` characters. It is maintained automatically, so do not set it
+            manually.
+            """ % {
+                'c': cls.__name__
+            }
+        )
+        # the descendants are queried with LIKE 'prefix%', which can only use
+        # the index in PostgreSQL with the pattern operator class unless the
+        # database uses the C collation
+        Index(
+            'ix_%s_dag_path' % cls.__tablename__,
+            dag_path,
+            postgresql_ops={'dag_path': 'varchar_pattern_ops'}
+        )
+        return dag_path
+
     def __init__(self, parent=None, **kwargs):
         self.parent = parent
 
@@ -1472,11 +1547,154 @@ class DAGMixin(object):
         """
         return not self.is_container
 
+    @classmethod
+    def _dag_class(cls):
+        """Returns the class which DAGMixin is directly mixed in, which is the
+        class that holds the ``parent_id`` and ``dag_path`` columns.
+        """
+        for c in cls.__mro__:
+            if DAGMixin in c.__bases__:
+                return c
+        return cls
+
+    @classmethod
+    def _dag_path_from_ids(cls, ids):
+        """Returns the materialized path of the given parent ids
+
+        :param list ids: The ids of the parents starting from the root.
+        """
+        return '|%s' % ''.join('%s|' % i for i in ids)
+
+    @classmethod
+    def _dag_ids_from_path(cls, path):
+        """Returns the parent ids stored in the given materialized path
+
+        :param str path: The materialized path.
+        """
+        return [int(i) for i in path.split('|') if i]
+
+    def _dag_parent_ids(self):
+        """Returns the ids of the parents of this instance starting from the
+        root by using the :attr:`.dag_path`, or None if the stored path can
+        not be trusted, which is the case for instances that are not
+        persisted yet or when there are parent changes which are not flushed
+        yet.
+        """
+        from sqlalchemy import inspect
+        state = inspect(self)
+        if not state.persistent:
+            return None
+
+        dag_class = self._dag_class()
+        for instance in state.session.dirty:
+            if isinstance(instance, dag_class) and \
+               inspect(instance).attrs.parent.history.has_changes():
+                return None
+
+        path = self.dag_path
+        if path is None:
+            return None
+
+        return self._dag_ids_from_path(path)
+
+    def _load_dag_parents(self, parent_ids):
+        """Returns the instances with the given ids by using the instances
+        that are already in the session and loading the rest with one query.
+        Returns None if any of them doesn't exist anymore.
+
+        :param list parent_ids: The ids of the parents.
+        """
+        from sqlalchemy import inspect
+        session = inspect(self).session
+        dag_class = self._dag_class()
+        mapper = inspect(dag_class)
+
+        found = {}
+        missing = []
+        for parent_id in parent_ids:
+            instance = session.identity_map.get(
+                mapper.identity_key_from_primary_key([parent_id])
+            )
+            if instance is not None:
+                found[parent_id] = instance
+            else:
+                missing.append(parent_id)
+
+        if missing:
+            with session.no_autoflush:
+                for instance in session.query(dag_class)\
+                        .filter(dag_class.id.in_(missing)).all():
+                    found[instance.id] = instance
+
+        if len(found) != len(parent_ids):
+            return None
+
+        return [found[parent_id] for parent_id in parent_ids]
+
+    @classmethod
+    def rebuild_dag_paths(cls, connection=None):
+        """Recalculates the :attr:`.dag_path` values of all of the instances
+        of this class from their ``parent_id`` values.
+
+        The paths are maintained automatically, use this only when the
+        ``parent_id`` values are changed with plain SQL statements.
+
+        :param connection: The database connection to run the queries with.
+          The default is None which uses the connection of the DBSession.
+        :returns: The number of instances whose path is updated.
+        """
+        from sqlalchemy import select, bindparam
+        if connection is None:
+            from stalker.db.session import DBSession
+            connection = DBSession.connection()
+
+        table = cls._dag_class().__table__
+        rows = connection.execute(
+            select([table.c.id, table.c.parent_id, table.c.dag_path])
+        ).fetchall()
+
+        parent_ids = dict((r[0], r[1]) for r in rows)
+        paths = {}
+
+        def path_of(id_):
+            # iteratively climb up to the first instance with a known path
+            chain = []
+            while id_ is not None and id_ not in paths:
+                chain.append(id_)
+                id_ = parent_ids.get(id_)
+            path = paths[id_] + '%s|' % id_ if id_ is not None else '|'
+            for i in reversed(chain):
+                paths[i] = path
+                path = '%s%s|' % (path, i)
+
+        for r in rows:
+            if r[0] not in paths:
+                path_of(r[0])
+
+        updates = [
+            {'_id': r[0], '_path': paths[r[0]]}
+            for r in rows if r[2] != paths[r[0]]
+        ]
+        if updates:
+            connection.execute(
+                table.update()
+                .where(table.c.id == bindparam('_id'))
+                .values(dag_path=bindparam('_path')),
+                updates
+            )
+        return len(updates)
+
     @property
     def parents(self):
         """Returns all of the parents of this mixed in class starting from the
         root
         """
+        parent_ids = self._dag_parent_ids()
+        if parent_ids is not None:
+            parents = self._load_dag_parents(parent_ids)
+            if parents is not None:
+                return parents
+
         parents = []
         entity = self.parent
         # TODO: make this a generator
@@ -1555,3 +1773,112 @@ class UnitMixin(object):
             )
 
         return unit
+
+
+@event.listens_for(Session, 'after_flush')
+def update_dag_paths(session, flush_context):
+    """Updates the :attr:`.DAGMixin.dag_path` values of the new and re-parented
+    DAGMixin instances and the descendants of the re-parented ones.
+
+    The paths are updated only once per flush. The other ``after_flush``
+    listeners that read the ``dag_path`` column from the database (like the
+    rollup listener of the Tasks) call this function first, so they do not
+    depend on the registration order of the listeners.
+    """
+    if flush_context.attributes.get('dag_paths_updated'):
+        return
+    flush_context.attributes['dag_paths_updated'] = True
+
+    from sqlalchemy import inspect, select, bindparam, func, literal
+    from sqlalchemy.orm.attributes import set_committed_value
+
+    # use the python ids of the instances as the keys, Entities define their
+    # own __eq__ and __hash__
+    changed = {}
+    for instance in list(session.new) + list(session.dirty):
+        if not isinstance(instance, DAGMixin) or instance in session.deleted:
+            continue
+        attrs = inspect(instance).attrs
+        if instance in session.new \
+           or attrs.parent.history.has_changes() \
+           or attrs.parent_id.history.has_changes():
+            changed[id(instance)] = instance
+
+    if not changed:
+        return
+
+    paths = {}
+
+    def new_path(instance):
+        key = id(instance)
+        if key not in paths:
+            parent = instance.parent
+            if parent is None:
+                paths[key] = '|'
+            else:
+                if id(parent) in changed or parent.dag_path is None:
+                    # also fix the path of the parent if it is missing
+                    changed[id(parent)] = parent
+                    parent_path = new_path(parent)
+                else:
+                    parent_path = parent.dag_path
+                paths[key] = '%s%s|' % (parent_path, parent.id)
+        return paths[key]
+
+    with session.no_autoflush:
+        for instance in list(changed.values()):
+            new_path(instance)
+
+    connection = session.connection()
+
+    # move the descendants of the re-parented instances, parents first
+    reparented = sorted(
+        [instance for instance in changed.values()
+         if instance not in session.new],
+        key=lambda x: paths[id(x)].count('|')
+    )
+    for instance in reparented:
+        table = instance._dag_class().__table__
+        old_path = connection.execute(
+            select([table.c.dag_path]).where(table.c.id == instance.id)
+        ).scalar()
+        path = paths[id(instance)]
+        if old_path is None or old_path == path:
+            continue
+
+        old_prefix = '%s%s|' % (old_path, instance.id)
+        new_prefix = '%s%s|' % (path, instance.id)
+        connection.execute(
+            table.update()
+            .where(table.c.dag_path.like('%s%%' % old_prefix))
+            .values(
+                dag_path=literal(new_prefix, String) +
+                func.substr(table.c.dag_path, len(old_prefix) + 1)
+            )
+        )
+
+        # and the ones that are already loaded
+        dag_class = instance._dag_class()
+        for loaded in list(session.identity_map.values()):
+            loaded_path = loaded.__dict__.get('dag_path')
+            if isinstance(loaded, dag_class) and loaded_path \
+               and loaded_path.startswith(old_prefix):
+                set_committed_value(
+                    loaded, 'dag_path',
+                    new_prefix + loaded_path[len(old_prefix):]
+                )
+
+    updates = {}
+    for key, instance in changed.items():
+        updates.setdefault(instance._dag_class().__table__, []).append(
+            {'_id': instance.id, '_path': paths[key]}
+        )
+        set_committed_value(instance, 'dag_path', paths[key])
+
+    for table, values in updates.items():
+        connection.execute(
+            table.update()
+            .where(table.c.id == bindparam('_id'))
+            .values(dag_path=bindparam('_path')),
+            values
+        )
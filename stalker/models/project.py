@@ -415,6 +415,7 @@ class Project(Entity, ReferenceMixin, StatusMixin, DateRangeMixin, CodeMixin):
             return Task.query \
                 .filter(Task.project == self) \
                 .filter(Task.parent == None) \
+                .order_by(Task.id) \
                 .all()
 
     @property
@@ -473,11 +474,8 @@ class Project(Entity, ReferenceMixin, StatusMixin, DateRangeMixin, CodeMixin):
         """returns an integer representing the total TimeLog seconds recorded
         in child tasks.
         """
-        total_logged_seconds = 0
-        for task in self.root_tasks:
-            if task.total_logged_seconds is None:
-                task.update_schedule_info()
-            total_logged_seconds += task.total_logged_seconds
+        total_logged_seconds = \
+            self.progress_summary['total_logged_seconds']
 
         logger.debug('project.total_logged_seconds: %s' % total_logged_seconds)
 
@@ -488,11 +486,7 @@ class Project(Entity, ReferenceMixin, StatusMixin, DateRangeMixin, CodeMixin):
         """returns an integer showing the total amount of schedule timing of
         the in child tasks in seconds
         """
-        schedule_seconds = 0
-        for task in self.root_tasks:
-            if task.schedule_seconds is None:
-                task.update_schedule_info()
-            schedule_seconds += task.schedule_seconds
+        schedule_seconds = self.progress_summary['schedule_seconds']
 
         logger.debug('project.schedule_seconds: %s' % schedule_seconds)
 
@@ -503,12 +497,143 @@ class Project(Entity, ReferenceMixin, StatusMixin, DateRangeMixin, CodeMixin):
         """returns the percent_complete based on the total_logged_seconds and
         schedule_seconds of the root tasks.
         """
-        total_logged_seconds = self.total_logged_seconds
-        schedule_seconds = self.schedule_seconds
-        if schedule_seconds > 0:
-            return total_logged_seconds / schedule_seconds * 100
-        else:
-            return 0
+        return self.progress_summary['percent_complete']
+
+    @property
+    def progress_summary(self):
+        """returns the progress summary of this project, see
+        :meth:`.get_progress_summaries` for details.
+        """
+        return self.get_progress_summaries([self])[self.id]
+
+    @classmethod
+    def get_progress_summaries(cls, projects):
+        """Returns the progress summaries of the given projects calculated in
+        the database with one query.
+
+        A summary is a dictionary with the following keys:
+
+          * ``total_logged_seconds``: The sum of the TimeLogs of all the tasks
+            of the project.
+          * ``schedule_seconds``: The sum of the schedule seconds of the leaf
+            tasks of the project.
+          * ``percent_complete``: The percentage of the logged seconds to the
+            schedule seconds.
+          * ``status_counts``: A dictionary of :class:`.Status` codes and the
+            number of the tasks having that status.
+
+        :param projects: A list of :class:`.Project` instances.
+        :returns: A dictionary of project ids and summaries.
+        """
+        from sqlalchemy import (select, union_all, literal_column, cast, null,
+                                exists, func, String)
+        from stalker import Task, TimeLog, Status
+        from stalker.db.session import DBSession
+        from stalker.db.aggregates import sum_of_durations, to_seconds
+
+        summaries = {}
+        for project in projects:
+            summaries[project.id] = {
+                'total_logged_seconds': 0,
+                'schedule_seconds': 0,
+                'percent_complete': 0,
+                'status_counts': {}
+            }
+
+        project_ids = list(summaries)
+        if not project_ids:
+            return summaries
+
+        tasks = Task.__table__
+        children = tasks.alias('Child_Tasks')
+        time_logs = TimeLog.__table__
+        statuses = Status.__table__
+
+        with DBSession.no_autoflush:
+            connection = DBSession.connection()
+
+            # schedule seconds of the leaf tasks
+            queries = [
+                select([
+                    literal_column("'schedule_seconds'").label('kind'),
+                    tasks.c.project_id,
+                    cast(null(), String).label('code'),
+                    cast(
+                        func.sum(
+                            Task.to_seconds_expression(
+                                tasks.c.schedule_timing,
+                                tasks.c.schedule_unit,
+                                tasks.c.schedule_model
+                            )
+                        ),
+                        Float
+                    ).label('value')
+                ]).where(
+                    tasks.c.project_id.in_(project_ids)
+                ).where(
+                    ~exists().where(children.c.parent_id == tasks.c.id)
+                ).group_by(tasks.c.project_id),
+
+                # task counts per status
+                select([
+                    literal_column("'status_counts'"),
+                    tasks.c.project_id,
+                    statuses.c.code,
+                    cast(func.count(tasks.c.id), Float)
+                ]).select_from(
+                    tasks.join(statuses, tasks.c.status_id == statuses.c.id)
+                ).where(
+                    tasks.c.project_id.in_(project_ids)
+                ).group_by(tasks.c.project_id, statuses.c.code)
+            ]
+
+            # logged seconds
+            logged_seconds = sum_of_durations(
+                time_logs.c.start, time_logs.c.end, connection.dialect.name
+            )
+            time_logs_join = \
+                time_logs.join(tasks, time_logs.c.task_id == tasks.c.id)
+            time_logs_condition = tasks.c.project_id.in_(project_ids)
+            if logged_seconds is not None:
+                queries.append(
+                    select([
+                        literal_column("'total_logged_seconds'"),
+                        tasks.c.project_id,
+                        cast(null(), String),
+                        cast(logged_seconds, Float)
+                    ]).select_from(
+                        time_logs_join
+                    ).where(
+                        time_logs_condition
+                    ).group_by(tasks.c.project_id)
+                )
+
+            for kind, project_id, code, value in \
+                    connection.execute(union_all(*queries)):
+                if kind == 'status_counts':
+                    summaries[project_id][kind][code] = int(value)
+                else:
+                    summaries[project_id][kind] = to_seconds(value)
+
+            if logged_seconds is None:
+                # no native support, sum them in Python
+                from stalker.db.aggregates import sum_durations_by
+                for project_id, seconds in sum_durations_by(
+                        tasks.c.project_id,
+                        time_logs.c.start,
+                        time_logs.c.end,
+                        from_obj=time_logs_join,
+                        where=time_logs_condition,
+                        connection=connection).items():
+                    summaries[project_id]['total_logged_seconds'] = seconds
+
+        for summary in summaries.values():
+            if summary['schedule_seconds'] > 0:
+                summary['percent_complete'] = \
+                    summary['total_logged_seconds'] / \
+                    float(summary['schedule_seconds']) * 100
+
+        return summaries
 
     @property
     def open_tickets(self):
@@ -28,6 +28,27 @@ import logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging_level)
 
+# the signature of the Repositories table and the prefix trie of the
+# repository root paths as a (signature, trie) tuple, it is built when it is
+# needed and dropped when a Repository is inserted, updated or deleted in this
+# process or the signature changes
+_repo_trie = None
+
+# the index of the root paths of each os in the trie entries
+_repo_root_indices = {'linux': 1, 'windows': 2, 'osx': 3}
+_platform_names = {'Linux': 'linux', 'Windows': 'windows', 'Darwin': 'osx'}
+
+
+def _normalize_path(path):
+    """expands the user and the environment variables in the given path and
+    normalizes it to use forward slashes
+    """
+    return os.path.normpath(
+        os.path.expandvars(
+            os.path.expanduser(path)
+        )
+    ).replace('\\', '/')
+
 
 class Repository(Entity):
     """Manages fileserver/repository related data.
@@ -225,19 +246,13 @@ class Repository(Entity):
                 )
             )
 
-        # expand all variables
-        path = os.path.normpath(
-            os.path.expandvars(
-                os.path.expanduser(path)
-            )
-        ).replace('\\', '/')
+        path = _normalize_path(path)
 
-        if path.startswith(self.windows_path):
-            return path.replace(self.windows_path, replace_with)
-        elif path.startswith(self.linux_path):
-            return path.replace(self.linux_path, replace_with)
-        elif path.startswith(self.osx_path):
-            return path.replace(self.osx_path, replace_with)
+        # replace only the root at the start of the path, the root could also
+        # be somewhere in the middle of it
+        for root in (self.windows_path, self.linux_path, self.osx_path):
+            if root and path.startswith(root):
+                return replace_with + path[len(root):]
 
         return path
 
@@ -282,27 +297,163 @@ class Repository(Entity):
         path = self.to_native_path(path)
         return os.path.relpath(path, self.path).replace('\\', '/')
 
+    @classmethod
+    def _repo_signature(cls, connection):
+        """Returns a signature of the Repositories table which changes
+        whenever a Repository is added, deleted or updated (with its
+        ``date_updated`` attribute is set), it is used to detect the changes
+        done by other sessions or processes.
+
+        :param connection: The database connection to run the query with.
+        :returns: tuple
+        """
+        from sqlalchemy import select, func
+        from stalker import SimpleEntity
+        repositories = Repository.__table__
+        entities = SimpleEntity.__table__
+        return tuple(
+            connection.execute(
+                select([
+                    func.count(repositories.c.id),
+                    func.max(repositories.c.id),
+                    func.max(entities.c.date_updated)
+                ]).select_from(
+                    repositories.join(
+                        entities, repositories.c.id == entities.c.id
+                    )
+                )
+            ).fetchone()
+        )
+
+    @classmethod
+    def _get_repo_trie(cls, rebuild=False):
+        """Returns the prefix trie of the root paths of all the repositories.
+
+        The trie is a dictionary of dictionaries keyed by the path components,
+        the nodes where a root path ends hold a tuple of the id, the linux,
+        windows and osx paths of the repository under the None key. It is
+        built with one query and kept until a Repository is inserted, updated
+        or deleted in this process or the signature of the Repositories
+        table, which is checked with a cheap query on every call, changes.
+        Use :meth:`.clear_repo_cache` after changing a root path with plain
+        SQL without updating the ``date_updated`` column.
+
+        :param bool rebuild: Rebuild the trie even if it is cached.
+        """
+        global _repo_trie
+        from stalker.db.session import DBSession
+        connection = DBSession.connection()
+        signature = cls._repo_signature(connection)
+        if rebuild or _repo_trie is None or _repo_trie[0] != signature:
+            from sqlalchemy import select
+            repositories = Repository.__table__
+            trie = {}
+            for row in connection.execute(
+                    select([
+                        repositories.c.id,
+                        repositories.c.linux_path,
+                        repositories.c.windows_path,
+                        repositories.c.osx_path
+                    ]).order_by(repositories.c.id)):
+                for root in row[1:]:
+                    if not root:
+                        continue
+                    node = trie
+                    for component in root.rstrip('/').split('/'):
+                        node = node.setdefault(component, {})
+                    # the first repository takes precedence for the same root
+                    node.setdefault(None, tuple(row))
+            _repo_trie = (signature, trie)
+        return _repo_trie[1]
+
+    @classmethod
+    def clear_repo_cache(cls):
+        """Drops the cached repository root paths. It is done automatically
+        when a Repository is changed through the ORM, use it after changing
+        the Repositories table with plain SQL.
+        """
+        global _repo_trie
+        _repo_trie = None
+
+    @classmethod
+    def _match_root(cls, trie, components):
+        """Returns the trie entry of the repository that has the longest root
+        path matching the start of the given path components and the number
+        of the matched components, or (None, 0).
+
+        :param dict trie: The trie from :meth:`._get_repo_trie`.
+        :param list components: The path split from the "/" characters.
+        """
+        entry = None
+        depth = 0
+        node = trie
+        # a root path matches only if it is followed by a "/"
+        for i in range(len(components) - 1):
+            node = node.get(components[i])
+            if node is None:
+                break
+            if None in node:
+                entry = node[None]
+                depth = i + 1
+        return entry, depth
+
+    @classmethod
+    def _find_repo_id(cls, trie, path):
+        """Returns the id of the repository that has the longest root path
+        matching the start of the given path, or None.
+
+        :param dict trie: The trie from :meth:`._get_repo_trie`.
+        :param str path: The path with the environment variables expanded.
+        """
+        components = path.replace('\\', '/').split('/')
+        entry, depth = cls._match_root(trie, components)
+        if entry:
+            return entry[0]
+
     @classmethod
     def find_repo(cls, path):
         """returns the repository from the given path
 
+        The repositories are looked up from a prefix trie of their root
+        paths, so it doesn't query all the repositories for every path. If
+        the roots of more than one repository match, the repository with the
+        longest root is returned.
+
         :param str path: path in a repository
         :return: stalker.models.repository.Repository
         """
-        # path could be using environment variables so expand them
-        path = os.path.expandvars(path)
-
-        # first find the repository
-        repos = Repository.query.all()
-        found_repo = None
-        for repo in repos:
-            if path.startswith(repo.path) \
-               or path.startswith(repo.windows_path) \
-               or path.startswith(repo.linux_path) \
-               or path.startswith(repo.osx_path):
-                found_repo = repo
+        return cls.find_repos([path])[0]
+
+    @classmethod
+    def find_repos(cls, paths):
+        """Returns the repositories of the given paths at once. The
+        repositories are loaded with one query, plus a query to check if the
+        cached root paths are up to date.
+
+        :param list paths: A list of paths.
+        :returns: A list of :class:`.Repository` instances or None for the
+          paths that are not in any repository, in the order of the paths.
+        """
+        # paths could be using environment variables so expand them
+        paths = [os.path.expandvars(path) for path in paths]
+
+        for rebuild in (False, True):
+            trie = cls._get_repo_trie(rebuild=rebuild)
+            repo_ids = [cls._find_repo_id(trie, path) for path in paths]
+            ids = set(repo_id for repo_id in repo_ids if repo_id is not None)
+            repos = {}
+            if ids:
+                repos = dict(
+                    (repo.id, repo)
+                    for repo in Repository.query
+                    .filter(Repository.id.in_(ids)).all()
+                )
+            if len(repos) == len(ids):
                 break
-        return found_repo
+            # the trie is out of date, a repository is deleted by another
+            # session or in a rolled back transaction
+
+        return [repos.get(repo_id) for repo_id in repo_ids]
 
     @classmethod
     def to_os_independent_path(cls, path):
@@ -312,13 +463,71 @@ class Repository(Entity):
         :param path: path to make OS independent
         :return:
         """
-        # find the related repo
-        repo = cls.find_repo(path)
+        return cls.to_os_independent_paths([path])[0]
 
-        if repo:
-            return '$%s/%s' % (repo.env_var, repo.make_relative(path))
-        else:
-            return path
+    @classmethod
+    def to_os_independent_paths(cls, paths):
+        """Makes the given paths OS independent at once, see
+        :meth:`.to_os_independent_path`.
+
+        :param list paths: A list of paths.
+        :returns: A list of OS independent paths, in the order of the paths.
+        """
+        paths = list(paths)
+        result = []
+        for path, repo in zip(paths, cls.find_repos(paths)):
+            if repo:
+                path = '$%s/%s' % (repo.env_var, repo.make_relative(path))
+            result.append(path)
+        return result
+
+    @classmethod
+    def translate_paths(cls, paths, target='native'):
+        """Converts the given paths to the given os, it is the batch version of
+        the :meth:`.to_linux_path`, :meth:`.to_windows_path`,
+        :meth:`.to_osx_path` and :meth:`.to_native_path` methods that works
+        with the paths of all the repositories.
+
+        The root paths of the repositories are loaded once and the converted
+        paths are yielded one by one, so it can be used with long iterables.
+        The paths that are not in any repository are yielded normalized.
+
+        :param paths: An iterable of paths.
+        :param str target: The os to convert the paths to, one of "linux",
+          "windows", "osx" or "native", the default is "native".
+        :returns: A generator of the converted paths.
+        """
+        if target == 'native':
+            target = _platform_names.get(platform.system(), target)
+
+        if target not in _repo_root_indices:
+            raise ValueError(
+                "target should be one of ['linux', 'windows', 'osx', "
+                "'native'], not %s" % target
+            )
+
+        return cls._translate_paths(paths, _repo_root_indices[target])
+
+    @classmethod
+    def _translate_paths(cls, paths, index):
+        """the generator of the :meth:`.translate_paths`
+        """
+        from stalker import __string_types__
+        trie = cls._get_repo_trie()
+        for path in paths:
+            if not isinstance(path, __string_types__):
+                raise TypeError(
+                    '%s.path should be a string, not %s' % (
+                        cls.__name__, path.__class__.__name__
+                    )
+                )
+
+            path = _normalize_path(path)
+            components = path.split('/')
+            entry, depth = cls._match_root(trie, components)
+            if entry:
+                path = entry[index] + '/'.join(components[depth:])
+            yield path
 
     @property
     def env_var(self):
@@ -349,3 +558,12 @@ def receive_after_insert(mapper, connection, repo):
     logger.debug('auto creating env var for Repository with id: %s' % repo.id)
     from stalker import defaults
     os.environ[defaults.repo_env_var_template % {'id': repo.id}] = repo.path
+
+
+@event.listens_for(Repository, 'after_insert')
+@event.listens_for(Repository, 'after_update')
+@event.listens_for(Repository, 'after_delete')
+def invalidate_repo_trie(mapper, connection, repo):
+    """drops the cached repository root paths when a Repository is changed
+    """
+    Repository.clear_repo_cache()
@@ -25,7 +25,6 @@ from sqlalchemy.orm import relationship, validates, synonym
 from stalker.db.declarative import Base
 from stalker.db.session import DBSession
 from stalker.log import logging_level
-from stalker.models import walk_hierarchy
 from stalker.models.entity import Entity, SimpleEntity
 from stalker.models.link import Link
 from stalker.models.status import Status
@@ -281,29 +280,19 @@ class Review(SimpleEntity, ScheduleMixin, StatusMixin):
                 self.task.schedule_timing = timing
                 self.task.schedule_unit = unit
 
-            # update task parent statuses
-            self.task.update_parent_statuses()
-
-            from stalker import TaskDependency
-            # update dependent task statuses
-
-            for dep in walk_hierarchy(self.task, 'dependent_of', method=1):
-                logger.debug('current TaskDependency object: %s' % dep)
-                dep.update_status_with_dependent_statuses()
-                if dep.status.code in ['HREV', 'PREV', 'DREV', 'OH', 'STOP']:
+            # update the statuses of the dependent tasks and the parents in
+            # bulk
+            from stalker import Task
+            for task in Task.propagate_statuses([self.task]):
+                logger.debug('current Task object: %s' % task)
+                if task.status.code in ['HREV', 'PREV', 'DREV', 'OH', 'STOP']:
                     # for tasks that are still be able to continue to work,
                     # change the dependency_target to "onstart" to allow
                     # the two of the tasks to work together and still let the
                     # TJ to be able to schedule the tasks correctly
-                    with DBSession.no_autoflush:
-                        tdeps = TaskDependency.query\
-                            .filter_by(depends_to=dep).all()
-                    for tdep in tdeps:
+                    for tdep in task.task_dependent_of:
                         tdep.dependency_target = 'onstart'
 
-                # also update the status of parents of dependencies
-                dep.update_parent_statuses()
-
         else:
             logger.debug('not all reviews are finalized yet!')
 
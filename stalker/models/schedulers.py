@@ -16,14 +16,26 @@
 # You should have received a copy of the Lesser GNU General Public License
 # along with Stalker.  If not, see <http://www.gnu.org/licenses/>
 
+import codecs
 import os
 import subprocess
 import tempfile
+import threading
 import datetime
+import heapq
+import itertools
+import random
 import time
 import csv
 
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
 import pytz
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 
 from stalker.log import logging_level
 
@@ -32,16 +44,166 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging_level)
 
 
+# The query used to gather all the task data of a Project to render its tjp
+# representation. It is PostgreSQL specific.
+TJP_TASKS_QUERY = """select
+    "Tasks".id,
+    tasks.path,
+    coalesce("Tasks".parent_id, "Tasks".project_id) as parent_id,
+    tasks.entity_type,
+    tasks.name,
+    "Tasks".priority,
+    "Tasks".schedule_timing,
+    "Tasks".schedule_unit,
+    "Tasks".schedule_model,
+    "Tasks".allocation_strategy,
+    "Tasks".persistent_allocation,
+    tasks.depth,
+    task_resources.resource_ids,
+    task_alternative_resources.resource_ids as alternative_resource_ids,
+    time_logs.time_log_array,
+    task_dependencies.dependency_info,
+    not exists (
+       select 1
+        from "Tasks" as "Child_Tasks"
+        where "Child_Tasks".parent_id = "Tasks".id
+    ) as is_leaf
+from "Tasks"
+join (
+    with recursive recursive_task(id, parent_id, path_as_text, path, depth) as (
+        select
+            id,
+            parent_id,
+            id::text as path_as_text,
+            array[project_id] as path,
+            0
+        from "Tasks"
+        where parent_id is NULL and project_id = :id
+    union all
+        select
+            task.id,
+            task.parent_id,
+            (parent.path_as_text || '-' || task.id) as path_as_text,
+            (parent.path || task.parent_id) as path,
+            parent.depth + 1 as depth
+        from "Tasks" as task
+        join recursive_task as parent on task.parent_id = parent.id
+    ) select
+        recursive_task.id,
+        recursive_task.parent_id,
+        recursive_task.path_as_text,
+        recursive_task.path,
+        "SimpleEntities".name as name,
+        "SimpleEntities".entity_type,
+        recursive_task.depth
+    from recursive_task
+    join "SimpleEntities" on recursive_task.id = "SimpleEntities".id
+    --order by path_as_text
+) as tasks on "Tasks".id = tasks.id
+
+-- resources
+left outer join (
+    select
+        task_id,
+        array_agg(resource_id order by resource_id) as resource_ids
+    from "Task_Resources"
+    group by task_id
+) as task_resources on "Tasks".id = task_resources.task_id
+
+-- alternative resources
+left outer join (
+    select
+        task_id,
+        array_agg(resource_id order by resource_id) as resource_ids
+    from "Task_Alternative_Resources"
+    group by task_id
+) as task_alternative_resources on "Tasks".id = task_alternative_resources.task_id
+
+-- time logs
+left outer join (
+    select
+        "TimeLogs".task_id,
+        array_agg(('User_' || "TimeLogs".resource_id, to_char(cast("TimeLogs".start at time zone 'utc' as timestamp), 'YYYY-MM-DD-HH24:MI:00'), to_char(cast("TimeLogs".end at time zone 'utc' as timestamp), 'YYYY-MM-DD-HH24:MI:00'))) as time_log_array
+    from "TimeLogs"
+    group by task_id
+) as time_logs on "Tasks".id = time_logs.task_id
+
+-- dependencies
+left outer join (
+    select
+        task_id,
+        array_agg((tasks.alt_path, dependency_target, gap_timing, gap_unit, gap_model)) dependency_info
+    from "Task_Dependencies"
+    join (
+        with recursive recursive_task(id, parent_id, alt_path) as (
+            select
+                id,
+                parent_id,
+                project_id::text as alt_path
+            from "Tasks"
+            where parent_id is NULL
+        union all
+            select
+                task.id,
+                task.parent_id,
+                (parent.alt_path || '-' || task.parent_id) as alt_path
+            from "Tasks" as task
+            join recursive_task as parent on task.parent_id = parent.id
+        ) select
+            recursive_task.id,
+            recursive_task.parent_id,
+            recursive_task.alt_path || '-' || recursive_task.id as alt_path
+        from recursive_task
+        join "SimpleEntities" on recursive_task.id = "SimpleEntities".id
+    ) as tasks on "Task_Dependencies".depends_to_id = tasks.id
+    group by task_id
+) as task_dependencies on "Tasks".id = task_dependencies.task_id
+
+--order by "Tasks".id
+order by path_as_text"""
+
+# The placeholder that the tasks are rendered in to the main tjp template,
+# used to split the template in streaming mode.
+TJP_TASKS_MARKER = '\x00tasks\x00'
+
+# Cache of the rendered tjp fragments of Projects, used by the incremental
+# mode of the TaskJugglerScheduler. The keys are the project ids and the
+# values are (signature, fragment) tuples.
+_tjp_fragment_cache = {}
+
+# Ids of the Projects that are changed in this process since their tjp
+# fragment is cached.
+_dirty_project_ids = set()
+
+
+def parse_tj_date(date_str):
+    """Parses the given TaskJuggler date string in ``%Y-%m-%d-%H:%M`` format
+    and returns a datetime.datetime instance in UTC.
+
+    It is a lot faster than ``datetime.datetime.strptime()`` as the format
+    is fixed.
+
+    :param str date_str: The date string.
+    """
+    return datetime.datetime(
+        int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10]),
+        int(date_str[11:13]), int(date_str[14:16]), tzinfo=pytz.utc
+    )
+
+
 class SchedulerBase(object):
     """This is the base class for schedulers.
 
     All the schedulers should be derived from this class.
     """
 
-    def __init__(self, studio=None):
+    def __init__(self, studio=None, projects=None):
         self._studio = None
         self.studio = studio
 
+        self._projects = []
+        self.projects = projects
+
     def _validate_studio(self, studio_in):
         """validates the given studio_in value
         """
@@ -73,6 +235,129 @@ class SchedulerBase(object):
         """
         raise NotImplementedError
 
+    def _validate_projects(self, projects):
+        """validates the given projects value
+        """
+        if projects is None:
+            projects = []
+
+        msg = '%(class)s.projects should be a list of ' \
+            'stalker.models.project.Project instances, not ' \
+            '%(projects_class)s'
+
+        if not isinstance(projects, list):
+            raise TypeError(
+                msg % {
+                    'class': self.__class__.__name__,
+                    'projects_class': projects.__class__.__name__
+                }
+            )
+
+        from stalker import Project
+        for item in projects:
+            if not isinstance(item, Project):
+                raise TypeError(
+                    msg % {
+                        'class': self.__class__.__name__,
+                        'projects_class': item.__class__.__name__
+                    }
+                )
+
+        return projects
+
+    @property
+    def projects(self):
+        """getter for the _project attribute
+        """
+        return self._projects
+
+    @projects.setter
+    def projects(self, projects):
+        """setter for the _project attribute
+        """
+        self._projects = self._validate_projects(projects)
+
+    def _get_project_ids(self):
+        """returns the ids of the projects to be scheduled
+        """
+        if self.projects:
+            return [project.id for project in self.projects]
+
+        from stalker.db.session import DBSession
+        return [
+            r[0] for r in DBSession.connection().execute(
+                'select id from "Projects" order by id'
+            ).fetchall()
+        ]
+
+    @classmethod
+    def _update_computed_resources(cls, computed_resources, connection,
+                                   chunk_size=1000):
+        """Updates the computed resources of the given tasks by only deleting
+        the removed and inserting the added (task_id, resource_id) pairs. The
+        computed resources of the other tasks are not touched.
+
+        :param dict computed_resources: A dictionary of task ids and the set
+          of computed resource ids of that task. Tasks with an empty set will
+          have their computed resources removed.
+        :param connection: The database connection to run the queries with.
+        :param int chunk_size: The maximum number of task ids in one query
+          while retrieving the current computed resources.
+        :returns: A tuple of the added and removed pair counts.
+        """
+        from sqlalchemy import select, bindparam, and_
+        from stalker.models.task import Task_Computed_Resources
+
+        table = Task_Computed_Resources
+        task_ids = list(computed_resources)
+
+        current_pairs = set()
+        for i in range(0, len(task_ids), chunk_size):
+            current_pairs.update(
+                tuple(row) for row in connection.execute(
+                    select([table.c.task_id, table.c.resource_id])
+                    .where(table.c.task_id.in_(task_ids[i:i + chunk_size]))
+                )
+            )
+
+        new_pairs = set(
+            (task_id, resource_id)
+            for task_id, resource_ids in computed_resources.items()
+            for resource_id in resource_ids
+        )
+
+        removed_pairs = current_pairs - new_pairs
+        added_pairs = new_pairs - current_pairs
+
+        if removed_pairs:
+            connection.execute(
+                table.delete().where(
+                    and_(
+                        table.c.task_id == bindparam('b_task_id'),
+                        table.c.resource_id == bindparam('b_resource_id')
+                    )
+                ),
+                [
+                    {'b_task_id': task_id, 'b_resource_id': resource_id}
+                    for task_id, resource_id in sorted(removed_pairs)
+                ]
+            )
+
+        if added_pairs:
+            connection.execute(
+                table.insert(),
+                [
+                    {'task_id': task_id, 'resource_id': resource_id}
+                    for task_id, resource_id in sorted(added_pairs)
+                ]
+            )
+
+        logger.debug(
+            'computed resources: %s pairs added, %s pairs removed' %
+            (len(added_pairs), len(removed_pairs))
+        )
+        return len(added_pairs), len(removed_pairs)
+
 
 class TaskJugglerScheduler(SchedulerBase):
     """This is the main scheduler for Stalker right now.
@@ -168,14 +453,43 @@ class TaskJugglerScheduler(SchedulerBase):
       is False.
     :param int parsing_method: Choose between SQL (0) or Pure Python (1)
       parsing. The default is SQL.
+    :param bool incremental: When set to True, the tjp representation of each
+      Project is cached and only the Projects that have changed since their
+      last rendering are queried and rendered again. A Project is considered
+      changed when any of its Tasks, TaskDependencies or TimeLogs are changed
+      through the ORM in this process, or when the number or the latest
+      ``date_updated`` value of its Tasks or TimeLogs are changed in the
+      database. Use :meth:`.clear_tjp_cache` after doing bulk updates that
+      bypasses the ORM. The default is False.
+    :param int workers: The number of threads to render the tjp
+      representations of the Projects with. Each thread uses its own
+      connection from the engine pool and the results are combined in the
+      order of the Projects. As the worker connections are not a part of the
+      current session transaction, commit the data before scheduling if
+      ``workers`` is greater than 1. The default is 1 which renders all the
+      Projects with the session connection.
+    :param bool streaming: When set to True, the tjp file is written while
+      the task data is fetched from the database with a server side cursor,
+      instead of rendering the whole content to :attr:`.tjp_content` first.
+      So the memory usage stays bounded no matter how big the studio is. The
+      ``workers`` option is not used in streaming mode. The default is False.
+    :param bool use_pipes: When set to True, no temp files are used. The tjp
+      content is written directly to the stdin of the tj3 process and the
+      csv report is parsed row by row as it is read from its stdout. It is
+      not supported on Windows, the temp files are still used there. The
+      default is False.
     """
 
     def __init__(self,
                  studio=None,
                  compute_resources=False,
                  parsing_method=0,
-                 projects=None):
-        super(TaskJugglerScheduler, self).__init__(studio)
+                 projects=None,
+                 incremental=False,
+                 workers=1,
+                 streaming=False,
+                 use_pipes=False):
+        super(TaskJugglerScheduler, self).__init__(studio, projects)
 
         self.tjp_content = ''
 
@@ -191,9 +505,42 @@ class TaskJugglerScheduler(SchedulerBase):
 
         self.compute_resources = compute_resources
         self.parsing_method = parsing_method
+        self.incremental = incremental
 
-        self._projects = []
-        self.projects = projects
+        self._workers = 1
+        self.workers = workers
+
+        self.streaming = streaming
+        self.use_pipes = use_pipes
+
+    def _validate_workers(self, workers):
+        """validates the given workers value
+        """
+        if not isinstance(workers, int) or isinstance(workers, bool):
+            raise TypeError(
+                '%s.workers should be an integer, not %s' %
+                (self.__class__.__name__, workers.__class__.__name__)
+            )
+
+        if workers < 1:
+            raise ValueError(
+                '%s.workers should be a positive integer, not %s' %
+                (self.__class__.__name__, workers)
+            )
+
+        return workers
+
+    @property
+    def workers(self):
+        """getter for the _workers attribute
+        """
+        return self._workers
+
+    @workers.setter
+    def workers(self, workers):
+        """setter for the _workers attribute
+        """
+        self._workers = self._validate_workers(workers)
 
     def _create_tjp_file(self):
         """creates the tjp file
@@ -204,302 +551,1371 @@ class TaskJugglerScheduler(SchedulerBase):
         self.tjp_file_full_path = self.temp_file_full_path + ".tjp"
         self.csv_file_full_path = self.temp_file_full_path + ".csv"
 
-    def _create_tjp_file_content(self):
-        """creates the tjp file content
+    @classmethod
+    def _project_tjp_lines(cls, project_id, connection):
+        """Generates the tjp lines of the given project and its tasks.
+
+        :param int project_id: The id of the Project.
+        :param connection: The database connection to run the query with.
         """
-        from jinja2 import Template
+        import json
+        from sqlalchemy import text
 
-        start = time.time()
+        result = connection.execute(text(TJP_TASKS_QUERY), id=project_id)
+
+        # start by adding the project first
+        yield 'task Project_%s "Project_%s" {' % (project_id, project_id)
+
+        # now start jumping around
+        previous_level = 0
+        for r in result:
+            # start by appending task tjp id first
+            task_id = r[0]
+            # path = r[1]
+            # parent_id = r[2]
+            # entity_type = r[3]
+            # name = r[4]
+            priority = r[5]
+            schedule_timing = r[6]
+            schedule_unit = r[7]
+            schedule_model = r[8]
+            allocation_strategy = r[9]
+            persistent_allocation = r[10]
+            depth = r[11] + 1
+            resource_ids = r[12]
+            alternative_resource_ids = r[13]
+            time_log_array = r[14]
+            dependency_info = r[15]
+            is_leaf = r[16]
+
+            tab = '  ' * depth
+
+            # close the previous level if necessary
+            for i in range(previous_level - depth + 1):
+                i_tab = '  ' * (previous_level - i)
+                yield '%s}' % i_tab
+
+            yield """%(tab)stask Task_%(id)s "Task_%(id)s" {""" % {
+                'tab': tab,
+                'id': task_id
+            }
+
+            # append priority if it is different then 500
+            if priority != 500:
+                yield '%s  priority %s' % (tab, priority)
+
+            # append dependency information
+            if dependency_info:
+                dep_buffer = ['%s  depends ' % tab]
+
+                json_data = json.loads(
+                    dependency_info.replace('{', '[')
+                    .replace('}', ']')
+                    .replace('(', '')
+                    .replace(')', '')
+                )  # it is an array of string
+
+                for i, dep in enumerate(json_data):
+                    if i > 0:
+                        dep_buffer.append(', ')
+
+                    dep_full_ids, \
+                        dependency_target, \
+                        gap_timing, \
+                        gap_unit, \
+                        gap_model = dep.split(',')
+
+                    dep_full_path = '.'.join(
+                        map(lambda x: 'Task_%s' % x,
+                            dep_full_ids.split('-'))
+                    )
+                    # fix for Project id
+                    dep_full_path = 'Project_%s' % dep_full_path[5:]
 
-        # use new way of doing it, it will just work with PostgreSQL
-        import json
-        from stalker import defaults
-        from stalker.db.session import DBSession
-        template = Template(defaults.tjp_main_template2)
+                    dep_string = '%s {%s}' % (
+                        dep_full_path, dependency_target)
 
-        if not self.projects:
-            project_ids = DBSession.connection().execute(
-                'select id, code from "Projects"'
-            ).fetchall()
+                    dep_buffer.append(dep_string)
+
+                yield ''.join(dep_buffer)
+
+            # append schedule model and timing information
+            # if this is a leaf task and has resources
+            if is_leaf and resource_ids:
+                yield '%s  %s %s%s' % (
+                    tab, schedule_model, schedule_timing, schedule_unit
+                )
+
+                resource_buffer = ['%s  allocate ' % tab]
+                for i, resource_id in enumerate(resource_ids):
+                    if i > 0:
+                        resource_buffer.append(', ')
+                    resource_buffer.append('User_%s' % resource_id)
+
+                    # now go through alternatives
+                    if alternative_resource_ids:
+                        resource_buffer.append(' { alternative ')
+                        for j, alt_resource_id in \
+                                enumerate(alternative_resource_ids):
+                            if j > 0:
+                                resource_buffer.append(', ')
+                            resource_buffer.append(
+                                'User_%s' % alt_resource_id)
+
+                        # set the allocation strategy
+                        resource_buffer.append(
+                            ' select %s' % allocation_strategy)
+
+                        # is is persistent
+                        if persistent_allocation:
+                            resource_buffer.append(' persistent')
+                        resource_buffer.append(' }')
+
+                yield ''.join(resource_buffer)
+
+                # append any time log information
+                if time_log_array:
+                    json_data = json.loads(
+                        time_log_array.replace('{', '[')
+                        .replace('}', ']')
+                        .replace('(', '')
+                        .replace(')', '')
+                    )  # it is an array of string
+
+                    for tlog in json_data:
+                        user_id, t_start, t_end = tlog.split(',')
+                        yield '%s  booking %s %s - %s { overtime 2 }' % (
+                            tab, user_id, t_start, t_end
+                        )
+
+            previous_level = depth
+
+        # and close the brackets per project
+        depth = 0  # current depth is 0 (Project)
+        # previous_level is the last task
+        for i in range(previous_level - depth + 1):
+            i_tab = '  ' * (previous_level - i)
+            yield '%s}' % i_tab
+
+    def _create_project_tjp_fragment(self, project_id, connection):
+        """returns the tjp representation of the given project as a string
+
+        :param int project_id: The id of the Project.
+        :param connection: The database connection to run the query with.
+        """
+        return '\n'.join(self._project_tjp_lines(project_id, connection))
+
+    @classmethod
+    def _project_signatures(cls, project_ids, connection):
+        """Returns a signature per Project which changes whenever a Task or a
+        TimeLog is added to, deleted from or updated (with its
+        ``date_updated`` attribute is set) in that Project.
+
+        It is used to detect the changes done by other processes in the
+        incremental mode.
+
+        :param list project_ids: A list of Project ids.
+        :param connection: The database connection to run the query with.
+        :returns: dict
+        """
+        from sqlalchemy import select, func
+        from stalker import SimpleEntity, Task, TimeLog
+
+        tasks = Task.__table__
+        time_logs = TimeLog.__table__
+        entities = SimpleEntity.__table__
+
+        signatures = dict(
+            (p_id, [0, None, 0, None]) for p_id in project_ids
+        )
+        if not project_ids:
+            return signatures
+
+        task_query = select([
+            tasks.c.project_id,
+            func.count(tasks.c.id),
+            func.max(entities.c.date_updated)
+        ]).select_from(
+            tasks.join(entities, tasks.c.id == entities.c.id)
+        ).where(
+            tasks.c.project_id.in_(project_ids)
+        ).group_by(tasks.c.project_id)
+
+        for p_id, count, last_update in connection.execute(task_query):
+            signatures[p_id][0] = count
+            signatures[p_id][1] = last_update
+
+        time_log_query = select([
+            tasks.c.project_id,
+            func.count(time_logs.c.id),
+            func.max(entities.c.date_updated)
+        ]).select_from(
+            time_logs
+            .join(tasks, time_logs.c.task_id == tasks.c.id)
+            .join(entities, time_logs.c.id == entities.c.id)
+        ).where(
+            tasks.c.project_id.in_(project_ids)
+        ).group_by(tasks.c.project_id)
+
+        for p_id, count, last_update in connection.execute(time_log_query):
+            signatures[p_id][2] = count
+            signatures[p_id][3] = last_update
+
+        return dict((p_id, tuple(sig)) for p_id, sig in signatures.items())
+
+    def _create_project_tjp_fragments(self, project_ids, connection):
+        """Returns the tjp representations of the given projects in the same
+        order.
+
+        When :attr:`.workers` is greater than 1, the project ids are
+        distributed to that many threads each rendering its share with its
+        own connection.
+
+        :param list project_ids: A list of Project ids.
+        :param connection: The database connection to use when there is only
+          one worker.
+        """
+        worker_count = min(self.workers, len(project_ids))
+        if worker_count <= 1:
+            return [
+                self._create_project_tjp_fragment(p_id, connection)
+                for p_id in project_ids
+            ]
+
+        engine = connection.engine
+        # interleave the projects to balance the load between the workers
+        chunks = [project_ids[i::worker_count] for i in range(worker_count)]
+
+        def render_chunk(chunk):
+            worker_connection = engine.connect()
+            try:
+                return [
+                    self._create_project_tjp_fragment(p_id, worker_connection)
+                    for p_id in chunk
+                ]
+            finally:
+                worker_connection.close()
+
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(worker_count)
+        try:
+            results = pool.map(render_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+
+        fragments = [None] * len(project_ids)
+        for i, chunk_fragments in enumerate(results):
+            fragments[i::worker_count] = chunk_fragments
+        return fragments
+
+    @classmethod
+    def clear_tjp_cache(cls, project_ids=None):
+        """Clears the cached tjp fragments used in incremental mode.
+
+        Use it when the data is changed with bulk SQL statements that doesn't
+        update the ``date_updated`` attribute of the Tasks or TimeLogs.
+
+        :param list project_ids: The ids of the Projects to clear the cache
+          of. The default is None which clears the cache of all of the
+          Projects.
+        """
+        if project_ids is None:
+            _tjp_fragment_cache.clear()
         else:
-            project_ids = [[project.id] for project in self.projects]
+            for p_id in project_ids:
+                _tjp_fragment_cache.pop(p_id, None)
 
-        sql_query = """select
-    "Tasks".id,
-    tasks.path,
-    coalesce("Tasks".parent_id, "Tasks".project_id) as parent_id,
-    tasks.entity_type,
-    tasks.name,
-    "Tasks".priority,
-    "Tasks".schedule_timing,
-    "Tasks".schedule_unit,
-    "Tasks".schedule_model,
-    "Tasks".allocation_strategy,
-    "Tasks".persistent_allocation,
-    tasks.depth,
-    task_resources.resource_ids,
-    task_alternative_resources.resource_ids as alternative_resource_ids,
-    time_logs.time_log_array,
-    task_dependencies.dependency_info,
-    not exists (
-       select 1
-        from "Tasks" as "Child_Tasks"
-        where "Child_Tasks".parent_id = "Tasks".id
-    ) as is_leaf
-from "Tasks"
-join (
-    with recursive recursive_task(id, parent_id, path_as_text, path, depth) as (
-        select
-            id,
-            parent_id,
-            id::text as path_as_text,
-            array[project_id] as path,
-            0
-        from "Tasks"
-        where parent_id is NULL and project_id = :id
-    union all
-        select
-            task.id,
-            task.parent_id,
-            (parent.path_as_text || '-' || task.id) as path_as_text,
-            (parent.path || task.parent_id) as path,
-            parent.depth + 1 as depth
-        from "Tasks" as task
-        join recursive_task as parent on task.parent_id = parent.id
-    ) select
-        recursive_task.id,
-        recursive_task.parent_id,
-        recursive_task.path_as_text,
-        recursive_task.path,
-        "SimpleEntities".name as name,
-        "SimpleEntities".entity_type,
-        recursive_task.depth
-    from recursive_task
-    join "SimpleEntities" on recursive_task.id = "SimpleEntities".id
-    --order by path_as_text
-) as tasks on "Tasks".id = tasks.id
+    def _create_tasks_buffer(self):
+        """Renders the tjp representation of the tasks of all of the projects.
 
--- resources
-left outer join (
-    select
-        task_id,
-        array_agg(resource_id order by resource_id) as resource_ids
-    from "Task_Resources"
-    group by task_id
-) as task_resources on "Tasks".id = task_resources.task_id
+        In incremental mode, only the Projects that are changed since their
+        last rendering are rendered, and cached fragments are used for the
+        others.
+        """
+        from stalker.db.session import DBSession
+        connection = DBSession.connection()
+        project_ids = self._get_project_ids()
 
--- alternative resources
-left outer join (
-    select
-        task_id,
-        array_agg(resource_id order by resource_id) as resource_ids
-    from "Task_Alternative_Resources"
-    group by task_id
-) as task_alternative_resources on "Tasks".id = task_alternative_resources.task_id
+        if not self.incremental:
+            return '\n'.join(
+                self._create_project_tjp_fragments(project_ids, connection)
+            )
 
--- time logs
-left outer join (
-    select
-        "TimeLogs".task_id,
-        array_agg(('User_' || "TimeLogs".resource_id, to_char(cast("TimeLogs".start at time zone 'utc' as timestamp), 'YYYY-MM-DD-HH24:MI:00'), to_char(cast("TimeLogs".end at time zone 'utc' as timestamp), 'YYYY-MM-DD-HH24:MI:00'))) as time_log_array
-    from "TimeLogs"
-    group by task_id
-) as time_logs on "Tasks".id = time_logs.task_id
+        self._update_tjp_cache(project_ids, connection)
+        return '\n'.join(
+            _tjp_fragment_cache[p_id][1] for p_id in project_ids
+        )
 
--- dependencies
-left outer join (
-    select
-        task_id,
-        array_agg((tasks.alt_path, dependency_target, gap_timing, gap_unit, gap_model)) dependency_info
-    from "Task_Dependencies"
-    join (
-        with recursive recursive_task(id, parent_id, alt_path) as (
-            select
-                id,
-                parent_id,
-                project_id::text as alt_path
-            from "Tasks"
-            where parent_id is NULL
-        union all
-            select
-                task.id,
-                task.parent_id,
-                (parent.alt_path || '-' || task.parent_id) as alt_path
-            from "Tasks" as task
-            join recursive_task as parent on task.parent_id = parent.id
-        ) select
-            recursive_task.id,
-            recursive_task.parent_id,
-            recursive_task.alt_path || '-' || recursive_task.id as alt_path
-        from recursive_task
-        join "SimpleEntities" on recursive_task.id = "SimpleEntities".id
-    ) as tasks on "Task_Dependencies".depends_to_id = tasks.id
-    group by task_id
-) as task_dependencies on "Tasks".id = task_dependencies.task_id
+    def _update_tjp_cache(self, project_ids, connection):
+        """Renders the tjp representation of the given Projects that are
+        changed since their last rendering and updates the cache.
 
---order by "Tasks".id
-order by path_as_text"""
+        :param list project_ids: A list of Project ids.
+        :param connection: The database connection to run the queries with.
+        """
+        signatures = self._project_signatures(project_ids, connection)
+        changed_project_ids = []
+        for p_id in project_ids:
+            cached = _tjp_fragment_cache.get(p_id)
+            if cached is None \
+               or cached[0] != signatures[p_id] \
+               or p_id in _dirty_project_ids:
+                logger.debug('rendering tjp of Project with id: %s' % p_id)
+                changed_project_ids.append(p_id)
+            else:
+                logger.debug(
+                    'using cached tjp of Project with id: %s' % p_id
+                )
 
-        result_buffer = []
-        num_of_records = 0
+        for p_id, fragment in zip(
+                changed_project_ids,
+                self._create_project_tjp_fragments(changed_project_ids,
+                                                   connection)):
+            _tjp_fragment_cache[p_id] = (signatures[p_id], fragment)
+            _dirty_project_ids.discard(p_id)
 
-        # run it per project
-        from sqlalchemy import text
-        for pr in project_ids:
-            p_id = pr[0]
-            #p_code = pr[1]
-
-            result = DBSession.connection().execute(text(sql_query), id=p_id)
-
-            # start by adding the project first
-            result_buffer.append(
-                'task Project_%s "Project_%s" {' % (p_id, p_id)
-            )
-
-            # now start jumping around
-            previous_level = 0
-            for r in result.fetchall():
-                # start by appending task tjp id first
-                task_id = r[0]
-                # path = r[1]
-                # parent_id = r[2]
-                # entity_type = r[3]
-                #name = r[4]
-                priority = r[5]
-                schedule_timing = r[6]
-                schedule_unit = r[7]
-                schedule_model = r[8]
-                allocation_strategy = r[9]
-                persistent_allocation = r[10]
-                depth = r[11] + 1
-                resource_ids = r[12]
-                alternative_resource_ids = r[13]
-                time_log_array = r[14]
-                dependency_info = r[15]
-                is_leaf = r[16]
-
-                tab = '  ' * depth
-
-                # close the previous level if necessary
-                for i in range(previous_level - depth + 1):
-                    i_tab = '  ' * (previous_level - i)
-                    result_buffer.append('%s}' % i_tab)
-
-                result_buffer.append(
-                    """%(tab)stask Task_%(id)s "Task_%(id)s" {""" % {
-                        'tab': tab,
-                        'id': task_id
+    def _render_tjp_template(self, tasks_buffer):
+        """renders the main tjp template with the given tasks buffer
+        """
+        from jinja2 import Template
+
+        # use new way of doing it, it will just work with PostgreSQL
+        from stalker import defaults
+        template = Template(defaults.tjp_main_template2)
+
+        import stalker
+        return template.render({
+            'stalker': stalker,
+            'studio': self.studio,
+            'csv_file_name': self.temp_file_name,
+            'csv_file_full_path': self.temp_file_full_path,
+            'compute_resources': self.compute_resources,
+            'tasks_buffer': tasks_buffer
+        })
+
+    def _create_tjp_file_content(self):
+        """creates the tjp file content
+        """
+        start = time.time()
+
+        tasks_buffer = self._create_tasks_buffer()
+        self.tjp_content = self._render_tjp_template(tasks_buffer)
+
+        end = time.time()
+        logger.debug(
+            'rendering the whole tjp file took : %s seconds' % (end - start)
+        )
+
+    def _write_tjp(self, stream):
+        """Writes the tjp content to the given file like object without
+        building it in memory.
+
+        The main template is rendered around a marker and the tasks of each
+        Project are written between the header and the footer line by line,
+        as they are fetched with a server side cursor. In incremental mode
+        the cached tjp fragments are written instead.
+
+        :param stream: A file like object that has a ``write()`` method.
+        """
+        start = time.time()
+
+        header, footer = \
+            self._render_tjp_template(TJP_TASKS_MARKER).split(TJP_TASKS_MARKER)
+        stream.write(header)
+
+        from stalker.db.session import DBSession
+        connection = DBSession.connection()
+        project_ids = self._get_project_ids()
+
+        if self.incremental:
+            self._update_tjp_cache(project_ids, connection)
+            for i, p_id in enumerate(project_ids):
+                if i:
+                    stream.write('\n')
+                stream.write(_tjp_fragment_cache[p_id][1])
+        else:
+            connection = connection.execution_options(stream_results=True)
+            for i, p_id in enumerate(project_ids):
+                for j, line in enumerate(
+                        self._project_tjp_lines(p_id, connection)):
+                    if i or j:
+                        stream.write('\n')
+                    stream.write(line)
+
+        stream.write(footer)
+
+        end = time.time()
+        logger.debug(
+            'streaming the whole tjp file took : %s seconds' % (end - start)
+        )
+
+    def _fill_tjp_file(self):
+        """fills the tjp file with content, in streaming mode the content is
+        directly written to the file
+        """
+        with open(self.tjp_file_full_path, 'w+') as self.tjp_file:
+            if self.streaming:
+                self._write_tjp(self.tjp_file)
+            else:
+                self.tjp_file.write(self.tjp_content)
+
+    def _delete_tjp_file(self):
+        """deletes the temp tjp file
+        """
+        try:
+            os.remove(self.tjp_file_full_path)
+        except OSError:
+            pass
+
+    def _delete_csv_file(self):
+        """deletes the temp csv file
+        """
+        try:
+            os.remove(self.csv_file_full_path)
+        except OSError:
+            pass
+
+    def _clean_up(self):
+        """removes the temp files
+        """
+        self._delete_tjp_file()
+        self._delete_csv_file()
+
+    def _parse_csv_file(self):
+        """parses back the csv file and fills the tasks with computes_start and
+        computed_end values
+        """
+        logger.debug('csv_file_full_path : %s' % self.csv_file_full_path)
+        if not os.path.exists(self.csv_file_full_path):
+            logger.debug('could not find CSV file, '
+                         'returning without updating db!')
+            return
+
+        with open(self.csv_file_full_path, 'r') as self.csv_file:
+            csv_content = csv.reader(self.csv_file, delimiter=';')
+
+            # skip the header
+            next(csv_content, None)
+            self._parse_csv_lines(csv_content)
+
+    def _parse_csv_lines(self, lines):
+        """fills the tasks and projects with computed_start and computed_end
+        values from the given csv rows
+
+        The Task and Project rows are separated by looking to their ids
+        (Task ids are always under a Project, like ``Project_1.Task_3``), so
+        each table is only updated with its own rows.
+
+        :param lines: An iterable of csv rows without the header row.
+        """
+        parsing_start = time.time()
+
+        from stalker import Task, Project
+
+        task_rows = []
+        project_rows = []
+        computed_resources = {}
+
+        for data in lines:
+            id_line = data[0]
+            entity_id = int(id_line[id_line.rindex('_') + 1:])
+            if not entity_id:
+                continue
+
+            if '.' not in id_line:
+                project_rows.append((entity_id, data[1], data[2]))
+                continue
+
+            task_rows.append((entity_id, data[1], data[2]))
+
+            # computed_resources
+            if self.compute_resources:
+                computed_resources[entity_id] = set(
+                    int(resource.split('_')[-1].split(')')[0])
+                    for resource in data[3].split(',') if resource
+                )
+
+        from stalker.db.session import DBSession
+        connection = DBSession.connection()
+
+        # update date values
+        self._update_computed_dates(Task.__table__, task_rows, connection)
+        self._update_computed_dates(
+            Project.__table__, project_rows, connection
+        )
+
+        # update computed resources data of the scheduled tasks only
+        if self.compute_resources:
+            self._update_computed_resources(computed_resources, connection)
+
+        parsing_end = time.time()
+        logger.debug(
+            'completed parsing csv file in (SQL): %s seconds' %
+            (parsing_end - parsing_start)
+        )
+
+    @classmethod
+    def _update_computed_dates(cls, table, rows, connection):
+        """Updates the start, end, computed_start and computed_end values of
+        the given table with the given rows.
+
+        On PostgreSQL (with psycopg2) the rows are copied in to a temp table
+        with ``COPY`` and the table is updated with one ``UPDATE ... FROM``
+        statement, on other databases an executemany update is used.
+
+        :param table: The Tasks or the Projects table.
+        :param list rows: A list of (id, start, end) tuples, where the start
+          and end values are strings in TaskJuggler format
+          (``%Y-%m-%d-%H:%M``) and in UTC.
+        :param connection: The database connection to run the queries with.
+        """
+        if not rows:
+            return
+
+        if connection.dialect.name == 'postgresql' \
+           and connection.dialect.driver == 'psycopg2':
+            cls._copy_computed_dates(table, rows, connection)
+            return
+
+        from sqlalchemy import bindparam
+        dates = {}
+
+        def to_date(value):
+            # there are a lot less distinct dates than the rows
+            date = dates.get(value)
+            if date is None:
+                date = parse_tj_date(value)
+                dates[value] = date
+            return date
+
+        update_data = []
+        for entity_id, start, end in rows:
+            start_date = to_date(start)
+            end_date = to_date(end)
+            update_data.append({
+                'b_id': entity_id,
+                'start': start_date,
+                'end': end_date,
+                'computed_start': start_date,
+                'computed_end': end_date
+            })
+
+        update_statement = table.update()\
+            .where(table.c.id == bindparam('b_id'))\
+            .values(
+                start=bindparam('start'),
+                end=bindparam('end'),
+                computed_start=bindparam('computed_start'),
+                computed_end=bindparam('computed_end')
+            )
+        connection.execute(update_statement, update_data)
+
+    @classmethod
+    def _copy_computed_dates(cls, table, rows, connection):
+        """Updates the dates of the given table by copying the rows to a temp
+        table and joining it in an ``UPDATE ... FROM`` statement. It is
+        PostgreSQL (psycopg2) specific.
+        """
+        import io
+
+        # "2013-04-16-09:00" -> "2013-04-16 09:00+00", no need to create any
+        # datetime instances
+        buffer = io.StringIO(u'\n'.join(
+            u'%s\t%s %s+00\t%s %s+00' % (
+                entity_id, start[:10], start[11:], end[:10], end[11:]
+            )
+            for entity_id, start, end in rows
+        ))
+
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(
+                'create temp table "TJ_Computed_Dates" ('
+                'id integer primary key, '
+                'start timestamp with time zone, '
+                '"end" timestamp with time zone'
+                ')'
+            )
+            cursor.copy_expert('copy "TJ_Computed_Dates" from stdin', buffer)
+            cursor.execute(
+                'update "%(table)s" set '
+                'start = d.start, "end" = d."end", '
+                'computed_start = d.start, computed_end = d."end" '
+                'from "TJ_Computed_Dates" as d '
+                'where "%(table)s".id = d.id' % {'table': table.name}
+            )
+            cursor.execute('drop table "TJ_Computed_Dates"')
+        finally:
+            cursor.close()
+
+    def _schedule_with_pipes(self):
+        """Does the scheduling without any temp files. The tjp content is
+        written to the stdin of tj3 and the csv report is parsed row by row
+        as tj3 writes it to its stdout, the rows are not kept in memory but
+        collected in the form that is written to the database. The database
+        is updated only after tj3 exits successfully.
+        """
+        from stalker import defaults
+
+        # a "." as the report name makes tj3 write the report to stdout
+        self.temp_file_name = '.'
+        self.temp_file_full_path = None
+
+        # and a "." as the file name makes it read the project from stdin
+        process = subprocess.Popen(
+            [defaults.tj_command, '--silent', '--no-color', '.'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+
+        # the csv rows are passed to this thread through the queue, None
+        # marks the end of the report
+        csv_rows = queue.Queue()
+        read_errors = []
+        stderr_buffer = []
+
+        def read_stdout():
+            try:
+                for row in csv.reader(
+                        (line.decode('utf-8')
+                         for line in iter(process.stdout.readline, b'')),
+                        delimiter=';'):
+                    csv_rows.put(row)
+            except Exception as e:
+                read_errors.append(e)
+            finally:
+                csv_rows.put(None)
+
+        def read_stderr():
+            for line in iter(process.stderr.readline, b''):
+                line = line.decode('utf-8').strip()
+                stderr_buffer.append(line)
+                logger.debug(line)
+
+        # drain the outputs in the background, so tj3 doesn't block on a full
+        # pipe, the session is only used in this thread
+        readers = [
+            threading.Thread(target=read_stdout),
+            threading.Thread(target=read_stderr)
+        ]
+        for reader in readers:
+            reader.daemon = True
+            reader.start()
+
+        write_error = None
+        try:
+            stdin = codecs.getwriter('utf-8')(process.stdin)
+            if self.streaming:
+                self._write_tjp(stdin)
+            else:
+                self._create_tjp_file_content()
+                stdin.write(self.tjp_content)
+        except IOError as e:
+            # tj3 exited before reading the whole content
+            write_error = e
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            try:
+                process.stdin.close()
+            except IOError:
+                pass
+
+        def report_rows():
+            """yields the csv rows as they arrive and checks the result of
+            tj3 at the end of the report, before the rows are written to the
+            database
+            """
+            for row in iter(csv_rows.get, None):
+                yield row
+
+            return_code = process.wait()
+            for reader in readers:
+                reader.join()
+            logger.debug('tj3 return code: %s' % return_code)
+
+            if return_code:
+                # there is an error
+                raise RuntimeError('\n'.join(stderr_buffer))
+
+            if write_error is not None:
+                raise write_error
+
+            if read_errors:
+                raise read_errors[0]
+
+        # skip anything before the header of the csv report
+        lines = itertools.dropwhile(lambda row: len(row) < 3, report_rows())
+        next(lines, None)
+        try:
+            self._parse_csv_lines(lines)
+        except BaseException:
+            process.kill()
+            raise
+
+        # flatten the buffer
+        return '\n'.join(stderr_buffer)
+
+    def schedule(self):
+        """the main scheduling function should be implemented in the
+        derivatives
+        """
+        raise NotImplementedError
+
+    def _validate_projects(self, projects):
+        """validates the given projects value
+        """
+        if projects is None:
+            projects = []
+
+        msg = '%(class)s.projects should be a list of ' \
+            'stalker.models.project.Project instances, not ' \
+            '%(projects_class)s'
+
+        if not isinstance(projects, list):
+            raise TypeError(
+                msg % {
+                    'class': self.__class__.__name__,
+                    'projects_class': projects.__class__.__name__
+                }
+            )
+
+        from stalker import Project
+        for item in projects:
+            if not isinstance(item, Project):
+                raise TypeError(
+                    msg % {
+                        'class': self.__class__.__name__,
+                        'projects_class': item.__class__.__name__
                     }
                 )
 
-                # append priority if it is different then 500
-                if priority != 500:
-                    result_buffer.append(
-                        '%s  priority %s' % (tab, priority))
+        return projects
+
+    @property
+    def projects(self):
+        """getter for the _project attribute
+        """
+        return self._projects
+
+    @projects.setter
+    def projects(self, projects):
+        """setter for the _project attribute
+        """
+        self._projects = self._validate_projects(projects)
+
+    def _get_project_ids(self):
+        """returns the ids of the projects to be scheduled
+        """
+        if self.projects:
+            return [project.id for project in self.projects]
+
+        from stalker.db.session import DBSession
+        return [
+            r[0] for r in DBSession.connection().execute(
+                'select id from "Projects" order by id'
+            ).fetchall()
+        ]
+
+    @classmethod
+    def _update_computed_resources(cls, computed_resources, connection,
+                                   chunk_size=1000):
+        """Updates the computed resources of the given tasks by only deleting
+        the removed and inserting the added (task_id, resource_id) pairs. The
+        computed resources of the other tasks are not touched.
+
+        :param dict computed_resources: A dictionary of task ids and the set
+          of computed resource ids of that task. Tasks with an empty set will
+          have their computed resources removed.
+        :param connection: The database connection to run the queries with.
+        :param int chunk_size: The maximum number of task ids in one query
+          while retrieving the current computed resources.
+        :returns: A tuple of the added and removed pair counts.
+        """
+        from sqlalchemy import select, bindparam, and_
+        from stalker.models.task import Task_Computed_Resources
+
+        table = Task_Computed_Resources
+        task_ids = list(computed_resources)
+
+        current_pairs = set()
+        for i in range(0, len(task_ids), chunk_size):
+            current_pairs.update(
+                tuple(row) for row in connection.execute(
+                    select([table.c.task_id, table.c.resource_id])
+                    .where(table.c.task_id.in_(task_ids[i:i + chunk_size]))
+                )
+            )
+
+        new_pairs = set(
+            (task_id, resource_id)
+            for task_id, resource_ids in computed_resources.items()
+            for resource_id in resource_ids
+        )
+
+        removed_pairs = current_pairs - new_pairs
+        added_pairs = new_pairs - current_pairs
+
+        if removed_pairs:
+            connection.execute(
+                table.delete().where(
+                    and_(
+                        table.c.task_id == bindparam('b_task_id'),
+                        table.c.resource_id == bindparam('b_resource_id')
+                    )
+                ),
+                [
+                    {'b_task_id': task_id, 'b_resource_id': resource_id}
+                    for task_id, resource_id in sorted(removed_pairs)
+                ]
+            )
+
+        if added_pairs:
+            connection.execute(
+                table.insert(),
+                [
+                    {'task_id': task_id, 'resource_id': resource_id}
+                    for task_id, resource_id in sorted(added_pairs)
+                ]
+            )
+
+        logger.debug(
+            'computed resources: %s pairs added, %s pairs removed' %
+            (len(added_pairs), len(removed_pairs))
+        )
+        return len(added_pairs), len(removed_pairs)
+
+
+class TaskJugglerScheduler(SchedulerBase):
+    """This is the main scheduler for Stalker right now.
+
+    This class prepares the data for TaskJuggler and let it solve the
+    scheduling problem, and then retrieves the solved date and resource data
+    back.
+
+    TaskJugglerScheduler needs a :class:`.Studio` instance to work with, it
+    will create a .tjp file and then solve the tasks and restore the
+    computed_start and computed_end dates and the computed_resources
+    attributes for each task.
+
+    Stalker will pass all its data to TaskJuggler by creating a tjp file that
+    TaskJuggler can parse. This tjp file has all the Projects, Tasks, Users,
+    Departments, TimeLogs, Vacations and everything that TJ need for solving
+    the tasks. With every new version of it, Stalker tries to cover more and
+    more TaskJuggler directives.
 
-                # append dependency information
-                if dependency_info:
-                    dep_buffer = ['%s  depends ' % tab]
+    .. note::
+       .. versionadded:: 0.2.5
+          Alternative Resources
 
+       Stalker is now able to pass alternative resources to TaskJuggler.
+       Although, per resource alternatives are not yet possible, it will be
+       implemented in future versions of Stalker.
+
+    .. note::
+       .. versionadded:: 0.2.5
+          Task Dependency Relation Attributes
+
+       Stalker now can use 'gapduration', 'gaplength', 'onstart' and 'onend'
+       TaskJuggler directives for each dependent task of a task. Use the
+       TaskDependency instance in Task.task_dependency attribute to control how
+       a particular task is depending to another task.
+
+    .. warning::
+       **Task.computed_resources Attribute Content**
+
+       After the scheduling is finished, TaskJuggler will create a ``csv``
+       report that TaskJugglerScheduler will parse. This csv file contains the
+       ``id``, ``start date``, ``end date`` and ``resources`` data. The
+       resources reported back by TJ will be stored in
+       :attr:`.Task.computed_resources` attribute.
+
+       TaskJuggler will put all the resources who may have entered a
+       :class:`.TimeLog` previously to the csv file. But the resources from the
+       csv file may not be in :attr:`.Task.resources` or
+       :attr:`.Task.alternative_resources` anymore. Because of that,
+       TaskJugglerScheduler will only store the resources those are both in csv
+       file and in :attr:`.Task.resources` or
+       :attr:`.Task.alternative_resources` attributes.
+
+    Stalker will export each Project to tjp as the highest task in the
+    hierarchy and all the projects will be combined in to the same tjp file.
+    Combining all the Projects in one tjp file has a very nice side effect,
+    projects using the same resources will respect their allocations to the
+    resource. So that when a TaskJugglerScheduler instance is used to schedule
+    the project, all projects are scheduled together.
+
+    The following table shows which Stalker data type is converted to which
+    TaskJuggler type:
+
+      +------------+-------------+
+      | Stalker    | TaskJuggler |
+      +============+=============+
+      | Studio     | Project     |
+      +------------+-------------+
+      | Project    | Task        |
+      +------------+-------------+
+      | Task       | Task        |
+      +------------+-------------+
+      | Asset      | Task        |
+      +------------+-------------+
+      | Shot       | Task        |
+      +------------+-------------+
+      | Sequence   | Task        |
+      +------------+-------------+
+      | Departmemt | Resource    |
+      +------------+-------------+
+      | User       | Resource    |
+      +------------+-------------+
+      | TimeLog    | Booking     |
+      +------------+-------------+
+      | Vacation   | Vacation    |
+      +------------+-------------+
+
+    :param bool compute_resources: When set to True it will also consider
+      :attr:`.Task.alternative_resources` attribute and will fill
+      :attr:`.Task.computed_resources` attribute for each Task. With
+      :class:`.TaskJugglerScheduler` when the total number of Task is around
+      15k it will take around 7 minutes to generate this data, so by default it
+      is False.
+    :param int parsing_method: Choose between SQL (0) or Pure Python (1)
+      parsing. The default is SQL.
+    :param bool incremental: When set to True, the tjp representation of each
+      Project is cached and only the Projects that have changed since their
+      last rendering are queried and rendered again. A Project is considered
+      changed when any of its Tasks, TaskDependencies or TimeLogs are changed
+      through the ORM in this process, or when the number or the latest
+      ``date_updated`` value of its Tasks or TimeLogs are changed in the
+      database. Use :meth:`.clear_tjp_cache` after doing bulk updates that
+      bypasses the ORM. The default is False.
+    :param int workers: The number of threads to render the tjp
+      representations of the Projects with. Each thread uses its own
+      connection from the engine pool and the results are combined in the
+      order of the Projects. As the worker connections are not a part of the
+      current session transaction, commit the data before scheduling if
+      ``workers`` is greater than 1. The default is 1 which renders all the
+      Projects with the session connection.
+    :param bool streaming: When set to True, the tjp file is written while
+      the task data is fetched from the database with a server side cursor,
+      instead of rendering the whole content to :attr:`.tjp_content` first.
+      So the memory usage stays bounded no matter how big the studio is. The
+      ``workers`` option is not used in streaming mode. The default is False.
+    :param bool use_pipes: When set to True, no temp files are used. The tjp
+      content is written directly to the stdin of the tj3 process and the
+      csv report is parsed row by row as it is read from its stdout. It is
+      not supported on Windows, the temp files are still used there. The
+      default is False.
+    """
+
+    def __init__(self,
+                 studio=None,
+                 compute_resources=False,
+                 parsing_method=0,
+                 projects=None,
+                 incremental=False,
+                 workers=1,
+                 streaming=False,
+                 use_pipes=False):
+        super(TaskJugglerScheduler, self).__init__(studio, projects)
+
+        self.tjp_content = ''
+
+        self.temp_file_full_path = None
+        self.temp_file_path = None
+        self.temp_file_name = None
+
+        self.tjp_file_full_path = None
+        self.tjp_file = None
+
+        self.csv_file_full_path = None
+        self.csv_file = None
+
+        self.compute_resources = compute_resources
+        self.parsing_method = parsing_method
+        self.incremental = incremental
+
+        self._workers = 1
+        self.workers = workers
+
+        self.streaming = streaming
+        self.use_pipes = use_pipes
+
+    def _validate_workers(self, workers):
+        """validates the given workers value
+        """
+        if not isinstance(workers, int) or isinstance(workers, bool):
+            raise TypeError(
+                '%s.workers should be an integer, not %s' %
+                (self.__class__.__name__, workers.__class__.__name__)
+            )
+
+        if workers < 1:
+            raise ValueError(
+                '%s.workers should be a positive integer, not %s' %
+                (self.__class__.__name__, workers)
+            )
+
+        return workers
+
+    @property
+    def workers(self):
+        """getter for the _workers attribute
+        """
+        return self._workers
+
+    @workers.setter
+    def workers(self, workers):
+        """setter for the _workers attribute
+        """
+        self._workers = self._validate_workers(workers)
+
+    def _create_tjp_file(self):
+        """creates the tjp file
+        """
+        self.temp_file_full_path = tempfile.mktemp(prefix='Stalker_')
+        self.temp_file_path = os.path.dirname(self.temp_file_full_path)
+        self.temp_file_name = os.path.basename(self.temp_file_full_path)
+        self.tjp_file_full_path = self.temp_file_full_path + ".tjp"
+        self.csv_file_full_path = self.temp_file_full_path + ".csv"
+
+    @classmethod
+    def _project_tjp_lines(cls, project_id, connection):
+        """Generates the tjp lines of the given project and its tasks.
+
+        :param int project_id: The id of the Project.
+        :param connection: The database connection to run the query with.
+        """
+        import json
+        from sqlalchemy import text
+
+        result = connection.execute(text(TJP_TASKS_QUERY), id=project_id)
+
+        # start by adding the project first
+        yield 'task Project_%s "Project_%s" {' % (project_id, project_id)
+
+        # now start jumping around
+        previous_level = 0
+        for r in result:
+            # start by appending task tjp id first
+            task_id = r[0]
+            # path = r[1]
+            # parent_id = r[2]
+            # entity_type = r[3]
+            # name = r[4]
+            priority = r[5]
+            schedule_timing = r[6]
+            schedule_unit = r[7]
+            schedule_model = r[8]
+            allocation_strategy = r[9]
+            persistent_allocation = r[10]
+            depth = r[11] + 1
+            resource_ids = r[12]
+            alternative_resource_ids = r[13]
+            time_log_array = r[14]
+            dependency_info = r[15]
+            is_leaf = r[16]
+
+            tab = '  ' * depth
+
+            # close the previous level if necessary
+            for i in range(previous_level - depth + 1):
+                i_tab = '  ' * (previous_level - i)
+                yield '%s}' % i_tab
+
+            yield """%(tab)stask Task_%(id)s "Task_%(id)s" {""" % {
+                'tab': tab,
+                'id': task_id
+            }
+
+            # append priority if it is different then 500
+            if priority != 500:
+                yield '%s  priority %s' % (tab, priority)
+
+            # append dependency information
+            if dependency_info:
+                dep_buffer = ['%s  depends ' % tab]
+
+                json_data = json.loads(
+                    dependency_info.replace('{', '[')
+                    .replace('}', ']')
+                    .replace('(', '')
+                    .replace(')', '')
+                )  # it is an array of string
+
+                for i, dep in enumerate(json_data):
+                    if i > 0:
+                        dep_buffer.append(', ')
+
+                    dep_full_ids, \
+                        dependency_target, \
+                        gap_timing, \
+                        gap_unit, \
+                        gap_model = dep.split(',')
+
+                    dep_full_path = '.'.join(
+                        map(lambda x: 'Task_%s' % x,
+                            dep_full_ids.split('-'))
+                    )
+                    # fix for Project id
+                    dep_full_path = 'Project_%s' % dep_full_path[5:]
+
+                    dep_string = '%s {%s}' % (
+                        dep_full_path, dependency_target)
+
+                    dep_buffer.append(dep_string)
+
+                yield ''.join(dep_buffer)
+
+            # append schedule model and timing information
+            # if this is a leaf task and has resources
+            if is_leaf and resource_ids:
+                yield '%s  %s %s%s' % (
+                    tab, schedule_model, schedule_timing, schedule_unit
+                )
+
+                resource_buffer = ['%s  allocate ' % tab]
+                for i, resource_id in enumerate(resource_ids):
+                    if i > 0:
+                        resource_buffer.append(', ')
+                    resource_buffer.append('User_%s' % resource_id)
+
+                    # now go through alternatives
+                    if alternative_resource_ids:
+                        resource_buffer.append(' { alternative ')
+                        for j, alt_resource_id in \
+                                enumerate(alternative_resource_ids):
+                            if j > 0:
+                                resource_buffer.append(', ')
+                            resource_buffer.append(
+                                'User_%s' % alt_resource_id)
+
+                        # set the allocation strategy
+                        resource_buffer.append(
+                            ' select %s' % allocation_strategy)
+
+                        # is is persistent
+                        if persistent_allocation:
+                            resource_buffer.append(' persistent')
+                        resource_buffer.append(' }')
+
+                yield ''.join(resource_buffer)
+
+                # append any time log information
+                if time_log_array:
                     json_data = json.loads(
-                        dependency_info.replace('{', '[')
+                        time_log_array.replace('{', '[')
                         .replace('}', ']')
                         .replace('(', '')
                         .replace(')', '')
                     )  # it is an array of string
 
-                    for i, dep in enumerate(json_data):
-                        if i > 0:
-                            dep_buffer.append(', ')
+                    for tlog in json_data:
+                        user_id, t_start, t_end = tlog.split(',')
+                        yield '%s  booking %s %s - %s { overtime 2 }' % (
+                            tab, user_id, t_start, t_end
+                        )
+
+            previous_level = depth
+
+        # and close the brackets per project
+        depth = 0  # current depth is 0 (Project)
+        # previous_level is the last task
+        for i in range(previous_level - depth + 1):
+            i_tab = '  ' * (previous_level - i)
+            yield '%s}' % i_tab
 
-                        dep_full_ids, \
-                            dependency_target, \
-                            gap_timing, \
-                            gap_unit, \
-                            gap_model = dep.split(',')
+    def _create_project_tjp_fragment(self, project_id, connection):
+        """returns the tjp representation of the given project as a string
+
+        :param int project_id: The id of the Project.
+        :param connection: The database connection to run the query with.
+        """
+        return '\n'.join(self._project_tjp_lines(project_id, connection))
+
+    @classmethod
+    def _project_signatures(cls, project_ids, connection):
+        """Returns a signature per Project which changes whenever a Task or a
+        TimeLog is added to, deleted from or updated (with its
+        ``date_updated`` attribute is set) in that Project.
+
+        It is used to detect the changes done by other processes in the
+        incremental mode.
+
+        :param list project_ids: A list of Project ids.
+        :param connection: The database connection to run the query with.
+        :returns: dict
+        """
+        from sqlalchemy import select, func
+        from stalker import SimpleEntity, Task, TimeLog
+
+        tasks = Task.__table__
+        time_logs = TimeLog.__table__
+        entities = SimpleEntity.__table__
+
+        signatures = dict(
+            (p_id, [0, None, 0, None]) for p_id in project_ids
+        )
+        if not project_ids:
+            return signatures
+
+        task_query = select([
+            tasks.c.project_id,
+            func.count(tasks.c.id),
+            func.max(entities.c.date_updated)
+        ]).select_from(
+            tasks.join(entities, tasks.c.id == entities.c.id)
+        ).where(
+            tasks.c.project_id.in_(project_ids)
+        ).group_by(tasks.c.project_id)
+
+        for p_id, count, last_update in connection.execute(task_query):
+            signatures[p_id][0] = count
+            signatures[p_id][1] = last_update
+
+        time_log_query = select([
+            tasks.c.project_id,
+            func.count(time_logs.c.id),
+            func.max(entities.c.date_updated)
+        ]).select_from(
+            time_logs
+            .join(tasks, time_logs.c.task_id == tasks.c.id)
+            .join(entities, time_logs.c.id == entities.c.id)
+        ).where(
+            tasks.c.project_id.in_(project_ids)
+        ).group_by(tasks.c.project_id)
+
+        for p_id, count, last_update in connection.execute(time_log_query):
+            signatures[p_id][2] = count
+            signatures[p_id][3] = last_update
+
+        return dict((p_id, tuple(sig)) for p_id, sig in signatures.items())
+
+    def _create_project_tjp_fragments(self, project_ids, connection):
+        """Returns the tjp representations of the given projects in the same
+        order.
+
+        When :attr:`.workers` is greater than 1, the project ids are
+        distributed to that many threads each rendering its share with its
+        own connection.
+
+        :param list project_ids: A list of Project ids.
+        :param connection: The database connection to use when there is only
+          one worker.
+        """
+        worker_count = min(self.workers, len(project_ids))
+        if worker_count <= 1:
+            return [
+                self._create_project_tjp_fragment(p_id, connection)
+                for p_id in project_ids
+            ]
+
+        engine = connection.engine
+        # interleave the projects to balance the load between the workers
+        chunks = [project_ids[i::worker_count] for i in range(worker_count)]
+
+        def render_chunk(chunk):
+            worker_connection = engine.connect()
+            try:
+                return [
+                    self._create_project_tjp_fragment(p_id, worker_connection)
+                    for p_id in chunk
+                ]
+            finally:
+                worker_connection.close()
+
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(worker_count)
+        try:
+            results = pool.map(render_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+
+        fragments = [None] * len(project_ids)
+        for i, chunk_fragments in enumerate(results):
+            fragments[i::worker_count] = chunk_fragments
+        return fragments
+
+    @classmethod
+    def clear_tjp_cache(cls, project_ids=None):
+        """Clears the cached tjp fragments used in incremental mode.
+
+        Use it when the data is changed with bulk SQL statements that doesn't
+        update the ``date_updated`` attribute of the Tasks or TimeLogs.
+
+        :param list project_ids: The ids of the Projects to clear the cache
+          of. The default is None which clears the cache of all of the
+          Projects.
+        """
+        if project_ids is None:
+            _tjp_fragment_cache.clear()
+        else:
+            for p_id in project_ids:
+                _tjp_fragment_cache.pop(p_id, None)
+
+    def _create_tasks_buffer(self):
+        """Renders the tjp representation of the tasks of all of the projects.
+
+        In incremental mode, only the Projects that are changed since their
+        last rendering are rendered, and cached fragments are used for the
+        others.
+        """
+        from stalker.db.session import DBSession
+        connection = DBSession.connection()
+        project_ids = self._get_project_ids()
 
-                        dep_full_path = '.'.join(
-                            map(lambda x: 'Task_%s' % x,
-                                dep_full_ids.split('-'))
-                        )
-                        # fix for Project id
-                        dep_full_path = 'Project_%s' % dep_full_path[5:]
+        if not self.incremental:
+            return '\n'.join(
+                self._create_project_tjp_fragments(project_ids, connection)
+            )
 
-                        dep_string = '%s {%s}' % (
-                            dep_full_path, dependency_target)
+        self._update_tjp_cache(project_ids, connection)
+        return '\n'.join(
+            _tjp_fragment_cache[p_id][1] for p_id in project_ids
+        )
 
-                        dep_buffer.append(dep_string)
+    def _update_tjp_cache(self, project_ids, connection):
+        """Renders the tjp representation of the given Projects that are
+        changed since their last rendering and updates the cache.
 
-                    result_buffer.append(''.join(dep_buffer))
+        :param list project_ids: A list of Project ids.
+        :param connection: The database connection to run the queries with.
+        """
+        signatures = self._project_signatures(project_ids, connection)
+        changed_project_ids = []
+        for p_id in project_ids:
+            cached = _tjp_fragment_cache.get(p_id)
+            if cached is None \
+               or cached[0] != signatures[p_id] \
+               or p_id in _dirty_project_ids:
+                logger.debug('rendering tjp of Project with id: %s' % p_id)
+                changed_project_ids.append(p_id)
+            else:
+                logger.debug(
+                    'using cached tjp of Project with id: %s' % p_id
+                )
 
-                # append schedule model and timing information
-                # if this is a leaf task and has resources
-                if is_leaf and resource_ids:
-                    result_buffer.append(
-                        '%s  %s %s%s' % (
-                            tab, schedule_model, schedule_timing,
-                            schedule_unit
-                        )
-                    )
+        for p_id, fragment in zip(
+                changed_project_ids,
+                self._create_project_tjp_fragments(changed_project_ids,
+                                                   connection)):
+            _tjp_fragment_cache[p_id] = (signatures[p_id], fragment)
+            _dirty_project_ids.discard(p_id)
 
-                    resource_buffer = ['%s  allocate ' % tab]
-                    for i, resource_id in enumerate(resource_ids):
-                        if i > 0:
-                            resource_buffer.append(', ')
-                        resource_buffer.append('User_%s' % resource_id)
-
-                        # now go through alternatives
-                        if alternative_resource_ids:
-                            resource_buffer.append(' { alternative ')
-                            for j, alt_resource_id in \
-                                    enumerate(alternative_resource_ids):
-                                if j > 0:
-                                    resource_buffer.append(', ')
-                                resource_buffer.append(
-                                    'User_%s' % alt_resource_id)
-
-                            # set the allocation strategy
-                            resource_buffer.append(
-                                ' select %s' % allocation_strategy)
-
-                            # is is persistent
-                            if persistent_allocation:
-                                resource_buffer.append(' persistent')
-                            resource_buffer.append(' }')
-
-                    result_buffer.append(''.join(resource_buffer))
-
-                    # append any time log information
-                    if time_log_array:
-                        json_data = json.loads(
-                            time_log_array.replace('{', '[')
-                            .replace('}', ']')
-                            .replace('(', '')
-                            .replace(')', '')
-                        )  # it is an array of string
-
-                        for tlog in json_data:
-                            user_id, t_start, t_end = tlog.split(',')
-                            result_buffer.append(
-                                '%s  booking %s %s - %s { overtime 2 }' % (
-                                    tab, user_id, t_start, t_end
-                                )
-                            )
-
-                previous_level = depth
-                num_of_records += 1
-
-            # and close the brackets per project
-            depth = 0  # current depth is 0 (Project)
-            # previous_level is the last task
-            for i in range(previous_level - depth + 1):
-                i_tab = '  ' * (previous_level - i)
-                result_buffer.append('%s}' % i_tab)
+    def _render_tjp_template(self, tasks_buffer):
+        """renders the main tjp template with the given tasks buffer
+        """
+        from jinja2 import Template
 
-        tasks_buffer = '\n'.join(result_buffer)
+        # use new way of doing it, it will just work with PostgreSQL
+        from stalker import defaults
+        template = Template(defaults.tjp_main_template2)
 
         import stalker
-        self.tjp_content = template.render({
+        return template.render({
             'stalker': stalker,
             'studio': self.studio,
             'csv_file_name': self.temp_file_name,
@@ -508,20 +1924,71 @@ order by path_as_text"""
             'tasks_buffer': tasks_buffer
         })
 
+    def _create_tjp_file_content(self):
+        """creates the tjp file content
+        """
+        start = time.time()
+
+        tasks_buffer = self._create_tasks_buffer()
+        self.tjp_content = self._render_tjp_template(tasks_buffer)
+
+        end = time.time()
         logger.debug(
-            'total number of records: %s' % num_of_records
+            'rendering the whole tjp file took : %s seconds' % (end - start)
         )
 
+    def _write_tjp(self, stream):
+        """Writes the tjp content to the given file like object without
+        building it in memory.
+
+        The main template is rendered around a marker and the tasks of each
+        Project are written between the header and the footer line by line,
+        as they are fetched with a server side cursor. In incremental mode
+        the cached tjp fragments are written instead.
+
+        :param stream: A file like object that has a ``write()`` method.
+        """
+        start = time.time()
+
+        header, footer = \
+            self._render_tjp_template(TJP_TASKS_MARKER).split(TJP_TASKS_MARKER)
+        stream.write(header)
+
+        from stalker.db.session import DBSession
+        connection = DBSession.connection()
+        project_ids = self._get_project_ids()
+
+        if self.incremental:
+            self._update_tjp_cache(project_ids, connection)
+            for i, p_id in enumerate(project_ids):
+                if i:
+                    stream.write('\n')
+                stream.write(_tjp_fragment_cache[p_id][1])
+        else:
+            connection = connection.execution_options(stream_results=True)
+            for i, p_id in enumerate(project_ids):
+                for j, line in enumerate(
+                        self._project_tjp_lines(p_id, connection)):
+                    if i or j:
+                        stream.write('\n')
+                    stream.write(line)
+
+        stream.write(footer)
+
         end = time.time()
         logger.debug(
-            'rendering the whole tjp file took : %s seconds' % (end - start)
+            'streaming the whole tjp file took : %s seconds' % (end - start)
         )
 
     def _fill_tjp_file(self):
-        """fills the tjp file with content
+        """fills the tjp file with content, in streaming mode the content is
+        directly written to the file
         """
         with open(self.tjp_file_full_path, 'w+') as self.tjp_file:
-            self.tjp_file.write(self.tjp_content)
+            if self.streaming:
+                self._write_tjp(self.tjp_file)
+            else:
+                self.tjp_file.write(self.tjp_content)
 
     def _delete_tjp_file(self):
         """deletes the temp tjp file
@@ -549,121 +2016,255 @@ order by path_as_text"""
         """parses back the csv file and fills the tasks with computes_start and
         computed_end values
         """
-        parsing_start = time.time()
-
         logger.debug('csv_file_full_path : %s' % self.csv_file_full_path)
         if not os.path.exists(self.csv_file_full_path):
             logger.debug('could not find CSV file, '
                          'returning without updating db!')
             return
 
-        from stalker import Task, Project
-        from stalker.models.task import Task_Computed_Resources
-
-        entity_ids = []
-        update_data = []
-        update_user_data = []
-
         with open(self.csv_file_full_path, 'r') as self.csv_file:
             csv_content = csv.reader(self.csv_file, delimiter=';')
 
-            lines = [line for line in csv_content]
-            lines.pop(0)
+            # skip the header
+            next(csv_content, None)
+            self._parse_csv_lines(csv_content)
+
+    def _parse_csv_lines(self, lines):
+        """fills the tasks and projects with computed_start and computed_end
+        values from the given csv rows
+
+        The Task and Project rows are separated by looking to their ids
+        (Task ids are always under a Project, like ``Project_1.Task_3``), so
+        each table is only updated with its own rows.
+
+        :param lines: An iterable of csv rows without the header row.
+        """
+        parsing_start = time.time()
+
+        from stalker import Task, Project
+
+        task_rows = []
+        project_rows = []
+        computed_resources = {}
 
         for data in lines:
             id_line = data[0]
+            entity_id = int(id_line[id_line.rindex('_') + 1:])
+            if not entity_id:
+                continue
 
-            entity_id = int(id_line.split('.')[-1].split('_')[-1])
+            if '.' not in id_line:
+                project_rows.append((entity_id, data[1], data[2]))
+                continue
 
-            if entity_id:
-                entity_ids.append(entity_id)
-                start_date = datetime.datetime.strptime(
-                    data[1], "%Y-%m-%d-%H:%M"
-                )
-                end_date = datetime.datetime.strptime(
-                    data[2],
-                    "%Y-%m-%d-%H:%M"
+            task_rows.append((entity_id, data[1], data[2]))
+
+            # computed_resources
+            if self.compute_resources:
+                computed_resources[entity_id] = set(
+                    int(resource.split('_')[-1].split(')')[0])
+                    for resource in data[3].split(',') if resource
                 )
 
-                # implement time zone info
-                start_date = start_date.replace(tzinfo=pytz.utc)
-                end_date = end_date.replace(tzinfo=pytz.utc)
+        from stalker.db.session import DBSession
+        connection = DBSession.connection()
 
-                # computed_resources
-                if self.compute_resources:
-                    if data[3] != '':
-                        resources_data = map(
-                            lambda x: x.split('_')[-1].split(')')[0],
-                            data[3].split(',')
-                        )
-                        for rid in resources_data:
-                            update_user_data.append({
-                                'task_id': entity_id,
-                                'resource_id': rid
-                            })
-
-                update_data.append({
-                    'b_id': entity_id,
-                    'start': start_date,
-                    'end': end_date,
-                    'computed_start': start_date,
-                    'computed_end': end_date
-                })
+        # update date values
+        self._update_computed_dates(Task.__table__, task_rows, connection)
+        self._update_computed_dates(
+            Project.__table__, project_rows, connection
+        )
 
-        from sqlalchemy import bindparam
+        # update computed resources data of the scheduled tasks only
+        if self.compute_resources:
+            self._update_computed_resources(computed_resources, connection)
 
-        # update date values
-        update_statement = Task.__table__.update()\
-            .where(Task.__table__.c.id == bindparam('b_id'))\
-            .values(
-                start=bindparam('start'),
-                end=bindparam('end'),
-                computed_start=bindparam('computed_start'),
-                computed_end=bindparam('computed_end')
-            )
-        from stalker.db.session import DBSession
-        DBSession.connection().execute(
-            update_statement,
-            update_data
+        parsing_end = time.time()
+        logger.debug(
+            'completed parsing csv file in (SQL): %s seconds' %
+            (parsing_end - parsing_start)
         )
 
-        # update project dates
-        update_project_statement = Project.__table__.update()\
-            .where(Project.__table__.c.id == bindparam('b_id'))\
+    @classmethod
+    def _update_computed_dates(cls, table, rows, connection):
+        """Updates the start, end, computed_start and computed_end values of
+        the given table with the given rows.
+
+        On PostgreSQL (with psycopg2) the rows are copied in to a temp table
+        with ``COPY`` and the table is updated with one ``UPDATE ... FROM``
+        statement, on other databases an executemany update is used.
+
+        :param table: The Tasks or the Projects table.
+        :param list rows: A list of (id, start, end) tuples, where the start
+          and end values are strings in TaskJuggler format
+          (``%Y-%m-%d-%H:%M``) and in UTC.
+        :param connection: The database connection to run the queries with.
+        """
+        if not rows:
+            return
+
+        if connection.dialect.name == 'postgresql' \
+           and connection.dialect.driver == 'psycopg2':
+            cls._copy_computed_dates(table, rows, connection)
+            return
+
+        from sqlalchemy import bindparam
+        dates = {}
+
+        def to_date(value):
+            # there are a lot less distinct dates than the rows
+            date = dates.get(value)
+            if date is None:
+                date = parse_tj_date(value)
+                dates[value] = date
+            return date
+
+        update_data = []
+        for entity_id, start, end in rows:
+            start_date = to_date(start)
+            end_date = to_date(end)
+            update_data.append({
+                'b_id': entity_id,
+                'start': start_date,
+                'end': end_date,
+                'computed_start': start_date,
+                'computed_end': end_date
+            })
+
+        update_statement = table.update()\
+            .where(table.c.id == bindparam('b_id'))\
             .values(
                 start=bindparam('start'),
                 end=bindparam('end'),
                 computed_start=bindparam('computed_start'),
                 computed_end=bindparam('computed_end')
             )
-        DBSession.connection().execute(
-            update_project_statement,
-            update_data
-        )
+        connection.execute(update_statement, update_data)
 
-        # update computed resources data
-        # first delete everything
-        if self.compute_resources:
-            delete_resources_statement = Task_Computed_Resources.delete()
+    @classmethod
+    def _copy_computed_dates(cls, table, rows, connection):
+        """Updates the dates of the given table by copying the rows to a temp
+        table and joining it in an ``UPDATE ... FROM`` statement. It is
+        PostgreSQL (psycopg2) specific.
+        """
+        import io
 
-            update_resources_statement = Task_Computed_Resources.insert()\
-                .values(
-                    task_id=bindparam('task_id'),
-                    resource_id=bindparam('resource_id')
-                )
+        # "2013-04-16-09:00" -> "2013-04-16 09:00+00", no need to create any
+        # datetime instances
+        buffer = io.StringIO(u'\n'.join(
+            u'%s\t%s %s+00\t%s %s+00' % (
+                entity_id, start[:10], start[11:], end[:10], end[11:]
+            )
+            for entity_id, start, end in rows
+        ))
 
-            DBSession.connection().execute(delete_resources_statement)
-            DBSession.connection().execute(
-                update_resources_statement,
-                update_user_data
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(
+                'create temp table "TJ_Computed_Dates" ('
+                'id integer primary key, '
+                'start timestamp with time zone, '
+                '"end" timestamp with time zone'
+                ')'
+            )
+            cursor.copy_expert('copy "TJ_Computed_Dates" from stdin', buffer)
+            cursor.execute(
+                'update "%(table)s" set '
+                'start = d.start, "end" = d."end", '
+                'computed_start = d.start, computed_end = d."end" '
+                'from "TJ_Computed_Dates" as d '
+                'where "%(table)s".id = d.id' % {'table': table.name}
             )
+            cursor.execute('drop table "TJ_Computed_Dates"')
+        finally:
+            cursor.close()
+
+    def _schedule_with_pipes(self):
+        """Does the scheduling without any temp files. The tjp content is
+        written to the stdin of tj3 and the csv report is read from its stdout
+        while tj3 is running.
+        """
+        from stalker import defaults
 
-        parsing_end = time.time()
-        logger.debug(
-            'completed parsing csv file in (SQL): %s seconds' %
-            (parsing_end - parsing_start)
+        # a "." as the report name makes tj3 write the report to stdout
+        self.temp_file_name = '.'
+        self.temp_file_full_path = None
+
+        # and a "." as the file name makes it read the project from stdin
+        process = subprocess.Popen(
+            [defaults.tj_command, '--silent', '--no-color', '.'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
         )
 
+        stdout_buffer = []
+        stderr_buffer = []
+
+        def read_stdout():
+            for line in iter(process.stdout.readline, b''):
+                stdout_buffer.append(line.decode('utf-8'))
+
+        def read_stderr():
+            for line in iter(process.stderr.readline, b''):
+                line = line.decode('utf-8').strip()
+                stderr_buffer.append(line)
+                logger.debug(line)
+
+        # drain the outputs in the background, so tj3 doesn't block on a full
+        # pipe, the session is only used in this thread
+        readers = [
+            threading.Thread(target=read_stdout),
+            threading.Thread(target=read_stderr)
+        ]
+        for reader in readers:
+            reader.daemon = True
+            reader.start()
+
+        write_error = None
+        try:
+            stdin = codecs.getwriter('utf-8')(process.stdin)
+            if self.streaming:
+                self._write_tjp(stdin)
+            else:
+                self._create_tjp_file_content()
+                stdin.write(self.tjp_content)
+        except IOError as e:
+            # tj3 exited before reading the whole content
+            write_error = e
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            try:
+                process.stdin.close()
+            except IOError:
+                pass
+
+        return_code = process.wait()
+        for reader in readers:
+            reader.join()
+
+        # flatten the buffer
+        stderr_buffer = '\n'.join(stderr_buffer)
+        logger.debug('tj3 return code: %s' % return_code)
+
+        if return_code:
+            # there is an error
+            raise RuntimeError(stderr_buffer)
+
+        if write_error is not None:
+            raise write_error
+
+        # skip anything before the header of the csv report
+        lines = list(itertools.dropwhile(
+            lambda row: len(row) < 3,
+            csv.reader(stdout_buffer, delimiter=';')
+        ))[1:]
+        self._parse_csv_lines(lines)
+
+        return stderr_buffer
+
     def schedule(self):
         """Does the scheduling.
         """
@@ -677,11 +2278,15 @@ order by path_as_text"""
                 (self.__class__.__name__, self.studio.__class__.__name__)
             )
 
+        if self.use_pipes and os.name != 'nt':
+            return self._schedule_with_pipes()
+
         # create a tjp file
         self._create_tjp_file()
 
         # create tjp file content
-        self._create_tjp_file_content()
+        if not self.streaming:
+            self._create_tjp_file_content()
 
         # fill it with data
         self._fill_tjp_file()
@@ -741,44 +2346,879 @@ order by path_as_text"""
 
         return stderr_buffer
 
-    def _validate_projects(self, projects):
-        """validates the given projects value
+
+class _NativeTask(object):
+    """Holds the scheduling data of a Task for the :class:`.NativeScheduler`.
+    """
+
+    __slots__ = [
+        'id', 'project_id', 'parent_id', 'priority', 'schedule_timing',
+        'schedule_unit', 'schedule_model', 'schedule_constraint', 'start',
+        'end', 'allocation_strategy', 'persistent_allocation', 'children',
+        'resource_ids', 'alternative_resource_ids', 'dependencies',
+        'time_logs', 'computed_start', 'computed_end', 'computed_resource_ids'
+    ]
+
+    def __init__(self, id, project_id, parent_id, priority, schedule_timing,
+                 schedule_unit, schedule_model, schedule_constraint, start,
+                 end, allocation_strategy, persistent_allocation):
+        self.id = id
+        self.project_id = project_id
+        self.parent_id = parent_id
+        self.priority = priority
+        self.schedule_timing = schedule_timing
+        self.schedule_unit = schedule_unit
+        self.schedule_model = schedule_model
+        self.schedule_constraint = schedule_constraint
+        self.start = start
+        self.end = end
+        self.allocation_strategy = allocation_strategy
+        self.persistent_allocation = persistent_allocation
+
+        self.children = []
+        self.resource_ids = []
+        self.alternative_resource_ids = []
+        # (depends_to_id, dependency_target, gap_timing, gap_unit, gap_model)
+        self.dependencies = []
+        # (resource_id, start, end)
+        self.time_logs = []
+
+        # the results, start and end values are in slots
+        self.computed_start = None
+        self.computed_end = None
+        self.computed_resource_ids = set()
+
+    @property
+    def is_leaf(self):
+        return not self.children
+
+
+class NativeScheduler(SchedulerBase):
+    """A pure Python resource leveling scheduler.
+
+    NativeScheduler solves the scheduling problem in process without
+    needing TaskJuggler. It reads the Task, TaskDependency, TimeLog and
+    Vacation data with a couple of queries, schedules the leaf tasks in
+    dependency order and writes the computed_start, computed_end and
+    computed_resources values back in bulk like the
+    :class:`.TaskJugglerScheduler` does.
+
+    The time between the :attr:`.Studio.start` and :attr:`.Studio.end` is
+    divided in to slots of :attr:`.Studio.timing_resolution` and the
+    availability of the Studio and each resource is stored in a ``bytearray``
+    with one byte per slot. The Studio calendar is build from the
+    :attr:`.Studio.working_hours` and the Studio wide :class:`.Vacation`
+    instances, the calendar of each resource is a copy of the Studio calendar
+    with their own vacations and :class:`.TimeLog` bookings removed.
+
+    The leaf tasks are scheduled as soon as possible, one by one, by picking
+    the one that has the highest :attr:`.Task.priority` between the tasks
+    that have all of their dependencies scheduled. Priorities are inherited
+    from the parent tasks (if a task has the default priority of 500) and so
+    are the dependencies. The container tasks and projects span their
+    children.
+
+    The scheduler supports the following directives:
+
+      * **effort**: The task is finished when the resources have worked for
+        the given amount of work time. Each resource contributes in
+        proportion to its :attr:`.User.efficiency`.
+      * **length**: The task lasts for the given amount of Studio working
+        time, resources are allocated if they are available.
+      * **duration**: The task lasts for the given amount of calendar time,
+        resources are allocated if they are available.
+      * :attr:`.Task.schedule_constraint`: A constrained start is the
+        earliest start of the task, a constrained end schedules the task as
+        late as possible and constraining both fixes the task dates.
+      * :class:`.TaskDependency`: ``onend`` and ``onstart`` targets, with
+        ``length`` or ``duration`` gaps.
+      * :attr:`.Task.alternative_resources`: Every resource of the task is
+        an allocation which may be replaced by one of the alternative
+        resources by using the :attr:`.Task.allocation_strategy` and
+        :attr:`.Task.persistent_allocation` values. ``minallocated`` picks the
+        resource that is a candidate in the smallest number of allocations,
+        ``minloaded`` and ``maxloaded`` pick the least and most allocated
+        resources so far, ``order`` picks the first available one and
+        ``random`` picks a random one.
+      * :class:`.TimeLog`: Time logs are bookings, the booked time is
+        reserved for the resource and counts towards the effort of the task,
+        and the rest of the task is not scheduled before the
+        :attr:`.Studio.now`.
+
+    Tasks that can not be fitted before the :attr:`.Studio.end` will raise a
+    RuntimeError.
+
+    :param bool compute_resources: When set to True the
+      :attr:`.Task.computed_resources` attribute of each leaf task is filled
+      with the resources that are allocated to or booked for the task.
+      The default is False.
+    :param list projects: A list of :class:`.Project` instances to schedule.
+      When skipped or given as an empty list all the projects are scheduled.
+    """
+
+    _one = b'\x01'
+
+    def __init__(self, studio=None, compute_resources=False, projects=None):
+        super(NativeScheduler, self).__init__(studio, projects)
+        self.compute_resources = compute_resources
+
+        self.origin = None
+        self.resolution = None
+        self.slot_count = 0
+        self.working_slots = None
+        self.resource_slots = {}
+
+        self._tasks = {}
+        self._efficiencies = {}
+        self._allocation_factors = {}
+        self._loads = {}
+        self._random = random.Random()
+
+    def _to_slot(self, date, round_up=False):
+        """returns the slot index of the given datetime, the returned index
+        may be outside of the timeline
+
+        :param date: A datetime.datetime instance.
+        :param bool round_up: Rounds up to the next slot if True.
         """
-        if projects is None:
-            projects = []
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=pytz.utc)
+        delta = date - self.origin
+        seconds = delta.days * 86400 + delta.seconds
+        if round_up:
+            return -(-seconds // self.resolution)
+        return seconds // self.resolution
+
+    def _to_datetime(self, slot):
+        """returns the datetime of the given slot index
+        """
+        return self.origin + datetime.timedelta(
+            seconds=slot * self.resolution
+        )
 
-        msg = '%(class)s.projects should be a list of ' \
-            'stalker.models.project.Project instances, not ' \
-            '%(projects_class)s'
+    def _clear_slots(self, slots, start, end):
+        """clears the slots between the given start and end datetimes
+        """
+        start = max(0, self._to_slot(start))
+        end = min(self.slot_count, self._to_slot(end, round_up=True))
+        if start < end:
+            slots[start:end] = bytearray(end - start)
 
-        if not isinstance(projects, list):
-            raise TypeError(
-                msg % {
-                    'class': self.__class__.__name__,
-                    'projects_class': projects.__class__.__name__
-                }
+    def _create_timeline(self):
+        """creates the working slots of the Studio
+        """
+        studio_start = self.studio.start.astimezone(pytz.utc)
+        self.origin = datetime.datetime(
+            studio_start.year, studio_start.month, studio_start.day,
+            tzinfo=pytz.utc
+        )
+        timing_resolution = self.studio.timing_resolution
+        self.resolution = \
+            timing_resolution.days * 86400 + timing_resolution.seconds
+        self.slot_count = max(
+            0, self._to_slot(self.studio.end, round_up=True)
+        )
+
+        # build the slots of one week and repeat it for the whole timeline
+        slot_minutes = self.resolution // 60
+        week_slots = 604800 // self.resolution \
+            if 604800 % self.resolution == 0 else self.slot_count
+        week = bytearray(week_slots)
+        for i in range(week_slots):
+            date = self._to_datetime(i)
+            minute = date.hour * 60 + date.minute
+            for start, end in self.studio.working_hours[date.weekday()]:
+                if start <= minute and minute + slot_minutes <= end:
+                    week[i] = 1
+                    break
+
+        repeat = -(-self.slot_count // week_slots) if week_slots else 0
+        self.working_slots = (week * repeat)[:self.slot_count]
+
+    def _load_data(self, project_ids, connection):
+        """loads the data of the tasks of the given projects
+        """
+        from sqlalchemy import select
+        from stalker import Task, TaskDependency, TimeLog, User, Vacation
+        from stalker.models.task import (Task_Resources,
+                                         Task_Alternative_Resources)
+
+        tasks_table = Task.__table__
+        self._tasks = {}
+        if not project_ids:
+            return
+
+        project_filter = tasks_table.c.project_id.in_(project_ids)
+
+        task_query = select([
+            tasks_table.c.id,
+            tasks_table.c.project_id,
+            tasks_table.c.parent_id,
+            tasks_table.c.priority,
+            tasks_table.c.schedule_timing,
+            tasks_table.c.schedule_unit,
+            tasks_table.c.schedule_model,
+            tasks_table.c.schedule_constraint,
+            tasks_table.c.start,
+            tasks_table.c.end,
+            tasks_table.c.allocation_strategy,
+            tasks_table.c.persistent_allocation,
+        ]).where(project_filter).order_by(tasks_table.c.id)
+
+        for row in connection.execute(task_query):
+            self._tasks[row[0]] = _NativeTask(*row)
+
+        for task in self._tasks.values():
+            if task.parent_id is not None:
+                self._tasks[task.parent_id].children.append(task.id)
+
+        def task_rows(table, *columns):
+            """returns the rows of the given table that are related to the
+            loaded tasks
+            """
+            return connection.execute(
+                select(list(columns)).select_from(
+                    table.join(tasks_table, table.c.task_id == tasks_table.c.id)
+                ).where(project_filter).order_by(*columns[:2])
             )
 
-        from stalker import Project
-        for item in projects:
-            if not isinstance(item, Project):
-                raise TypeError(
-                    msg % {
-                        'class': self.__class__.__name__,
-                        'projects_class': item.__class__.__name__
-                    }
+        for task_id, resource_id in task_rows(
+                Task_Resources,
+                Task_Resources.c.task_id,
+                Task_Resources.c.resource_id):
+            self._tasks[task_id].resource_ids.append(resource_id)
+
+        for task_id, resource_id in task_rows(
+                Task_Alternative_Resources,
+                Task_Alternative_Resources.c.task_id,
+                Task_Alternative_Resources.c.resource_id):
+            self._tasks[task_id].alternative_resource_ids.append(resource_id)
+
+        dependencies = TaskDependency.__table__
+        for row in task_rows(
+                dependencies,
+                dependencies.c.task_id,
+                dependencies.c.depends_to_id,
+                dependencies.c.dependency_target,
+                dependencies.c.gap_timing,
+                dependencies.c.gap_unit,
+                dependencies.c.gap_model):
+            self._tasks[row[0]].dependencies.append(tuple(row[1:]))
+
+        time_logs = TimeLog.__table__
+        for task_id, resource_id, start, end in task_rows(
+                time_logs,
+                time_logs.c.task_id,
+                time_logs.c.resource_id,
+                time_logs.c.start,
+                time_logs.c.end):
+            self._tasks[task_id].time_logs.append((resource_id, start, end))
+
+        # resources
+        resource_ids = set()
+        for task in self._tasks.values():
+            resource_ids.update(task.resource_ids)
+            resource_ids.update(task.alternative_resource_ids)
+            resource_ids.update(t[0] for t in task.time_logs)
+
+        self._efficiencies = {}
+        self.resource_slots = {}
+        self._loads = {}
+        if resource_ids:
+            users = User.__table__
+            for resource_id, efficiency in connection.execute(
+                    select([users.c.id, users.c.efficiency])
+                    .where(users.c.id.in_(resource_ids))):
+                self._efficiencies[resource_id] = \
+                    efficiency if efficiency is not None else 1.0
+                self.resource_slots[resource_id] = \
+                    bytearray(self.working_slots)
+                self._loads[resource_id] = 0
+
+        # vacations
+        vacations = Vacation.__table__
+        for user_id, start, end in connection.execute(
+                select([vacations.c.user_id, vacations.c.start,
+                        vacations.c.end])):
+            if user_id is None:
+                self._clear_slots(self.working_slots, start, end)
+                for slots in self.resource_slots.values():
+                    self._clear_slots(slots, start, end)
+            elif user_id in self.resource_slots:
+                self._clear_slots(self.resource_slots[user_id], start, end)
+
+    def _get_allocations(self, task):
+        """returns the candidate resource ids of each allocation of the given
+        task
+        """
+        allocations = []
+        for resource_id in task.resource_ids:
+            allocation = [resource_id]
+            allocation.extend(
+                r_id for r_id in task.alternative_resource_ids
+                if r_id != resource_id
+            )
+            allocations.append(allocation)
+        return allocations
+
+    def _pick_resource(self, candidates, slot, strategy, exclude):
+        """picks one of the available candidates at the given slot by using
+        the given allocation strategy
+        """
+        available = [
+            r_id for r_id in candidates
+            if r_id not in exclude and self.resource_slots[r_id][slot]
+        ]
+        if not available:
+            return None
+
+        if len(available) == 1 or strategy == 'order':
+            return available[0]
+        elif strategy == 'minallocated':
+            return min(available, key=self._allocation_factors.get)
+        elif strategy == 'minloaded':
+            return min(available, key=self._loads.get)
+        elif strategy == 'maxloaded':
+            return max(available, key=self._loads.get)
+        return self._random.choice(available)
+
+    def _allocate_slot(self, task, slot, allocations, chosen, journal,
+                       needed=None):
+        """allocates the resources of the given task at the given slot and
+        returns the work time done in seconds
+
+        :param task: The _NativeTask instance.
+        :param int slot: The slot index.
+        :param list allocations: The candidates of each allocation.
+        :param list chosen: The resources picked by persistent allocations.
+        :param list journal: The allocated (resource_id, slot) pairs are
+          appended to this list.
+        :param needed: The remaining effort in seconds, None for tasks which
+          are not effort based.
+        """
+        done = 0
+        for i, candidates in enumerate(allocations):
+            if needed is not None and done >= needed:
+                break
+
+            resource_id = chosen[i]
+            if resource_id is not None:
+                if not self.resource_slots[resource_id][slot]:
+                    continue
+            else:
+                resource_id = self._pick_resource(
+                    candidates, slot, task.allocation_strategy,
+                    chosen if task.persistent_allocation else ()
+                )
+                if resource_id is None:
+                    continue
+                if task.persistent_allocation:
+                    chosen[i] = resource_id
+
+            self.resource_slots[resource_id][slot] = 0
+            self._loads[resource_id] += 1
+            journal.append((resource_id, slot))
+            done += self.resolution * self._efficiencies[resource_id]
+        return done
+
+    def _next_slot(self, slots_list, slot, step, bound):
+        """returns the index of the first available slot in any of the given
+        slot arrays starting from the given slot and going in the given
+        direction, or None if there is no available slot before the bound
+        """
+        result = None
+        for slots in slots_list:
+            if step > 0:
+                i = slots.find(self._one, slot, bound)
+                if i != -1 and (result is None or i < result):
+                    result = i
+            else:
+                i = slots.rfind(self._one, bound, slot + 1)
+                if i != -1 and (result is None or i > result):
+                    result = i
+        return result
+
+    def _allocate(self, task, model, seconds, slot, step, bound):
+        """allocates the given amount of work for the given task starting
+        from the given slot and returns the (start, end) slots, or None if
+        the task doesn't fit before the bound.
+
+        :param task: The _NativeTask instance.
+        :param str model: The schedule model, one of 'effort', 'length' or
+          'duration'.
+        :param seconds: The amount of work in seconds.
+        :param int slot: The slot to start from.
+        :param int step: 1 to schedule forwards, -1 to schedule backwards.
+        :param int bound: The last slot (exclusive) that can be used.
+        """
+        allocations = self._get_allocations(task)
+        chosen = [None] * len(allocations)
+        journal = []
+        if model == 'effort':
+            # resources with zero efficiency can not finish an effort
+            allocations = [
+                [r_id for r_id in candidates if self._efficiencies[r_id] > 0]
+                for candidates in allocations
+            ]
+            if not any(allocations):
+                model = 'length'
+
+        first = last = None
+        if model == 'duration':
+            count = -(-int(seconds) // self.resolution)
+            first = slot if step > 0 else slot - count + 1
+            last = first + count - 1
+            if first < 0 or last >= self.slot_count or \
+               (step > 0 and last >= bound) or (step < 0 and first < bound):
+                return None
+            for i in range(first, last + 1):
+                self._allocate_slot(task, i, allocations, chosen, journal)
+        elif model == 'length':
+            count = -(-int(seconds) // self.resolution)
+            for _ in range(count):
+                slot = self._next_slot([self.working_slots], slot, step, bound)
+                if slot is None:
+                    return self._rollback(journal)
+                self._allocate_slot(task, slot, allocations, chosen, journal)
+                first = slot if first is None else min(first, slot)
+                last = slot if last is None else max(last, slot)
+                slot += step
+        else:
+            remaining = seconds
+            while remaining > 0:
+                # only look to the resources that are still candidates
+                candidates = set()
+                for i, allocation in enumerate(allocations):
+                    if chosen[i] is not None:
+                        candidates.add(chosen[i])
+                    else:
+                        candidates.update(allocation)
+                slot = self._next_slot(
+                    [self.resource_slots[r_id] for r_id in candidates],
+                    slot, step, bound
                 )
+                if slot is None:
+                    return self._rollback(journal)
+                done = self._allocate_slot(
+                    task, slot, allocations, chosen, journal, remaining
+                )
+                if done:
+                    remaining -= done
+                    first = slot if first is None else min(first, slot)
+                    last = slot if last is None else max(last, slot)
+                slot += step
+
+        task.computed_resource_ids.update(r_id for r_id, _ in journal)
+        if first is None:
+            # milestone
+            return slot, slot
+        return first, last + 1
+
+    def _rollback(self, journal):
+        """frees the slots allocated by a failed allocation
+        """
+        for resource_id, slot in journal:
+            self.resource_slots[resource_id][slot] = 1
+            self._loads[resource_id] -= 1
+        return None
 
-        return projects
+    def _add_gap(self, slot, gap_timing, gap_unit, gap_model):
+        """returns the slot after the given gap
+        """
+        from stalker import TaskDependency
+        seconds = TaskDependency.to_seconds(gap_timing, gap_unit, gap_model)
+        if not seconds:
+            return slot
+        count = -(-int(seconds) // self.resolution)
+        if gap_model == 'duration':
+            return slot + count
+        for _ in range(count):
+            slot = self._next_slot(
+                [self.working_slots], slot, 1, self.slot_count
+            )
+            if slot is None:
+                return self.slot_count
+            slot += 1
+        return slot
 
-    @property
-    def projects(self):
-        """getter for the _project attribute
+    def _leaves(self, task_id, cache):
+        """returns the leaf task ids under the given task id
         """
-        return self._projects
+        if task_id not in cache:
+            task = self._tasks[task_id]
+            if task.is_leaf:
+                cache[task_id] = [task_id]
+            else:
+                leaves = []
+                for child_id in task.children:
+                    leaves.extend(self._leaves(child_id, cache))
+                cache[task_id] = leaves
+        return cache[task_id]
+
+    def _get_external_dates(self, task_ids, connection):
+        """returns the computed start and end slots of the given tasks which
+        are not scheduled by this scheduler
+        """
+        from sqlalchemy import select
+        from stalker import Task
+        tasks_table = Task.__table__
+        dates = {}
+        if not task_ids:
+            return dates
+        for task_id, start, end in connection.execute(
+                select([tasks_table.c.id, tasks_table.c.computed_start,
+                        tasks_table.c.computed_end])
+                .where(tasks_table.c.id.in_(task_ids))):
+            dates[task_id] = (
+                self._to_slot(start) if start is not None else None,
+                self._to_slot(end, round_up=True) if end is not None else None
+            )
+        return dates
 
-    @projects.setter
-    def projects(self, projects):
-        """setter for the _project attribute
+    def _schedule_task(self, task, earliest):
+        """schedules the given leaf task not before the given slot
         """
-        self._projects = self._validate_projects(projects)
+        from stalker import Task
+        from stalker.models.task import (CONSTRAIN_START, CONSTRAIN_END,
+                                         CONSTRAIN_BOTH)
+        seconds = Task.to_seconds(
+            task.schedule_timing, task.schedule_unit, task.schedule_model
+        ) or 0
+
+        # book the time logs
+        booked_start = booked_end = None
+        for resource_id, start, end in task.time_logs:
+            start_slot = self._to_slot(start)
+            end_slot = self._to_slot(end, round_up=True)
+            if booked_start is None or start_slot < booked_start:
+                booked_start = start_slot
+            if booked_end is None or end_slot > booked_end:
+                booked_end = end_slot
+            if task.schedule_model == 'effort':
+                seconds -= (end - start).total_seconds() * \
+                    self._efficiencies[resource_id]
+            if resource_id in task.resource_ids or \
+               resource_id in task.alternative_resource_ids:
+                task.computed_resource_ids.add(resource_id)
+
+        if booked_start is not None and task.schedule_model != 'effort':
+            # the task has already been started
+            earliest = min(earliest, max(0, booked_start))
+
+        constraint = task.schedule_constraint
+        result = None
+        if constraint == CONSTRAIN_BOTH:
+            start_slot = max(0, self._to_slot(task.start))
+            end_slot = min(self.slot_count,
+                           self._to_slot(task.end, round_up=True))
+            if seconds > 0:
+                self._allocate(task, task.schedule_model, seconds,
+                               start_slot, 1, end_slot)
+            result = start_slot, end_slot
+        elif seconds <= 0:
+            # all of the effort is booked or it is a milestone
+            result = earliest, earliest
+            if booked_start is not None:
+                result = booked_start, booked_end
+        else:
+            if constraint == CONSTRAIN_START:
+                earliest = max(earliest, self._to_slot(task.start))
+            elif constraint == CONSTRAIN_END:
+                result = self._allocate(
+                    task, task.schedule_model, seconds,
+                    self._to_slot(task.end, round_up=True) - 1, -1, earliest
+                )
+
+            if result is None:
+                result = self._allocate(
+                    task, task.schedule_model, seconds, earliest, 1,
+                    self.slot_count
+                )
+
+        if result is None:
+            raise RuntimeError(
+                'Task_%s does not fit in to the Studio time frame (%s - %s)' %
+                (task.id, self.studio.start, self.studio.end)
+            )
+
+        start_slot, end_slot = result
+        if booked_start is not None:
+            start_slot = min(start_slot, booked_start)
+            end_slot = max(end_slot, booked_end)
+
+        task.computed_start = start_slot
+        task.computed_end = end_slot
+
+    def _schedule_tasks(self, connection):
+        """schedules all the loaded tasks
+        """
+        from stalker.exceptions import CircularDependencyError
+
+        # priorities and dependencies are inherited from the parents
+        priorities = {}
+        inherited_dependencies = {}
+
+        def inherit(task_id):
+            if task_id not in priorities:
+                task = self._tasks[task_id]
+                priority = task.priority
+                dependencies = list(task.dependencies)
+                if task.parent_id is not None:
+                    parent_priority, parent_dependencies = \
+                        inherit(task.parent_id)
+                    if priority == 500:
+                        priority = parent_priority
+                    dependencies.extend(parent_dependencies)
+                priorities[task_id] = priority
+                inherited_dependencies[task_id] = dependencies
+            return priorities[task_id], inherited_dependencies[task_id]
+
+        leaves_cache = {}
+        leaves = []
+        for task in self._tasks.values():
+            if task.is_leaf:
+                leaves.append(task)
+            inherit(task.id)
+            for resource_id in task.resource_ids:
+                self._allocation_factors[resource_id] = \
+                    self._allocation_factors.get(resource_id, 0) + 1
+            for resource_id in task.alternative_resource_ids:
+                self._allocation_factors[resource_id] = \
+                    self._allocation_factors.get(resource_id, 0) + 1
+
+        # book the time logs of all the tasks first
+        for task in leaves:
+            for resource_id, start, end in task.time_logs:
+                self._clear_slots(self.resource_slots[resource_id], start, end)
+
+        # expand the dependencies to leaf tasks
+        external_ids = set()
+        constraints = {}
+        predecessors = {}
+        successors = dict((task.id, []) for task in leaves)
+        for task in leaves:
+            task_constraints = []
+            task_predecessors = set()
+            for depends_to_id, target, gap_timing, gap_unit, gap_model in \
+                    inherited_dependencies[task.id]:
+                if depends_to_id in self._tasks:
+                    dependency_leaves = [
+                        leaf_id
+                        for leaf_id in self._leaves(depends_to_id, leaves_cache)
+                        if leaf_id != task.id
+                    ]
+                    task_predecessors.update(dependency_leaves)
+                else:
+                    dependency_leaves = None
+                    external_ids.add(depends_to_id)
+                task_constraints.append(
+                    (depends_to_id, dependency_leaves, target, gap_timing,
+                     gap_unit, gap_model)
+                )
+            constraints[task.id] = task_constraints
+            predecessors[task.id] = len(task_predecessors)
+            for leaf_id in task_predecessors:
+                successors[leaf_id].append(task.id)
+
+        external_dates = self._get_external_dates(external_ids, connection)
+
+        now = self.studio.now
+        now_slot = max(0, self._to_slot(now, round_up=True))
+
+        def earliest_start(task):
+            earliest = now_slot
+            for depends_to_id, dependency_leaves, target, gap_timing, \
+                    gap_unit, gap_model in constraints[task.id]:
+                if dependency_leaves is None:
+                    reference = external_dates.get(depends_to_id, (None,
+                                                                   None))
+                    reference = \
+                        reference[1] if target == 'onend' else reference[0]
+                elif not dependency_leaves:
+                    continue
+                elif target == 'onend':
+                    reference = max(self._tasks[leaf_id].computed_end
+                                    for leaf_id in dependency_leaves)
+                else:
+                    reference = min(self._tasks[leaf_id].computed_start
+                                    for leaf_id in dependency_leaves)
+                if reference is None:
+                    continue
+                earliest = max(
+                    earliest,
+                    self._add_gap(reference, gap_timing, gap_unit, gap_model)
+                )
+            return earliest
+
+        ready = []
+        for i, task in enumerate(leaves):
+            if not predecessors[task.id]:
+                heapq.heappush(
+                    ready,
+                    (-priorities[task.id], earliest_start(task), i, task.id)
+                )
+
+        order = dict((task.id, i) for i, task in enumerate(leaves))
+        scheduled_count = 0
+        while ready:
+            _, earliest, _, task_id = heapq.heappop(ready)
+            task = self._tasks[task_id]
+            self._schedule_task(task, earliest)
+            scheduled_count += 1
+            for successor_id in successors[task_id]:
+                predecessors[successor_id] -= 1
+                if not predecessors[successor_id]:
+                    successor = self._tasks[successor_id]
+                    heapq.heappush(
+                        ready,
+                        (-priorities[successor_id], earliest_start(successor),
+                         order[successor_id], successor_id)
+                    )
+
+        if scheduled_count != len(leaves):
+            raise CircularDependencyError(
+                'One of the tasks %s is depending to the other' %
+                sorted(task_id for task_id, count in predecessors.items()
+                       if count)
+            )
+
+        # containers span their children
+        def span(task_id):
+            task = self._tasks[task_id]
+            if task.computed_start is None:
+                children = [span(child_id) for child_id in task.children]
+                task.computed_start = min(c.computed_start for c in children)
+                task.computed_end = max(c.computed_end for c in children)
+            return task
+
+        for task_id in self._tasks:
+            span(task_id)
+
+    def _update_db(self, connection):
+        """stores the scheduling results in the database
+        """
+        from sqlalchemy import bindparam
+        from stalker import Project, Task
+
+        update_data = []
+        project_dates = {}
+        computed_resources = {}
+        for task in self._tasks.values():
+            start = self._to_datetime(task.computed_start)
+            end = self._to_datetime(task.computed_end)
+            update_data.append({
+                'b_id': task.id,
+                'start': start,
+                'end': end,
+                'computed_start': start,
+                'computed_end': end
+            })
+
+            dates = project_dates.get(task.project_id)
+            if dates is None:
+                project_dates[task.project_id] = [start, end]
+            else:
+                dates[0] = min(dates[0], start)
+                dates[1] = max(dates[1], end)
+
+            if self.compute_resources:
+                computed_resources[task.id] = task.computed_resource_ids
+
+        if not update_data:
+            return
+
+        update_statement = Task.__table__.update()\
+            .where(Task.__table__.c.id == bindparam('b_id'))\
+            .values(
+                start=bindparam('start'),
+                end=bindparam('end'),
+                computed_start=bindparam('computed_start'),
+                computed_end=bindparam('computed_end')
+            )
+        connection.execute(update_statement, update_data)
+
+        update_project_statement = Project.__table__.update()\
+            .where(Project.__table__.c.id == bindparam('b_id'))\
+            .values(
+                start=bindparam('start'),
+                end=bindparam('end'),
+                computed_start=bindparam('computed_start'),
+                computed_end=bindparam('computed_end')
+            )
+        connection.execute(
+            update_project_statement,
+            [
+                {
+                    'b_id': project_id,
+                    'start': start,
+                    'end': end,
+                    'computed_start': start,
+                    'computed_end': end
+                }
+                for project_id, (start, end) in project_dates.items()
+            ]
+        )
+
+        if self.compute_resources:
+            self._update_computed_resources(computed_resources, connection)
+
+    def schedule(self):
+        """Does the scheduling.
+        """
+        from stalker import Studio
+        if not isinstance(self.studio, Studio):
+            raise TypeError(
+                '%s.studio should be an instance of '
+                'stalker.models.studio.Studio, not %s' %
+                (self.__class__.__name__, self.studio.__class__.__name__)
+            )
+
+        start = time.time()
+
+        from stalker.db.session import DBSession
+        connection = DBSession.connection()
+
+        self._allocation_factors = {}
+        self._create_timeline()
+        self._load_data(self._get_project_ids(), connection)
+        self._schedule_tasks(connection)
+        self._update_db(connection)
+
+        end = time.time()
+        logger.debug(
+            'scheduling %s tasks took: %s seconds' %
+            (len(self._tasks), end - start)
+        )
+        return ''
+
+
+@event.listens_for(Session, 'before_flush')
+def mark_changed_projects(session, flush_context, instances):
+    """Marks the Projects of the changed Tasks, TaskDependencies and TimeLogs
+    as dirty, so the incremental mode of the TaskJugglerScheduler renders them
+    again.
+    """
+    if not _tjp_fragment_cache:
+        # nothing is cached, so nothing to invalidate
+        return
+
+    from sqlalchemy import inspect
+    from stalker import Task, TaskDependency, TimeLog
+
+    for instance in itertools.chain(session.new, session.dirty,
+                                    session.deleted):
+        if isinstance(instance, Task):
+            if instance in session.deleted or \
+               inspect(instance).attrs.parent.history.has_changes():
+                # the paths of the task and its children are changed and
+                # the dependency info of other projects may point to them
+                _tjp_fragment_cache.clear()
+                return
+            task = instance
+        elif isinstance(instance, (TaskDependency, TimeLog)):
+            task = instance.task
+        else:
+            continue
+
+        if task is not None and task.project is not None:
+            _dirty_project_ids.add(task.project.id)
@@ -16,7 +16,7 @@
 # You should have received a copy of the Lesser GNU General Public License
 # along with Stalker.  If not, see <http://www.gnu.org/licenses/>
 
-from sqlalchemy import Table, Column, Integer, ForeignKey
+from sqlalchemy import Table, Column, Integer, ForeignKey, event
 from sqlalchemy.orm import relationship, validates
 
 from stalker.db.session import DBSession
@@ -31,6 +31,10 @@ import logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging_level)
 
+# increased whenever the name or the code of a Status is changed, the cached
+# status lookups of the StatusLists are built again when it changes
+_status_names_version = 0
+
 
 class Status(Entity, CodeMixin):
     """Defines object statutes.
@@ -216,16 +220,71 @@ class StatusList(Entity, TargetEntityTypeMixin):
         """
         return super(StatusList, self).__hash__()
 
+    def _get_status_lookup(self, rebuild=False):
+        """Returns a dictionary of the Statuses in this StatusList where the
+        keys are the lower case names and codes of the Statuses.
+
+        The dictionary is cached and built again when the :attr:`.statuses`
+        is changed or loaded again or the name or the code of a Status is
+        changed.
+
+        :param bool rebuild: Rebuild the dictionary even if it is cached.
+        """
+        statuses = self.statuses
+        cache = self.__dict__.get('_status_lookup')
+        if rebuild or cache is None or cache[0] is not statuses \
+           or cache[1] != _status_names_version:
+            lookup = {}
+            # the later ones take precedence in case of a clash
+            for status in statuses:
+                if status.name is not None:
+                    lookup[status.name.lower()] = status
+                if status.code is not None:
+                    lookup[status.code.lower()] = status
+            cache = (statuses, _status_names_version, lookup)
+            self.__dict__['_status_lookup'] = cache
+        return cache[2]
+
+    def _invalidate_status_lookup(self):
+        """Removes the cached status lookup dictionary
+        """
+        self.__dict__.pop('_status_lookup', None)
+
+    def _find_status(self, key):
+        """Returns the Status with the given name or code or None if there is
+        no such Status in this StatusList.
+
+        :param str key: The name or the code of the Status, case insensitive.
+        """
+        lower_key = key.lower()
+        status = self._get_status_lookup().get(lower_key)
+        if status is not None and status != key:
+            # the Status is renamed since the last build
+            status = self._get_status_lookup(rebuild=True).get(lower_key)
+        return status
+
+    def get_statuses(self, *keys):
+        """Returns the Statuses with the given names or codes at once, in the
+        given order. None is returned for the keys that doesn't match any
+        Status.
+
+        Use it in place of several string indexing operations::
+
+          >>> wip, cmpl = task.status_list.get_statuses('WIP', 'CMPL')
+
+        :param str keys: The names or codes of the Statuses, case insensitive.
+        :returns: list
+        """
+        with DBSession.no_autoflush:
+            return [self._find_status(key) for key in keys]
+
     def __getitem__(self, key):
         """the indexing attributes for getting item
         """
         with DBSession.no_autoflush:
-            return_item = None
             from stalker import __string_types__
             if isinstance(key, __string_types__):
-                for item in self.statuses:
-                    if item == key:
-                        return_item = item
+                return_item = self._find_status(key)
             else:
                 return_item = self.statuses[key]
 
@@ -263,3 +322,22 @@ StatusList_Statuses = Table(
         primary_key=True
     )
 )
+
+
+@event.listens_for(StatusList.statuses, 'append')
+@event.listens_for(StatusList.statuses, 'remove')
+def invalidate_status_lookup(status_list, status, initiator):
+    """Invalidates the cached status lookup of the StatusList when its
+    statuses are changed.
+    """
+    status_list._invalidate_status_lookup()
+
+
+@event.listens_for(Status.name, 'set')
+@event.listens_for(Status.code, 'set')
+def invalidate_status_lookups(status, value, old_value, initiator):
+    """Invalidates the cached status lookups of all the StatusLists when the
+    name or the code of a Status is changed.
+    """
+    global _status_names_version
+    _status_names_version += 1
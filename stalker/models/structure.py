@@ -16,7 +16,7 @@
 # You should have received a copy of the Lesser GNU General Public License
 # along with Stalker.  If not, see <http://www.gnu.org/licenses/>
 
-from sqlalchemy import Table, Column, Integer, ForeignKey, Text
+from sqlalchemy import Table, Column, Integer, ForeignKey, Text, event
 from sqlalchemy.orm import relationship, validates
 
 from stalker.db.declarative import Base
@@ -154,6 +154,44 @@ class Structure(Entity):
         """
         return super(Structure, self).__hash__()
 
+    def _get_template_lookup(self, rebuild=False):
+        """Returns a dictionary of the FilenameTemplates in this Structure
+        where the keys are the target entity types of the templates.
+
+        The dictionary is cached and built again when the :attr:`.templates`
+        is changed or loaded again.
+
+        :param bool rebuild: Rebuild the dictionary even if it is cached.
+        """
+        templates = self.templates
+        cache = self.__dict__.get('_template_lookup')
+        if rebuild or cache is None or cache[0] is not templates:
+            lookup = {}
+            # the first one takes precedence in case of a clash
+            for template in templates:
+                lookup.setdefault(template.target_entity_type, template)
+            cache = (templates, lookup)
+            self.__dict__['_template_lookup'] = cache
+        return cache[1]
+
+    def _invalidate_template_lookup(self):
+        """Removes the cached template lookup dictionary
+        """
+        self.__dict__.pop('_template_lookup', None)
+
+    def get_template(self, entity_type):
+        """Returns the first FilenameTemplate of this Structure for the given
+        entity type, or None if there is no such template.
+
+        :param str entity_type: The entity type, like ``Task`` or ``Asset``.
+        :returns: :class:`.FilenameTemplate`
+        """
+        template = self._get_template_lookup().get(entity_type)
+        if template is None or template.target_entity_type != entity_type:
+            # it is not there or a template is changed since the last build
+            template = self._get_template_lookup(rebuild=True).get(entity_type)
+        return template
+
     @validates("custom_template")
     def _validate_custom_template(self, key, custom_template_in):
         """validates the given custom_template value
@@ -196,3 +234,12 @@ Structure_FilenameTemplates = Table(
     Column("filenametemplate_id", Integer, ForeignKey("FilenameTemplates.id"),
            primary_key=True)
 )
+
+
+@event.listens_for(Structure.templates, 'append')
+@event.listens_for(Structure.templates, 'remove')
+def invalidate_template_lookup(structure, template, initiator):
+    """Invalidates the cached template lookup of the Structure when its
+    templates are changed.
+    """
+    structure._invalidate_template_lookup()
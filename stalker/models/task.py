@@ -21,16 +21,18 @@ import logging
 import os
 
 from sqlalchemy import (Table, Column, Integer, ForeignKey, Boolean, Enum,
-                        Float, event, CheckConstraint)
+                        Float, event, CheckConstraint, Index)
 from sqlalchemy.exc import UnboundExecutionError, OperationalError, \
     InvalidRequestError
 from sqlalchemy.ext.associationproxy import association_proxy
-from sqlalchemy.orm import relationship, validates, synonym, reconstructor
+from sqlalchemy.orm import (relationship, validates, synonym, reconstructor,
+                            Session)
 
 from stalker.db.declarative import Base
 from stalker.models.entity import Entity
 from stalker.models.mixins import (DateRangeMixin, StatusMixin, ReferenceMixin,
-                                   ScheduleMixin, DAGMixin)
+                                   ScheduleMixin, DAGMixin, normalize_dates,
+                                   update_dag_paths)
 from stalker.log import logging_level
 
 logger = logging.getLogger(__name__)
@@ -44,6 +46,95 @@ CONSTRAIN_END = 2
 CONSTRAIN_BOTH = 3
 
 
+# the binary codes of the Task statuses, used to calculate the cumulative
+# status of the dependencies or the children of a Task
+#
+#   +--------- WFD
+#   |+-------- RTS
+#   ||+------- WIP
+#   |||+------ PREV
+#   ||||+----- HREV
+#   |||||+---- DREV
+#   ||||||+--- OH
+#   |||||||+-- STOP
+#   ||||||||+- CMPL
+#   |||||||||
+# 0b000000000
+BINARY_STATUS_CODES = {
+    'WFD':  256,
+    'RTS':  128,
+    'WIP':  64,
+    'PREV': 32,
+    'HREV': 16,
+    'DREV': 8,
+    'OH':   4,
+    'STOP': 2,
+    'CMPL': 1
+}
+
+# I know that the following list seems cryptic but the it shows the final
+# status index in [WFD, RTS, WIP, CMPL] list for a container Task.
+#
+# So by using the cumulative statuses of children we got an index from the
+# following table, and use the found element (integer) as the index for the
+# [WFD, RTS, WIP, CMPL] list, and we find the desired status
+#
+# We are doing it in this way for a couple of reasons:
+#
+#   1. We shouldn't hold the statuses in the following list,
+#   2. Using a dictionary is another alternative, where the keys are the
+#      cumulative binary status codes, but at the end the result of this
+#      cumulative thing is a number between 0-511 so no need to use a
+#      dictionary with integer keys
+#
+CHILDREN_TO_PARENT_STATUSES_LUT = [
+    0, 3, 3, 3, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 1, 2, 1, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 0, 2, 0, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 1, 2, 1, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+    2, 2, 2, 2, 2, 2
+]
+
+
+def find_overlapping_interval(intervals, start, end):
+    """Returns the interval from the given intervals which overlaps with the
+    given range, or None.
+
+    It does a binary search, so it is O(log n).
+
+    :param list intervals: A list of (start, end) tuples, sorted by their
+      start values and not overlapping with each other, like the time logs of
+      a resource.
+    :param start: The start of the range.
+    :param end: The end of the range.
+    """
+    import bisect
+    # the last interval that starts before the range ends is the only one
+    # that can overlap with it
+    i = bisect.bisect_left(intervals, (end,))
+    if i and intervals[i - 1][1] > start:
+        return intervals[i - 1]
+
+
 class TimeLog(Entity, DateRangeMixin):
     """Holds information about the uninterrupted time spent on a specific
     :class:`.Task` by a specific :class:`.User`.
@@ -83,6 +174,8 @@ class TimeLog(Entity, DateRangeMixin):
 
     __table_args__ = (
         CheckConstraint('"end" > start'),  # this will be ignored in SQLite3
+        # used in finding the clashing time logs of a resource
+        Index('ix_TimeLogs_resource_id_start', 'resource_id', 'start'),
     )
 
     time_log_id = Column("id", Integer, ForeignKey("Entities.id"),
@@ -149,15 +242,11 @@ class TimeLog(Entity, DateRangeMixin):
         from stalker.db.session import DBSession
         with DBSession.no_autoflush:
             task_status_list = task.status_list
-            WFD = task_status_list['WFD']
-            RTS = task_status_list['RTS']
-            WIP = task_status_list['WIP']
-            PREV = task_status_list['PREV']
-            HREV = task_status_list['HREV']
-            DREV = task_status_list['DREV']
-            OH = task_status_list['OH']
-            STOP = task_status_list['STOP']
-            CMPL = task_status_list['CMPL']
+            WFD, RTS, WIP, PREV, HREV, DREV, OH, STOP, CMPL = \
+                task_status_list.get_statuses(
+                    'WFD', 'RTS', 'WIP', 'PREV', 'HREV', 'DREV', 'OH', 'STOP',
+                    'CMPL'
+                )
     
             if task.status in [WFD, OH, STOP, CMPL]:
                 from stalker.exceptions import StatusError
@@ -232,35 +321,20 @@ class TimeLog(Entity, DateRangeMixin):
         from stalker.db.session import DBSession
         with DBSession.no_autoflush:
             try:
-                from sqlalchemy import or_, and_
-                clashing_time_log_data = \
-                    DBSession.query(TimeLog.start, TimeLog.end)\
-                        .filter(TimeLog.id != self.id)\
-                        .filter(TimeLog.resource_id == resource.id)\
-                        .filter(
-                            or_(
-                                and_(
-                                    TimeLog.start <= self.start,
-                                    self.start < TimeLog.end
-                                ),
-                                and_(
-                                    TimeLog.start < self.end,
-                                    self.end <= TimeLog.end
-                                )
-                            )
-                        )\
-                        .first()
-
+                clashing_time_log_data = self.get_clashing_time_log(
+                    resource.id, self.start, self.end, exclude_id=self.id
+                )
             except (UnboundExecutionError, OperationalError) as e:
                 # fallback to Python
-                for time_log in resource.time_logs:
-                    if time_log != self:
-                        if time_log.start == self.start or \
-                           time_log.end == self.end or \
-                           time_log.start < self.end < time_log.end or \
-                           time_log.start < self.start < time_log.end:
-                            clashing_time_log_data = \
-                                [time_log.start, time_log.end]
+                clashing_time_log_data = find_overlapping_interval(
+                    sorted(
+                        (time_log.start, time_log.end)
+                        for time_log in resource.time_logs
+                        if time_log is not self
+                    ),
+                    self.start,
+                    self.end
+                )
 
             if clashing_time_log_data:
                 from stalker.exceptions import OverBookedError
@@ -272,6 +346,382 @@ class TimeLog(Entity, DateRangeMixin):
 
         return resource
 
+    @classmethod
+    def get_clashing_time_log(cls, resource_id, start, end, exclude_id=None):
+        """Returns the start and end dates of a TimeLog of the given resource
+        that overlaps with the given date range, or None.
+
+        The time logs of a resource are not overlapping, so only the one that
+        starts last before the given range ends can overlap with it. It is
+        found with one ``ORDER BY start DESC LIMIT 1`` query, which is an
+        index lookup on the ``(resource_id, start)`` index, so the check costs
+        O(log n) on every database, and not only on PostgreSQL where the
+        overlaps are also prevented by an exclusion constraint.
+
+        :param int resource_id: The id of the :class:`.User`.
+        :param start: The start of the date range.
+        :param end: The end of the date range.
+        :param int exclude_id: The id of a TimeLog to skip, use it to check an
+          already persisted TimeLog.
+        :returns: A (start, end) tuple or None.
+        """
+        from stalker.db.session import DBSession
+        query = DBSession.query(TimeLog.start, TimeLog.end)\
+            .filter(TimeLog.resource_id == resource_id)\
+            .filter(TimeLog.start < end)
+        if exclude_id is not None:
+            query = query.filter(TimeLog.id != exclude_id)
+        last_time_log = query.order_by(TimeLog.start.desc()).first()
+        if last_time_log and last_time_log[1] > start:
+            return tuple(last_time_log)
+
+    @classmethod
+    def bulk_create(cls, data, created_by=None):
+        """Creates many TimeLogs at once, without creating TimeLog instances.
+
+        It is meant to be used to import big amounts of time logs. The task
+        status, the dependency and the overbooking rules are validated for all
+        the given data with a constant number of queries before inserting
+        anything, and the same exceptions are raised as with creating the
+        TimeLogs one by one. Then the rows are inserted with one statement per
+        table, and the task statuses and the rollup columns of the parent
+        tasks are updated once per affected task.
+
+        :param list data: A list of dictionaries with ``task``, ``resource``,
+          ``start``, ``end`` and optionally ``duration`` and ``description``
+          keys. The ``task`` and ``resource`` values can be :class:`.Task`
+          and :class:`.User` instances or their ids. The dates are rounded to
+          the :attr:`.timing_resolution` as it is done in
+          :class:`.DateRangeMixin`.
+        :param created_by: A :class:`.User` instance to be set as the
+          ``created_by`` and ``updated_by`` of the TimeLogs.
+        :returns: The list of the ids of the created TimeLogs in the given
+          order.
+        """
+        import uuid
+        import pytz
+        import stalker
+        from sqlalchemy import select, exists, and_, func
+        from stalker import SimpleEntity, Entity, Status, User
+        from stalker.db.session import DBSession
+        from stalker.exceptions import (StatusError, DependencyViolationError,
+                                        OverBookedError)
+
+        # so the set-wise checks see the pending changes
+        DBSession.flush()
+
+        rows = []
+        for item in data:
+            task = item.get('task')
+            if isinstance(task, Task):
+                task_id = task.id
+            elif isinstance(task, int) and not isinstance(task, bool):
+                task_id = task
+            else:
+                raise TypeError(
+                    "%s.task should be an instance of "
+                    "stalker.models.task.Task not %s" %
+                    (cls.__name__, task.__class__.__name__)
+                )
+
+            resource = item.get('resource')
+            if resource is None:
+                raise TypeError(
+                    "%s.resource can not be None" % cls.__name__
+                )
+            if isinstance(resource, User):
+                resource_id = resource.id
+            elif isinstance(resource, int) and not isinstance(resource, bool):
+                resource_id = resource
+            else:
+                raise TypeError(
+                    "%s.resource should be a stalker.models.auth.User "
+                    "instance not %s" %
+                    (cls.__name__, resource.__class__.__name__)
+                )
+
+            start, end, duration = normalize_dates(
+                item.get('start'), item.get('end'), item.get('duration')
+            )
+            rows.append({
+                'task_id': task_id,
+                'resource_id': resource_id,
+                'start': start,
+                'end': end,
+                'duration': duration,
+                'description': item.get('description') or ''
+            })
+
+        if not rows:
+            return []
+
+        tasks = Task.__table__
+        children = Task.__table__.alias('Children')
+        dependencies = TaskDependency.__table__
+        simple_entities = SimpleEntity.__table__
+        time_logs = cls.__table__
+        connection = DBSession.connection()
+
+        task_ids = set(r['task_id'] for r in rows)
+        resource_ids = set(r['resource_id'] for r in rows)
+
+        # check the tasks
+        task_info = dict(
+            (r[0], r) for r in connection.execute(
+                select([
+                    tasks.c.id,
+                    simple_entities.c.name,
+                    Status.__table__.c.code,
+                    exists().where(children.c.parent_id == tasks.c.id),
+                    tasks.c.parent_id,
+                    tasks.c.dag_path
+                ]).select_from(
+                    tasks
+                    .join(simple_entities, tasks.c.id == simple_entities.c.id)
+                    .join(
+                        Status.__table__,
+                        tasks.c.status_id == Status.__table__.c.id
+                    )
+                ).where(tasks.c.id.in_(task_ids))
+            )
+        )
+
+        for task_id in task_ids:
+            if task_id not in task_info:
+                raise ValueError(
+                    'There is no Task with id: %s' % task_id
+                )
+            _, name, status_code, is_container, _, _ = task_info[task_id]
+            if is_container:
+                raise ValueError(
+                    '%(task)s (id: %(id)s) is a container task, and it is '
+                    'not allowed to create TimeLogs for a container task' % {
+                        'task': name,
+                        'id': task_id
+                    }
+                )
+            if status_code in ['WFD', 'OH', 'STOP', 'CMPL']:
+                raise StatusError(
+                    '%(task)s is a %(status)s task, and it is not allowed to '
+                    'create TimeLogs for a %(status)s task, please supply a '
+                    'RTS, WIP, HREV or DREV task!' % {
+                        'task': name,
+                        'status': status_code
+                    }
+                )
+
+        # check the resources
+        found_resource_ids = set(
+            r[0] for r in connection.execute(
+                select([User.__table__.c.id])
+                .where(User.__table__.c.id.in_(resource_ids))
+            )
+        )
+        for resource_id in resource_ids - found_resource_ids:
+            raise ValueError(
+                'There is no User with id: %s' % resource_id
+            )
+
+        # check the dependencies
+        dep_tasks = tasks.alias('Dependee_Tasks')
+        dep_entities = simple_entities.alias('Dependee_Entities')
+        task_dependencies = {}
+        for task_id, dependency_target, dep_name, dep_start, dep_end in \
+                connection.execute(
+                    select([
+                        dependencies.c.task_id,
+                        dependencies.c.dependency_target,
+                        dep_entities.c.name,
+                        dep_tasks.c.start,
+                        dep_tasks.c.end
+                    ]).select_from(
+                        dependencies
+                        .join(
+                            dep_tasks,
+                            dependencies.c.depends_to_id == dep_tasks.c.id
+                        ).join(
+                            dep_entities,
+                            dep_tasks.c.id == dep_entities.c.id
+                        )
+                    ).where(dependencies.c.task_id.in_(task_ids))):
+            if dependency_target == 'onend':
+                violation_date = dep_end
+            else:
+                violation_date = dep_start
+            task_dependencies.setdefault(task_id, []).append(
+                (violation_date, dep_name)
+            )
+
+        for r in rows:
+            for violation_date, dep_name in \
+                    task_dependencies.get(r['task_id'], []):
+                if violation_date is not None and r['start'] < violation_date:
+                    raise DependencyViolationError(
+                        'It is not possible to create a TimeLog before '
+                        '%s, which violates the dependency relation of '
+                        '"%s" to "%s"' % (
+                            violation_date,
+                            task_info[r['task_id']][1],
+                            dep_name,
+                        )
+                    )
+
+        # check overbooking, first in the given data
+        rows_by_resource = {}
+        for r in rows:
+            rows_by_resource.setdefault(r['resource_id'], []).append(r)
+
+        for resource_rows in rows_by_resource.values():
+            resource_rows.sort(key=lambda x: x['start'])
+            for previous, current in zip(resource_rows, resource_rows[1:]):
+                if current['start'] < previous['end']:
+                    raise OverBookedError(
+                        "The resource has another TimeLog between %s and "
+                        "%s" % (previous['start'], previous['end'])
+                    )
+
+        # then against the time logs in the database
+        booked = {}
+        for resource_id, start, end in connection.execute(
+                select([
+                    time_logs.c.resource_id, time_logs.c.start,
+                    time_logs.c.end
+                ]).where(
+                    and_(
+                        time_logs.c.resource_id.in_(resource_ids),
+                        time_logs.c.start < max(r['end'] for r in rows),
+                        time_logs.c.end > min(r['start'] for r in rows)
+                    )
+                ).order_by(time_logs.c.resource_id, time_logs.c.start)):
+            booked.setdefault(resource_id, []).append((start, end))
+
+        for resource_id, resource_rows in rows_by_resource.items():
+            resource_booked = booked.get(resource_id, [])
+            for r in resource_rows:
+                clashing_time_log_data = find_overlapping_interval(
+                    resource_booked, r['start'], r['end']
+                )
+                if clashing_time_log_data:
+                    raise OverBookedError(
+                        "The resource has another TimeLog between %s and "
+                        "%s" % clashing_time_log_data
+                    )
+
+        # insert the rows
+        now = datetime.datetime.now(pytz.utc)
+        created_by_id = created_by.id if created_by is not None else None
+
+        if connection.dialect.name == 'postgresql':
+            ids = [
+                r[0] for r in connection.execute(
+                    select([
+                        func.nextval(
+                            func.pg_get_serial_sequence(
+                                '"%s"' % simple_entities.name, 'id'
+                            )
+                        )
+                    ]).select_from(func.generate_series(1, len(rows)))
+                )
+            ]
+        else:
+            ids = None
+
+        entity_rows = []
+        for i, r in enumerate(rows):
+            entity_row = {
+                'entity_type': cls.__name__,
+                'name': '%s_%s' % (cls.__name__,
+                                   uuid.uuid4().urn.split(':')[2]),
+                'description': r['description'],
+                'generic_text': '',
+                'created_by_id': created_by_id,
+                'updated_by_id': created_by_id,
+                'date_created': now,
+                'date_updated': now,
+                'stalker_version': stalker.__version__
+            }
+            if ids is not None:
+                entity_row['id'] = ids[i]
+            entity_rows.append(entity_row)
+
+        if ids is not None:
+            connection.execute(simple_entities.insert(), entity_rows)
+        else:
+            # no sequences, insert them one by one to get the ids
+            ids = [
+                connection.execute(
+                    simple_entities.insert(), entity_row
+                ).inserted_primary_key[0]
+                for entity_row in entity_rows
+            ]
+
+        connection.execute(
+            Entity.__table__.insert(), [{'id': id_} for id_ in ids]
+        )
+        connection.execute(
+            time_logs.insert(),
+            [
+                {
+                    'id': id_,
+                    'task_id': r['task_id'],
+                    'resource_id': r['resource_id'],
+                    'start': r['start'],
+                    'end': r['end'],
+                    'duration': r['duration']
+                }
+                for id_, r in zip(ids, rows)
+            ]
+        )
+
+        # update the statuses once per task
+        with DBSession.no_autoflush:
+            affected_tasks = Task.query.filter(Task.id.in_(task_ids)).all()
+            wip = None
+            for task in affected_tasks:
+                if task_info[task.id][2] in ['RTS', 'HREV']:
+                    if wip is None:
+                        wip = task.status_list.get_statuses('WIP')[0]
+                    logger.debug('updating task status to WIP!')
+                    task.status = wip
+                # the new time logs should be loaded
+                DBSession.expire(task, ['time_logs'])
+
+            # the parents, children first
+            parent_ids = set(
+                task_info[task_id][4] for task_id in task_ids
+            )
+            parent_ids.discard(None)
+            ancestor_ids = set(parent_ids)
+            for task in affected_tasks:
+                ids_from_path = task._dag_parent_ids()
+                if ids_from_path is not None:
+                    ancestor_ids.update(ids_from_path)
+            if ancestor_ids:
+                ancestors = Task.query \
+                    .filter(Task.id.in_(ancestor_ids)).all()
+                ancestors.sort(key=lambda x: -x.level)
+                for task in ancestors:
+                    task.status = task._get_status_with_children_statuses(
+                        [child.status for child in task.children]
+                    )
+
+            for user in User.query.filter(User.id.in_(resource_ids)):
+                DBSession.expire(user, ['time_logs'])
+
+        # and the rollups
+        deltas = {}
+        for r in rows:
+            dag_path = task_info[r['task_id']][5]
+            if dag_path is None:
+                continue
+            seconds = r['duration'].days * 86400 + r['duration'].seconds
+            for ancestor_id in Task._dag_ids_from_path(dag_path):
+                delta = deltas.setdefault(ancestor_id, [0, 0])
+                delta[1] += seconds
+        _apply_rollup_deltas(DBSession, deltas)
+
+        return ids
+
     def __eq__(self, other):
         """equality of TimeLog instances
         """
@@ -1248,15 +1698,11 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
         # check the status of the current task
         from stalker.db.session import DBSession
         with DBSession.no_autoflush:
-            wfd = self.status_list['WFD']
-            rts = self.status_list['RTS']
-            wip = self.status_list['WIP']
-            prev = self.status_list['PREV']
-            hrev = self.status_list['HREV']
-            drev = self.status_list['DREV']
-            oh = self.status_list['OH']
-            stop = self.status_list['STOP']
-            cmpl = self.status_list['CMPL']
+            wfd, rts, wip, prev, hrev, drev, oh, stop, cmpl = \
+                self.status_list.get_statuses(
+                    'WFD', 'RTS', 'WIP', 'PREV', 'HREV', 'DREV', 'OH', 'STOP',
+                    'CMPL'
+                )
 
             from stalker.exceptions import StatusError
             if self.status in [wip, prev, hrev, drev, oh, stop, cmpl]:
@@ -1833,12 +2279,11 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
     def tjp_abs_id(self):
         """returns the calculated absolute id of this task
         """
-        if self.parent:
-            abs_id = self.parent.tjp_abs_id
-        else:
-            abs_id = self.project.tjp_id
-
-        return '%s.%s' % (abs_id, self.tjp_id)
+        return '.'.join(
+            [self.project.tjp_id] +
+            [parent.tjp_id for parent in self.parents] +
+            [self.tjp_id]
+        )
 
     @property
     def to_tjp(self):
@@ -1859,6 +2304,10 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
         be useless when Stalker has its own implementation of a proper Gantt
         Chart. Write now it is used by the jQueryGantt.
         """
+        parent_ids = self._dag_parent_ids()
+        if parent_ids is not None:
+            return len(parent_ids) + 1
+
         i = 0
         current = self
         while current:
@@ -1884,16 +2333,8 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
         with DBSession.no_autoflush:
             if self.is_leaf:
                 try:
-                    from sqlalchemy import text
-                    sql = """
-                    select
-                        extract(epoch from sum("TimeLogs".end - "TimeLogs".start))
-                    from "TimeLogs"
-                    where "TimeLogs".task_id = :task_id
-                    """
-                    engine = DBSession.connection().engine
-                    result = engine.execute(text(sql), task_id=self.id).fetchone()
-                    return result[0] if result[0] else 0
+                    from stalker.db.aggregates import logged_seconds
+                    return logged_seconds([self.id])[self.id]
                 except (UnboundExecutionError, OperationalError) as e:
                     # no database connection
                     # fallback to Python
@@ -1999,6 +2440,229 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
             self._schedule_seconds = self.schedule_seconds
             self._total_logged_seconds = self.total_logged_seconds
 
+    @classmethod
+    def bulk_update_schedule_info(cls, project=None, task=None):
+        """Updates the cached schedule_seconds and total_logged_seconds values
+        of all the tasks of the given project or of the given task and all of
+        its descendants at once.
+
+        The logged seconds of all the tasks are summed up in one aggregation
+        query and the values are rolled up to the container tasks in Python,
+        so it runs a constant number of queries regardless of the size of the
+        hierarchy. The changed values are written back with one statement and
+        the tasks that are already loaded are updated too.
+
+        It uses the data in the database, so flush the session before calling
+        it.
+
+        :param project: A :class:`.Project` instance. All the tasks of this
+          project is updated.
+        :param task: A :class:`.Task` instance. The task and all of its
+          descendants are updated. Either the ``project`` or the ``task``
+          should be given.
+        :returns: A dictionary of task ids and (schedule_seconds,
+          total_logged_seconds) tuples.
+        """
+        info, stored, children = cls._calculate_schedule_info(
+            project=project, task=task,
+            method_name='bulk_update_schedule_info'
+        )
+        cls._store_schedule_info(
+            info,
+            [task_id for task_id, values in info.items()
+             if stored[task_id] != values]
+        )
+        return info
+
+    @classmethod
+    def verify_schedule_info(cls, project=None, task=None, repair=False):
+        """Recomputes the schedule_seconds and total_logged_seconds columns of
+        the container tasks of the given project or of the given task and all
+        of its descendants set-wise, and reports the ones that are drifted
+        from the values in the database.
+
+        The columns are maintained on every flush, but the values may drift
+        if the data is changed by bypassing the ORM, use this method to find
+        and fix them.
+
+        :param project: A :class:`.Project` instance.
+        :param task: A :class:`.Task` instance. Either the ``project`` or the
+          ``task`` should be given.
+        :param bool repair: If True the drifted values are written back to the
+          database. The default is False.
+        :returns: A dictionary of task ids and ((stored schedule_seconds,
+          stored total_logged_seconds), (schedule_seconds,
+          total_logged_seconds)) tuples, only the drifted container tasks are
+          included.
+        """
+        info, stored, children = cls._calculate_schedule_info(
+            project=project, task=task, method_name='verify_schedule_info'
+        )
+        drift = dict(
+            (task_id, (stored[task_id], values))
+            for task_id, values in info.items()
+            if children[task_id] and stored[task_id] != values
+        )
+        if drift:
+            logger.debug(
+                'schedule info of %s container tasks are drifted' % len(drift)
+            )
+            if repair:
+                cls._store_schedule_info(
+                    dict((task_id, info[task_id]) for task_id in drift),
+                    list(drift)
+                )
+        return drift
+
+    @classmethod
+    def _calculate_schedule_info(cls, project=None, task=None,
+                                 method_name='_calculate_schedule_info'):
+        """Calculates the schedule_seconds and total_logged_seconds values of
+        the tasks of the given project or of the given task and all of its
+        descendants from the data in the database.
+
+        :returns: A tuple of three dictionaries, the calculated (schedule
+          seconds, total_logged_seconds) values, the values stored in the
+          database and the children ids per task id.
+        """
+        from sqlalchemy import select, or_
+        from stalker.db.session import DBSession
+
+        if project is None and task is None:
+            raise TypeError(
+                '%s.%s() needs a project or a task' %
+                (cls.__name__, method_name)
+            )
+
+        tasks = cls.__table__
+        time_logs = TimeLog.__table__
+
+        if task is not None:
+            if task.dag_path is not None:
+                condition = or_(
+                    tasks.c.id == task.id,
+                    tasks.c.dag_path.like('%s%s|%%' % (task.dag_path, task.id))
+                )
+            else:
+                condition = tasks.c.project_id == task.project.id
+            root_id = task.id
+        else:
+            condition = tasks.c.project_id == project.id
+            root_id = None
+
+        with DBSession.no_autoflush:
+            connection = DBSession.connection()
+            rows = connection.execute(
+                select([
+                    tasks.c.id, tasks.c.parent_id, tasks.c.schedule_timing,
+                    tasks.c.schedule_unit, tasks.c.schedule_model,
+                    tasks.c.schedule_seconds, tasks.c.total_logged_seconds
+                ]).where(condition)
+            ).fetchall()
+
+            # sum the time logs of the tasks
+            from stalker.db.aggregates import sum_durations_by
+            logged_seconds = sum_durations_by(
+                time_logs.c.task_id,
+                time_logs.c.start,
+                time_logs.c.end,
+                from_obj=time_logs.join(
+                    tasks, time_logs.c.task_id == tasks.c.id
+                ),
+                where=condition,
+                connection=connection
+            )
+
+        row_by_id = dict((r[0], r) for r in rows)
+        children = dict((r[0], []) for r in rows)
+        roots = []
+        for r in rows:
+            if r[1] in children and r[0] != root_id:
+                children[r[1]].append(r[0])
+            else:
+                roots.append(r[0])
+        if root_id is not None:
+            roots = [root_id] if root_id in row_by_id else []
+
+        # order the tasks so the children come before their parents
+        ordered = []
+        to_visit = list(roots)
+        while to_visit:
+            task_id = to_visit.pop()
+            ordered.append(task_id)
+            to_visit.extend(children[task_id])
+        ordered.reverse()
+
+        info = {}
+        for task_id in ordered:
+            r = row_by_id[task_id]
+            if children[task_id]:
+                schedule_seconds = 0
+                total_logged_seconds = 0
+                for child_id in children[task_id]:
+                    child_schedule_seconds, child_logged_seconds = \
+                        info[child_id]
+                    if child_schedule_seconds:
+                        schedule_seconds += child_schedule_seconds
+                    if child_logged_seconds:
+                        total_logged_seconds += child_logged_seconds
+            else:
+                schedule_seconds = cls.to_seconds(r[2], r[3], r[4])
+                total_logged_seconds = logged_seconds.get(task_id, 0)
+            if schedule_seconds is not None:
+                schedule_seconds = int(schedule_seconds)
+            info[task_id] = (schedule_seconds, int(total_logged_seconds))
+
+        stored = dict(
+            (task_id, (r[5], r[6])) for task_id, r in row_by_id.items()
+        )
+        return info, stored, children
+
+    @classmethod
+    def _store_schedule_info(cls, info, changed_ids):
+        """Writes the given schedule info of the tasks with the given ids to
+        the database with one statement, and updates all the tasks in the
+        given info that are already loaded.
+
+        :param dict info: A dictionary of task ids and (schedule_seconds,
+          total_logged_seconds) tuples.
+        :param list changed_ids: The ids of the tasks to write to the database.
+        """
+        from sqlalchemy import bindparam, inspect
+        from sqlalchemy.orm.attributes import set_committed_value
+        from stalker.db.session import DBSession
+
+        tasks = cls.__table__
+        if changed_ids:
+            DBSession.connection().execute(
+                tasks.update()
+                .where(tasks.c.id == bindparam('_id'))
+                .values(
+                    schedule_seconds=bindparam('_schedule_seconds'),
+                    total_logged_seconds=bindparam('_total_logged_seconds')
+                ),
+                [
+                    {
+                        '_id': task_id,
+                        '_schedule_seconds': info[task_id][0],
+                        '_total_logged_seconds': info[task_id][1]
+                    }
+                    for task_id in changed_ids
+                ]
+            )
+
+        # update the loaded tasks
+        mapper = inspect(cls)
+        for task_id, values in info.items():
+            instance = DBSession.identity_map.get(
+                mapper.identity_key_from_primary_key([task_id])
+            )
+            if instance is not None:
+                set_committed_value(instance, '_schedule_seconds', values[0])
+                set_committed_value(
+                    instance, '_total_logged_seconds', values[1]
+                )
+
     @property
     def percent_complete(self):
         """returns the percent_complete based on the total_logged_seconds and
@@ -2158,8 +2822,7 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
         # check task status
         from stalker.db.session import DBSession
         with DBSession.no_autoflush:
-            wip = self.status_list['WIP']
-            prev = self.status_list['PREV']
+            wip, prev = self.status_list.get_statuses('WIP', 'PREV')
 
         if self.status != wip:
             from stalker.exceptions import StatusError
@@ -2225,8 +2888,7 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
         # check status
         from stalker.db.session import DBSession
         with DBSession.no_autoflush:
-            prev = self.status_list['PREV']
-            cmpl = self.status_list['CMPL']
+            prev, cmpl = self.status_list.get_statuses('PREV', 'CMPL')
 
         if self.status not in [prev, cmpl]:
             from stalker.exceptions import StatusError
@@ -2280,9 +2942,7 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
         # check if status is WIP
         from stalker.db.session import DBSession
         with DBSession.no_autoflush:
-            wip = self.status_list['WIP']
-            drev = self.status_list['DREV']
-            oh = self.status_list['OH']
+            wip, drev, oh = self.status_list.get_statuses('WIP', 'DREV', 'OH')
 
         if self.status not in [wip, drev, oh]:
             from stalker.exceptions import StatusError
@@ -2324,9 +2984,8 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
         # check the status
         from stalker.db.session import DBSession
         with DBSession.no_autoflush:
-            wip = self.status_list['WIP']
-            drev = self.status_list['DREV']
-            stop = self.status_list['STOP']
+            wip, drev, stop = \
+                self.status_list.get_statuses('WIP', 'DREV', 'STOP')
 
         if self.status not in [wip, drev, stop]:
             from stalker.exceptions import StatusError
@@ -2362,9 +3021,7 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
         # check status
         from stalker.db.session import DBSession
         with DBSession.no_autoflush:
-            wip = self.status_list['WIP']
-            oh = self.status_list['OH']
-            stop = self.status_list['STOP']
+            wip, oh, stop = self.status_list.get_statuses('WIP', 'OH', 'STOP')
 
         if self.status not in [oh, stop]:
             from stalker.exceptions import StatusError
@@ -2435,17 +3092,6 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
             # do nothing, its status will be decided by its children
             return
 
-        # in case there is no database
-        # try to find the statuses from the status_list attribute
-        from stalker.db.session import DBSession
-        with DBSession.no_autoflush:
-            wfd = self.status_list['WFD']
-            rts = self.status_list['RTS']
-            wip = self.status_list['WIP']
-            hrev = self.status_list['HREV']
-            drev = self.status_list['DREV']
-            cmpl = self.status_list['CMPL']
-
         if removing:
             self._previously_removed_dependent_tasks.append(removing)
         else:
@@ -2460,42 +3106,59 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
         logger.debug('self.depends : %s' % self.depends)
         logger.debug('dep_list     : %s' % dep_list)
 
+        status, expand_timing = self._get_status_with_dependent_statuses(
+            [dep.status for dep in dep_list]
+        )
+
+        logger.debug('setting status from %s to %s: ' % (self.status, status))
+        self.status = status
+        if expand_timing:
+            self._expand_schedule_timing()
+
+        if dep_list:
+            # also update parent statuses
+            self.update_parent_statuses()
+
+        # # also update dependent tasks
+        # for dep in dep_list:
+        #     dep.update_status_with_dependent_statuses()
+
+    def _get_status_with_dependent_statuses(self, dep_statuses, status=None):
+        """Returns the status that this leaf task should have by looking at
+        the given statuses of the tasks that this task depends to, without
+        changing anything.
+
+        It returns a tuple of the status and a bool which shows if the
+        schedule timing of the task should be expanded.
+
+        :param list dep_statuses: The statuses of the dependent tasks.
+        :param status: The current status of this task, the default is None
+          which uses the :attr:`.status`.
+        """
+        if status is None:
+            status = self.status
+
+        # in case there is no database
+        # try to find the statuses from the status_list attribute
+        from stalker.db.session import DBSession
+        with DBSession.no_autoflush:
+            wfd, rts, wip, hrev, drev, cmpl = \
+                self.status_list.get_statuses(
+                    'WFD', 'RTS', 'WIP', 'HREV', 'DREV', 'CMPL'
+                )
+
         # if not self.depends:
-        if not dep_list:
+        if not dep_statuses:
             # doesn't have any dependency
             # convert its status from WFD to RTS if necessary
-            if self.status == wfd:
-                self.status = rts
-            elif self.status in [wip, drev]:
+            if status == wfd:
+                status = rts
+            elif status in [wip, drev]:
                 if len(self.time_logs):
-                    self.status = wip
+                    status = wip
                 else:
-                    self.status = rts
-            return
-
-        #   +--------- WFD
-        #   |+-------- RTS
-        #   ||+------- WIP
-        #   |||+------ PREV
-        #   ||||+----- HREV
-        #   |||||+---- DREV
-        #   ||||||+--- OH
-        #   |||||||+-- STOP
-        #   ||||||||+- CMPL
-        #   |||||||||
-        # 0b000000000
-
-        binary_status_codes = {
-            'WFD':  256,
-            'RTS':  128,
-            'WIP':  64,
-            'PREV': 32,
-            'HREV': 16,
-            'DREV': 8,
-            'OH':   4,
-            'STOP': 2,
-            'CMPL': 1
-        }
+                    status = rts
+            return status, False
 
         # Keep this part for future reference
         # if self.id:
@@ -2517,28 +3180,16 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
         #     # convert to a binary value
         #     binary_status = reduce(
         #         lambda x, y: x+y,
-        #         map(lambda x: binary_status_codes[x[0]], result.fetchall()),
+        #         map(lambda x: BINARY_STATUS_CODES[x[0]], result.fetchall()),
         #         0
         #     )
         #
         # else:
         # task is not committed yet, use Python version
         logger.debug('using pure Python to query dependency statuses')
-        binary_status = 0
-        dep_statuses = []
-        # with DBSession.no_autoflush:
-        logger.debug(
-            'self.depends in update_status_with_dependent_statuses: %s' %
-            self.depends
-        )
-        # for dep in self.depends:
-        for dep in dep_list:
-            # consider every status only once
-            if dep.status not in dep_statuses:
-                dep_statuses.append(dep.status)
-                binary_status += binary_status_codes[dep.status.code]
-
-        logger.debug('status of the task: %s' % self.status.code)
+        binary_status = self._get_binary_status(dep_statuses)
+
+        logger.debug('status of the task: %s' % status.code)
         logger.debug('binary status for dependency statuses: %s' %
                      binary_status)
 
@@ -2546,43 +3197,49 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
         if binary_status < 4:
             work_alone = True
 
-        status = self.status
+        expand_timing = False
         if work_alone:
-            if self.status == wfd:
+            if status == wfd:
                 status = rts
-            elif self.status == drev:
+            elif status == drev:
                 status = hrev
                 # Expand task timing with the timing resolution if there is no
                 # time left for this task
                 if self.total_logged_seconds == self.schedule_seconds:
-                    from stalker import defaults
-                    total_seconds = \
-                        self.schedule_seconds \
-                        + defaults.timing_resolution.seconds
-                    timing, unit = \
-                        self.least_meaningful_time_unit(total_seconds)
-                    self.schedule_timing = timing
-                    self.schedule_unit = unit
-
+                    expand_timing = True
         else:
-            if self.status == rts:
+            if status == rts:
                 status = wfd
-            elif self.status == wip:
+            elif status == wip:
                 status = drev
-            elif self.status == hrev:
+            elif status == hrev:
                 status = drev
-            elif self.status == cmpl:
+            elif status == cmpl:
                 status = drev
 
-        logger.debug('setting status from %s to %s: ' % (self.status, status))
-        self.status = status
+        return status, expand_timing
 
-        # also update parent statuses
-        self.update_parent_statuses()
+    def _expand_schedule_timing(self):
+        """Expands the schedule timing of this task with the timing resolution
+        """
+        from stalker import defaults
+        total_seconds = \
+            self.schedule_seconds + defaults.timing_resolution.seconds
+        timing, unit = self.least_meaningful_time_unit(total_seconds)
+        self.schedule_timing = timing
+        self.schedule_unit = unit
 
-        # # also update dependent tasks
-        # for dep in dep_list:
-        #     dep.update_status_with_dependent_statuses()
+    @classmethod
+    def _get_binary_status(cls, statuses):
+        """Returns the cumulative binary status code of the given statuses,
+        every status is considered only once.
+
+        :param list statuses: A list of :class:`.Status` instances.
+        """
+        binary_status = 0
+        for code in set(status.code for status in statuses):
+            binary_status += BINARY_STATUS_CODES[code]
+        return binary_status
 
     def update_parent_statuses(self):
         """updates the parent statuses of this task if any
@@ -2605,106 +3262,140 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
             logger.debug('not a container returning!')
             return
 
+        status = self._get_status_with_children_statuses(
+            [child.status for child in self.children]
+        )
+
+        logger.debug('setting status to : %s' % status.code)
+
+        self.status = status
+
+        # # update dependent task statuses
+        # for dep in self.dependent_of:
+        #     dep.update_status_with_dependent_statuses()
+
+        # go to parents
+        self.update_parent_statuses()
+
+    def _get_status_with_children_statuses(self, children_statuses):
+        """Returns the status that this container task should have by looking
+        at the given statuses of its children, without changing anything.
+
+        :param list children_statuses: The statuses of the children.
+        """
         from stalker.db.session import DBSession
         with DBSession.no_autoflush:
-            wfd = self.status_list['WFD']
-            rts = self.status_list['RTS']
-            wip = self.status_list['WIP']
-            cmpl = self.status_list['CMPL']
+            wfd, rts, wip, cmpl = \
+                self.status_list.get_statuses('WFD', 'RTS', 'WIP', 'CMPL')
 
         parent_statuses_lut = [wfd, rts, wip, cmpl]
 
-        #   +--------- WFD
-        #   |+-------- RTS
-        #   ||+------- WIP
-        #   |||+------ PREV
-        #   ||||+----- HREV
-        #   |||||+---- DREV
-        #   ||||||+--- OH
-        #   |||||||+-- STOP
-        #   ||||||||+- CMPL
-        #   |||||||||
-        # 0b000000000
-
-        binary_status_codes = {
-            'WFD':  256,
-            'RTS':  128,
-            'WIP':  64,
-            'PREV': 32,
-            'HREV': 16,
-            'DREV': 8,
-            'OH':   4,
-            'STOP': 2,
-            'CMPL': 1
-        }
-
         # use Python
         logger.debug('using pure Python to query children statuses')
-        binary_status = 0
-        children_statuses = []
-        for child in self.children:
-            # consider every status only once
-            if child.status not in children_statuses:
-                children_statuses.append(child.status)
-                binary_status += binary_status_codes[child.status.code]
+        binary_status = self._get_binary_status(children_statuses)
+        logger.debug('binary statuses value : %s' % binary_status)
 
-        #
-        # I know that the following list seems cryptic but the it shows the
-        # final status index in parent_statuses_lut[] list.
-        #
-        # So by using the cumulative statuses of children we got an index from
-        # the following table, and use the found element (integer) as the index
-        # for the parent_statuses_lut[] list, and we find the desired status
-        #
-        # We are doing it in this way for a couple of reasons:
-        #
-        #   1. We shouldn't hold the statuses in the following list,
-        #   2. Using a dictionary is another alternative, where the keys are
-        #      the cumulative binary status codes, but at the end the result of
-        #      this cumulative thing is a number between 0-511 so no need to
-        #      use a dictionary with integer keys
-        #
-        children_to_parent_statuses_lut = [
-            0, 3, 3, 3, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 1, 2, 1, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 0, 2, 0, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 1, 2, 1, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-            2, 2, 2, 2, 2, 2
-        ]
-
-        status_index = children_to_parent_statuses_lut[binary_status]
-        status = parent_statuses_lut[status_index]
+        status_index = CHILDREN_TO_PARENT_STATUSES_LUT[binary_status]
+        return parent_statuses_lut[status_index]
 
-        logger.debug('binary statuses value : %s' % binary_status)
-        logger.debug('setting status to : %s' % status.code)
+    @classmethod
+    def propagate_statuses(cls, tasks):
+        """Updates the statuses of the dependent tasks and the parents of the
+        given tasks in bulk.
+
+        The statuses of the affected tasks, which are the given tasks, the
+        tasks that depend to them, their parents and so on, are calculated
+        only once in topological order by using the already calculated
+        statuses of the upstream tasks, and are set at the end. So the changes
+        can be saved with one flush.
+
+        It gives the same result with calling
+        :meth:`.update_status_with_dependent_statuses` and
+        :meth:`.update_parent_statuses` for each of the affected tasks, but
+        without calculating the same container status many times.
+
+        :param list tasks: A list of :class:`.Task` instances whose statuses
+          are changed.
+        :returns: The list of the affected tasks in the order their statuses
+          are calculated.
+        """
+        from collections import deque
+        from stalker.db.session import DBSession
 
-        self.status = status
+        with DBSession.no_autoflush:
+            # gather the affected tasks, use the python ids of the tasks as
+            # keys, Entities define their own __eq__ and __hash__
+            affected = {}
+            to_visit = deque(tasks)
+            while to_visit:
+                task = to_visit.popleft()
+                if task is None or id(task) in affected:
+                    # None is for the TaskDependencies that are removed but
+                    # not flushed yet
+                    continue
+                affected[id(task)] = task
+                to_visit.extend(task.dependent_of)
+                if task.parent is not None:
+                    to_visit.append(task.parent)
+
+            # sort them topologically, a task comes after the tasks that it
+            # depends to and a parent comes after its children
+            downstream = dict((key, []) for key in affected)
+            in_degree = dict((key, 0) for key in affected)
+            for key, task in affected.items():
+                upstream = list(task.depends) + list(task.children)
+                for up in upstream:
+                    if id(up) in affected:
+                        downstream[id(up)].append(key)
+                        in_degree[key] += 1
+
+            queue = deque(key for key in affected if not in_degree[key])
+            ordered = []
+            while queue:
+                key = queue.popleft()
+                ordered.append(affected[key])
+                for down in downstream[key]:
+                    in_degree[down] -= 1
+                    if not in_degree[down]:
+                        queue.append(down)
+
+            if len(ordered) != len(affected):
+                from stalker.exceptions import CircularDependencyError
+                raise CircularDependencyError(
+                    'The dependencies and the parents of the given tasks '
+                    'creates a circular dependency'
+                )
 
-        # # update dependent task statuses
-        # for dep in self.dependent_of:
-        #     dep.update_status_with_dependent_statuses()
+            # calculate the statuses once
+            statuses = {}
+            expand_timing = {}
+            for task in ordered:
+                if task.is_container:
+                    statuses[id(task)] = \
+                        task._get_status_with_children_statuses([
+                            statuses.get(id(child), child.status)
+                            for child in task.children
+                        ])
+                else:
+                    statuses[id(task)], expand_timing[id(task)] = \
+                        task._get_status_with_dependent_statuses([
+                            statuses.get(id(dep), dep.status)
+                            for dep in task.depends
+                        ])
+
+            # and apply them
+            for task in ordered:
+                status = statuses[id(task)]
+                if task.status is not status:
+                    logger.debug(
+                        'setting status of %s from %s to %s' %
+                        (task.name, task.status, status)
+                    )
+                    task.status = status
+                if expand_timing.get(id(task)):
+                    task._expand_schedule_timing()
 
-        # go to parents
-        self.update_parent_statuses()
+        return ordered
 
     def _review_number_getter(self):
         """returns the revision number value
@@ -2759,15 +3450,9 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
         # get a suitable FilenameTemplate
         structure = self.project.structure
 
-        from stalker import FilenameTemplate
-
         task_template = None
         if structure:
-            for template in structure.templates:
-                assert isinstance(template, FilenameTemplate)
-                if template.target_entity_type == self.entity_type:
-                    task_template = template
-                    break
+            task_template = structure.get_template(self.entity_type)
 
         if not task_template:
             raise RuntimeError(
@@ -2782,10 +3467,8 @@ class Task(Entity, StatusMixin, DateRangeMixin, ReferenceMixin, ScheduleMixin, D
                 }
             )
 
-        import jinja2
-
         return os.path.normpath(
-            jinja2.Template(task_template.path).render(**kwargs)
+            task_template.render_path(**kwargs)
         ).replace('\\', '/')
 
     @property
@@ -3085,7 +3768,8 @@ def __update_total_logged_seconds__(tlog, new_duration, old_duration):
 # *****************************************************************************
 # Task.schedule_timing updates Task.parent.schedule_seconds attribute
 # *****************************************************************************
-@event.listens_for(Task.schedule_timing, 'set', propagate=True)
+@event.listens_for(Task.schedule_timing, 'set', propagate=True,
+                    active_history=True)
 def update_parents_schedule_seconds_with_schedule_timing(
         task, new_schedule_timing, old_schedule_timing, initiator):
     """Updates the parent tasks schedule_seconds attribute when the
@@ -3115,7 +3799,8 @@ def update_parents_schedule_seconds_with_schedule_timing(
 # *****************************************************************************
 # Task.schedule_unit updates Task.parent.schedule_seconds attribute
 # *****************************************************************************
-@event.listens_for(Task.schedule_unit, 'set', propagate=True)
+@event.listens_for(Task.schedule_unit, 'set', propagate=True,
+                    active_history=True)
 def update_parents_schedule_seconds_with_schedule_unit(
         task, new_schedule_unit, old_schedule_unit, initiator):
     """Updates the parent tasks schedule_seconds attribute when the
@@ -3202,6 +3887,363 @@ def removed_a_dependency(task, task_dependent, initiator):
     )
 
 
+# *****************************************************************************
+# Keep the rollup columns of the container tasks up to date
+# *****************************************************************************
+def _seconds_between(start, end):
+    """returns the seconds between the given datetimes as an integer
+    """
+    delta = end - start
+    return delta.days * 86400 + delta.seconds
+
+
+@event.listens_for(Session, 'before_flush')
+def collect_rollup_changes(session, flush_context, instances):
+    """Reads the state of the tasks and time logs that are going to be changed
+    in this flush from the database, to calculate the changes of the rollup
+    columns in :func:`.update_rollup_columns`.
+
+    The rollup columns of the persistent tasks are not written by the flush,
+    they are only updated by adding the changes of the flush to them.
+    """
+    from sqlalchemy import inspect, select, exists, or_
+    from sqlalchemy.orm.attributes import set_committed_value
+
+    session.info.pop('_rollup_changes', None)
+
+    block_ids = set()
+    task_ids = set()
+    time_log_ids = set()
+
+    for instance in session.new:
+        if isinstance(instance, Task):
+            with session.no_autoflush:
+                parent = instance.parent
+            if parent is not None and parent.id is not None:
+                task_ids.add(parent.id)
+            task_ids.add(instance.parent_id)
+
+    for instance in session.dirty:
+        if instance in session.deleted:
+            continue
+        if isinstance(instance, Task):
+            attrs = inspect(instance).attrs
+            for name in ['_schedule_seconds', '_total_logged_seconds']:
+                if attrs[name].history.has_changes():
+                    set_committed_value(
+                        instance, name, instance.__dict__.get(name)
+                    )
+            if attrs.parent.history.has_changes() or \
+               attrs.parent_id.history.has_changes():
+                block_ids.add(instance.id)
+                with session.no_autoflush:
+                    parent = instance.parent
+                if parent is not None and parent.id is not None:
+                    task_ids.add(parent.id)
+                task_ids.add(instance.parent_id)
+            if any(attrs[name].history.has_changes()
+                   for name in ['schedule_timing', 'schedule_unit',
+                                'schedule_model']):
+                task_ids.add(instance.id)
+        elif isinstance(instance, TimeLog):
+            attrs = inspect(instance).attrs
+            if any(attrs[name].history.has_changes()
+                   for name in ['task', '_start', '_end']):
+                time_log_ids.add(instance.id)
+
+    for instance in session.deleted:
+        if isinstance(instance, Task):
+            block_ids.add(instance.id)
+        elif isinstance(instance, TimeLog):
+            time_log_ids.add(instance.id)
+
+    block_ids.discard(None)
+    time_log_ids.discard(None)
+    task_ids.update(block_ids)
+    task_ids.discard(None)
+
+    changes = {'blocks': block_ids, 'tasks': {}, 'logged': {},
+               'time_logs': {}}
+    session.info['_rollup_changes'] = changes
+    if not task_ids and not time_log_ids:
+        return
+
+    connection = session.connection()
+    tasks = Task.__table__
+    if task_ids:
+        # the tasks, and the parents that the blocks are leaving
+        children = tasks.alias('Children')
+        block_parents = select([tasks.c.parent_id])\
+            .where(tasks.c.id.in_(block_ids))
+        for row in connection.execute(
+                select([
+                    tasks.c.id, tasks.c.parent_id, tasks.c.dag_path,
+                    tasks.c.schedule_timing, tasks.c.schedule_unit,
+                    tasks.c.schedule_model, tasks.c.schedule_seconds,
+                    tasks.c.total_logged_seconds,
+                    exists().where(children.c.parent_id == tasks.c.id)
+                ]).where(or_(tasks.c.id.in_(task_ids),
+                             tasks.c.id.in_(block_parents)))):
+            changes['tasks'][row[0]] = tuple(row)
+
+        from stalker.db.aggregates import logged_seconds
+        changes['logged'] = logged_seconds(
+            list(changes['tasks']), connection=connection
+        )
+
+    if time_log_ids:
+        time_logs = TimeLog.__table__
+        for time_log_id, task_id, start, end in connection.execute(
+                select([
+                    time_logs.c.id, time_logs.c.task_id, time_logs.c.start,
+                    time_logs.c.end
+                ]).where(time_logs.c.id.in_(time_log_ids))):
+            changes['time_logs'][time_log_id] = \
+                (task_id, _seconds_between(start, end))
+
+
+@event.listens_for(Session, 'after_flush')
+def update_rollup_columns(session, flush_context):
+    """Updates the schedule_seconds and total_logged_seconds columns of the
+    container tasks that have a descendant or a time log of a descendant
+    changed in this flush.
+
+    The change of every container is calculated from the changed tasks and
+    time logs only, and added to the columns with one statement, so the cost
+    doesn't depend on the size of the hierarchy. A re-parented or deleted
+    task moves its whole value from its old ancestors to the new ones. Use
+    :meth:`.Task.verify_schedule_info` to recompute the columns from scratch.
+
+    The ancestors are read from the ``dag_path`` column, so it calls
+    :func:`stalker.models.mixins.update_dag_paths` first, which updates the
+    paths only once per flush.
+    """
+    from sqlalchemy import select, exists
+
+    changes = session.info.pop('_rollup_changes', None)
+    if changes is None:
+        return
+
+    # the ancestors are read from the dag_path column, so the paths of the
+    # new and re-parented tasks should be updated first
+    update_dag_paths(session, flush_context)
+
+    tasks_before = changes['tasks']
+    logged_before = changes['logged']
+    block_ids = changes['blocks']
+
+    # the changes of the logged seconds of the tasks
+    logged_changes = {}
+
+    def add_logged(task_id, seconds):
+        if task_id is not None:
+            logged_changes[task_id] = logged_changes.get(task_id, 0) + seconds
+
+    deleted_ids = set()
+    new_ids = set()
+    for instance in session.new:
+        if isinstance(instance, Task):
+            new_ids.add(instance.id)
+        elif isinstance(instance, TimeLog):
+            add_logged(
+                instance.task_id,
+                _seconds_between(instance.start, instance.end)
+            )
+
+    for instance in session.dirty:
+        if isinstance(instance, TimeLog) \
+           and instance.id in changes['time_logs'] \
+           and instance not in session.deleted:
+            task_id, seconds = changes['time_logs'][instance.id]
+            add_logged(task_id, -seconds)
+            add_logged(
+                instance.task_id,
+                _seconds_between(instance.start, instance.end)
+            )
+
+    for instance in session.deleted:
+        if isinstance(instance, Task):
+            deleted_ids.add(instance.id)
+        elif isinstance(instance, TimeLog) \
+                and instance.id in changes['time_logs']:
+            task_id, seconds = changes['time_logs'][instance.id]
+            add_logged(task_id, -seconds)
+
+    task_ids = (new_ids | set(logged_changes) | set(tasks_before)) \
+        - deleted_ids
+    if not task_ids and not block_ids:
+        return
+
+    tasks = Task.__table__
+    children = tasks.alias('Children')
+    connection = session.connection()
+    tasks_after = dict(
+        (row[0], tuple(row)) for row in connection.execute(
+            select([
+                tasks.c.id, tasks.c.parent_id, tasks.c.dag_path,
+                tasks.c.schedule_timing, tasks.c.schedule_unit,
+                tasks.c.schedule_model, tasks.c.schedule_seconds,
+                tasks.c.total_logged_seconds,
+                exists().where(children.c.parent_id == tasks.c.id)
+            ]).where(tasks.c.id.in_(task_ids))
+        )
+    )
+
+    def ancestor_ids(row):
+        if row[2] is None:
+            logger.debug('task %s has no dag_path, skipping' % row[0])
+            return []
+        return Task._dag_ids_from_path(row[2])
+
+    def own_value(row, logged):
+        """the value of a leaf task
+        """
+        return Task.to_seconds(row[3], row[4], row[5]) or 0, logged
+
+    deltas = {}
+
+    def add(ids, schedule_seconds, total_logged_seconds):
+        if not schedule_seconds and not total_logged_seconds:
+            return
+        for task_id in ids:
+            delta = deltas.setdefault(task_id, [0, 0])
+            delta[0] += schedule_seconds
+            delta[1] += total_logged_seconds
+
+    # move the values of the re-parented and deleted tasks
+    for task_id in block_ids:
+        before = tasks_before.get(task_id)
+        if before is None:
+            continue
+        if before[8]:
+            value = (before[6] or 0, before[7] or 0)
+        else:
+            value = own_value(before, logged_before.get(task_id, 0))
+
+        # the old ancestors, as they are after the nearest moved ancestor of
+        # this task is moved
+        old_ids = ancestor_ids(before)
+        for i in range(len(old_ids) - 1, -1, -1):
+            if old_ids[i] in block_ids:
+                if old_ids[i] in deleted_ids:
+                    old_ids = []
+                else:
+                    old_ids = ancestor_ids(tasks_after[old_ids[i]]) + \
+                        old_ids[i:]
+                break
+
+        add(old_ids, -value[0], -value[1])
+        if task_id not in deleted_ids:
+            add(ancestor_ids(tasks_after[task_id]), *value)
+
+    # the own values of the changed leaf tasks and the tasks that become a
+    # container or a leaf
+    reset_ids = set()
+    for task_id in task_ids:
+        after = tasks_after.get(task_id)
+        if after is None:
+            continue
+        before = tasks_before.get(task_id)
+        logged = logged_changes.get(task_id, 0)
+        is_leaf = not after[8]
+        if task_id in new_ids:
+            if is_leaf:
+                value = own_value(after, logged)
+            else:
+                value = (0, 0)
+                reset_ids.add(task_id)
+        else:
+            was_leaf = not before[8] if before else is_leaf
+            if was_leaf and is_leaf:
+                schedule_seconds_before = \
+                    own_value(before, 0)[0] if before \
+                    else own_value(after, 0)[0]
+                value = (
+                    own_value(after, 0)[0] - schedule_seconds_before,
+                    logged
+                )
+            elif was_leaf:
+                # became a container
+                value = own_value(before, logged_before.get(task_id, 0))
+                value = (-value[0], -value[1])
+                reset_ids.add(task_id)
+            elif is_leaf:
+                # became a leaf
+                value = own_value(
+                    after, logged_before.get(task_id, 0) + logged
+                )
+            else:
+                value = (0, 0)
+        add(ancestor_ids(after), *value)
+
+    _apply_rollup_deltas(session, deltas, reset_ids)
+
+
+def _apply_rollup_deltas(session, deltas, reset_ids=()):
+    """Adds the given changes to the schedule_seconds and total_logged_seconds
+    columns of the container tasks with one statement, and updates the loaded
+    tasks.
+
+    :param session: The session to run the statements in.
+    :param dict deltas: A dictionary of task ids and [schedule_seconds,
+      total_logged_seconds] changes.
+    :param reset_ids: The ids of the tasks that became a container in this
+      flush, their columns are set to zero before adding the changes.
+    """
+    from sqlalchemy import inspect, select, bindparam, func
+    from sqlalchemy.orm.attributes import set_committed_value
+
+    tasks = Task.__table__
+    connection = session.connection()
+    if reset_ids:
+        connection.execute(
+            tasks.update()
+            .where(tasks.c.id.in_(reset_ids))
+            .values(schedule_seconds=0, total_logged_seconds=0)
+        )
+
+    deltas = [
+        {'_id': task_id, '_schedule_seconds': delta[0],
+         '_total_logged_seconds': delta[1]}
+        for task_id, delta in deltas.items() if delta[0] or delta[1]
+    ]
+    if deltas:
+        connection.execute(
+            tasks.update()
+            .where(tasks.c.id == bindparam('_id'))
+            .values(
+                schedule_seconds=func.coalesce(tasks.c.schedule_seconds, 0) +
+                bindparam('_schedule_seconds'),
+                total_logged_seconds=func.coalesce(
+                    tasks.c.total_logged_seconds, 0
+                ) + bindparam('_total_logged_seconds')
+            ),
+            deltas
+        )
+
+    task_ids = set(reset_ids) | set(delta['_id'] for delta in deltas)
+    if not task_ids:
+        return
+
+    # update the loaded tasks
+    mapper = inspect(Task)
+    for task_id, schedule_seconds, total_logged_seconds in connection.execute(
+            select([
+                tasks.c.id, tasks.c.schedule_seconds,
+                tasks.c.total_logged_seconds
+            ]).where(tasks.c.id.in_(task_ids))):
+        instance = session.identity_map.get(
+            mapper.identity_key_from_primary_key([task_id])
+        )
+        if instance is not None:
+            set_committed_value(
+                instance, '_schedule_seconds', schedule_seconds
+            )
+            set_committed_value(
+                instance, '_total_logged_seconds', total_logged_seconds
+            )
+
+
 @event.listens_for(TimeLog.__table__, 'after_create')
 def add_exclude_constraint(table, connection, **kwargs):
     """adds the PostgreSQL specific ExcludeConstraint
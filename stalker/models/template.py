@@ -16,6 +16,8 @@
 # You should have received a copy of the Lesser GNU General Public License
 # along with Stalker.  If not, see <http://www.gnu.org/licenses/>
 
+from collections import OrderedDict
+
 from sqlalchemy import Column, Integer, ForeignKey, Text
 from sqlalchemy.orm import validates
 from stalker.models.entity import Entity
@@ -27,6 +29,34 @@ import logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging_level)
 
+# the compiled jinja2 templates, keyed by the template code and in least
+# recently used order
+_compiled_templates = OrderedDict()
+compiled_templates_max_size = 256
+
+
+def compile_template(code):
+    """Returns the compiled :class:`jinja2.Template` of the given template
+    code.
+
+    Compiling a template is much slower than rendering it, so the compiled
+    templates are cached. The cache is keyed by the template code, so editing
+    a :class:`.FilenameTemplate` never renders the old code, and the least
+    recently used templates are removed when there are more than
+    ``compiled_templates_max_size`` templates.
+
+    :param str code: The `Jinja2`_ template code.
+    :returns: :class:`jinja2.Template`
+    """
+    template = _compiled_templates.pop(code, None)
+    if template is None:
+        import jinja2
+        template = jinja2.Template(code)
+        while len(_compiled_templates) >= compiled_templates_max_size:
+            _compiled_templates.popitem(last=False)
+    _compiled_templates[code] = template
+    return template
+
 
 class FilenameTemplate(Entity, TargetEntityTypeMixin):
     """Holds templates for filename and path conventions.
@@ -152,6 +182,21 @@ class FilenameTemplate(Entity, TargetEntityTypeMixin):
 
         return filename_in
 
+    def render_path(self, **kwargs):
+        """Renders the :attr:`.path` template code with the given variables.
+
+        :returns: str
+        """
+        return compile_template(self.path).render(**kwargs)
+
+    def render_filename(self, **kwargs):
+        """Renders the :attr:`.filename` template code with the given
+        variables.
+
+        :returns: str
+        """
+        return compile_template(self.filename).render(**kwargs)
+
     def __eq__(self, other):
         """checks the equality of the given object to this one
         """
@@ -22,7 +22,7 @@ from sqlalchemy.exc import UnboundExecutionError
 from sqlalchemy.orm import synonym, relationship
 from sqlalchemy.orm.mapper import validates
 from sqlalchemy import Column, Integer, String, Text
-from sqlalchemy.schema import ForeignKey, Table
+from sqlalchemy.schema import ForeignKey, Sequence, Table
 from sqlalchemy.types import Enum
 
 from stalker.db.declarative import Base
@@ -238,9 +238,11 @@ class Ticket(Entity, StatusMixin):
     )
 
     def __init__(self, project=None, links=None, priority='TRIVIAL',
-                 summary=None, **kwargs):
+                 summary=None, number=None, **kwargs):
         # just force auto name generation
-        self._number = self._generate_ticket_number()
+        if number is None:
+            number = self._generate_ticket_number()
+        self._number = self._validate_number(number)
         from stalker import defaults
         kwargs['name'] = '%s #%i' % (defaults.ticket_label, self.number)
 
@@ -278,30 +280,95 @@ class Ticket(Entity, StatusMixin):
     )
 
     @classmethod
-    def _maximum_number(cls):
-        """returns the maximum available number from the database
-
-        :return: integer
+    def reserve_ticket_numbers(cls, count=1, connection=None):
+        """Reserves the given count of ticket numbers at once.
+
+        PostgreSQL uses the ``Tickets_number_seq`` sequence, so the numbers
+        are never given twice even if the transaction is rolled back, and
+        concurrent transactions do not wait for each other. The other
+        databases increment the ``Ticket_Number_Counter`` table, which is
+        rolled back with the transaction.
+
+        Use it to import many tickets at once, and pass the reserved numbers
+        to the ``number`` argument of the Tickets::
+
+          numbers = Ticket.reserve_ticket_numbers(len(data))
+          tickets = [
+              Ticket(number=number, **kwargs)
+              for number, kwargs in zip(numbers, data)
+          ]
+
+        :param int count: The number of ticket numbers to reserve.
+        :param connection: The connection to run the query with. The default
+          is None which uses the connection of the :class:`.DBSession`.
+        :returns: A sorted list of ticket numbers.
         """
-        try:
-            # do your query
+        from sqlalchemy import func, literal, select
+
+        if not isinstance(count, int) or isinstance(count, bool):
+            raise TypeError(
+                '%s.reserve_ticket_numbers() count should be an integer, '
+                'not %s' % (cls.__name__, count.__class__.__name__)
+            )
+
+        if count < 1:
+            raise ValueError(
+                '%s.reserve_ticket_numbers() count should be a positive '
+                'integer, not %s' % (cls.__name__, count)
+            )
+
+        if connection is None:
             from stalker.db.session import DBSession
-            with DBSession.no_autoflush:
-                max_ticket = Ticket.query \
-                    .order_by(Ticket.number.desc()) \
-                    .first()
-        except UnboundExecutionError:
-            max_ticket = None
+            connection = DBSession.connection()
+
+        if connection.dialect.name == 'postgresql':
+            return sorted(
+                number for number, in connection.execute(
+                    select([Ticket_Number_Sequence.next_value()])
+                    .select_from(func.generate_series(1, count))
+                )
+            )
 
-        return max_ticket.number if max_ticket is not None else 0
+        counter = Ticket_Number_Counter
+        result = connection.execute(
+            counter.update().values(number=counter.c.number + count)
+        )
+        if not result.rowcount:
+            # start from the existing tickets
+            tickets = cls.__table__
+            connection.execute(
+                counter.insert().from_select(
+                    [counter.c.id, counter.c.number],
+                    select([
+                        literal(1),
+                        func.coalesce(func.max(tickets.c.number), 0) + count
+                    ])
+                )
+            )
+        last_number = connection.execute(
+            select([counter.c.number])
+        ).scalar()
+        return list(range(last_number - count + 1, last_number + 1))
 
     def _generate_ticket_number(self):
         """auto generates a number for the ticket
 
         :return: integer
         """
-        # TODO: try to make it atomic
-        return self._maximum_number() + 1
+        try:
+            return self.reserve_ticket_numbers(1)[0]
+        except UnboundExecutionError:
+            return 1
+
+    def _validate_number(self, number):
+        """validates the given number value
+        """
+        if not isinstance(number, int) or isinstance(number, bool):
+            raise TypeError(
+                '%s.number should be an integer, not %s' %
+                (self.__class__.__name__, number.__class__.__name__)
+            )
+        return number
 
     @validates('related_tickets')
     def _validate_related_tickets(self, key, related_ticket):
@@ -530,3 +597,13 @@ Ticket_SimpleEntities = Table(
     Column('simple_entity_id', Integer, ForeignKey('SimpleEntities.id'),
            primary_key=True)
 )
+
+# The sequence of the ticket numbers in PostgreSQL
+Ticket_Number_Sequence = Sequence('Tickets_number_seq', metadata=Base.metadata)
+
+# The counter of the ticket numbers in the databases without sequences
+Ticket_Number_Counter = Table(
+    'Ticket_Number_Counter', Base.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('number', Integer, nullable=False)
+)
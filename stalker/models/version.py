@@ -19,11 +19,12 @@
 import os
 
 import re
-import jinja2
 
-from sqlalchemy import Table, Column, Integer, ForeignKey, String, Boolean
+from sqlalchemy import (Table, Column, Integer, ForeignKey, String, Boolean,
+                        Index, event)
 from sqlalchemy.exc import UnboundExecutionError, OperationalError
 from sqlalchemy.orm import relationship, validates
+from sqlalchemy.sql import text
 
 from stalker.db.declarative import Base
 from stalker.models.link import Link
@@ -112,6 +113,21 @@ class Version(Link, DAGMixin):
 
     __dag_cascade__ = "save-update, merge"
 
+    __table_args__ = (
+        # used to find the latest version of a take
+        Index(
+            'ix_Versions_task_id_take_name_version_number',
+            'task_id', 'take_name', 'version_number'
+        ),
+        # and the latest published version
+        Index(
+            'ix_Versions_published_task_id_take_name_version_number',
+            'task_id', 'take_name', 'version_number',
+            postgresql_where=text('is_published'),
+            sqlite_where=text('is_published')
+        ),
+    )
+
     version_id = Column("id", Integer, ForeignKey("Links.id"),
                         primary_key=True)
 
@@ -140,6 +156,10 @@ class Version(Link, DAGMixin):
         nullable=False,
         doc="""The :attr:`.version_number` attribute is read-only.
         Trying to change it will produce an AttributeError.
+
+        The number calculated in Python is a provisional one, the final
+        number is allocated by :meth:`.allocate_version_number` when the
+        Version is inserted to the database.
         """
     )
 
@@ -413,8 +433,11 @@ class Version(Link, DAGMixin):
         }
         return kwargs
 
-    def update_paths(self):
-        """updates the path variables
+    def _render_paths(self):
+        """renders the path and the filename of this version with the
+        FilenameTemplate of the related Task
+
+        :returns: a (path, filename) tuple
         """
         kwargs = self._template_variables()
 
@@ -423,10 +446,7 @@ class Version(Link, DAGMixin):
 
         vers_template = None
         if structure:
-            for template in structure.templates:
-                if template.target_entity_type == self.task.entity_type:
-                    vers_template = template
-                    break
+            vers_template = structure.get_template(self.task.entity_type)
 
         if not vers_template:
             raise RuntimeError(
@@ -441,8 +461,7 @@ class Version(Link, DAGMixin):
                 }
             )
 
-        temp_filename = \
-            jinja2.Template(vers_template.filename).render(**kwargs)
+        temp_filename = vers_template.render_filename(**kwargs)
 
         from stalker import __string_types__
         if not isinstance(temp_filename, __string_types__):
@@ -452,8 +471,7 @@ class Version(Link, DAGMixin):
             # unicode for python2
             temp_filename = temp_filename.encode('utf-8')
 
-        temp_path = \
-            jinja2.Template(vers_template.path).render(**kwargs)
+        temp_path = vers_template.render_path(**kwargs)
 
         if not isinstance(temp_path, __string_types__):
             # it is
@@ -462,8 +480,143 @@ class Version(Link, DAGMixin):
             # unicode for python2
             temp_path = temp_path.encode('utf-8')
 
+        return temp_path, temp_filename
+
+    def update_paths(self):
+        """updates the path variables
+        """
+        temp_path, temp_filename = self._render_paths()
         self.filename = temp_filename
         self.path = temp_path
+        # to render the paths again if the version number changes on insert
+        self._rendered_version_number = self.version_number
+
+    @classmethod
+    def bulk_update_paths(cls, versions, batch_size=500):
+        """Renders the paths of the given versions again and stores the
+        changed ones, use it after changing a :class:`.Structure` or a
+        :class:`.FilenameTemplate`.
+
+        The versions are processed in batches. For each batch the related
+        tasks, their parents, projects, structures, templates, repositories,
+        sequences and scenes are loaded with a couple of queries, so rendering
+        the paths doesn't cause lazy loads, and the changed ``full_path``
+        values are written with one executemany ``UPDATE`` statement.
+
+        It runs in the transaction of the :class:`.DBSession`, so commit the
+        session to keep the changes.
+
+        :param list versions: A list of :class:`.Version` instances or
+          version ids.
+        :param int batch_size: The number of versions to process at once.
+        :returns: A list of (version id, old full path, new full path) tuples
+          for the versions that are moved.
+        """
+        from sqlalchemy.orm import (joinedload, selectinload,
+                                    with_polymorphic)
+        from sqlalchemy.orm.attributes import set_committed_value
+        from stalker.db.session import DBSession
+        from stalker.models.project import Project, ProjectRepository
+        from stalker.models.shot import Shot
+        from stalker.models.structure import Structure
+        from stalker.models.task import Task
+
+        version_ids = [getattr(version, 'id', version) for version in versions]
+        any_task = with_polymorphic(Task, '*')
+        links = Link.__table__
+        moved = []
+
+        with DBSession.no_autoflush:
+            for i in range(0, len(version_ids), batch_size):
+                batch = DBSession.query(cls)\
+                    .filter(cls.id.in_(version_ids[i:i + batch_size]))\
+                    .options(joinedload(cls.type))\
+                    .order_by(cls.id)\
+                    .all()
+
+                # the tasks and their parents
+                tasks = DBSession.query(any_task)\
+                    .filter(any_task.id.in_(
+                        set(version.task_id for version in batch)
+                    )).all()
+                parent_ids = set()
+                for task in tasks:
+                    if task.dag_path:
+                        parent_ids.update(
+                            Task._dag_ids_from_path(task.dag_path)
+                        )
+                if parent_ids:
+                    tasks += DBSession.query(any_task)\
+                        .filter(any_task.id.in_(parent_ids)).all()
+
+                projects = DBSession.query(Project)\
+                    .filter(Project.id.in_(
+                        set(task.project_id for task in tasks)
+                    ))\
+                    .options(
+                        joinedload(Project.structure)
+                        .selectinload(Structure.templates),
+                        selectinload(Project.repositories_proxy)
+                        .joinedload(ProjectRepository.repository)
+                    ).all()
+
+                # the relations are joined to the subclass tables, which
+                # doesn't let them to be taken from the identity map, so set
+                # them directly
+                tasks_by_id = dict((task.id, task) for task in tasks)
+                projects_by_id = dict(
+                    (project.id, project) for project in projects
+                )
+                for version in batch:
+                    set_committed_value(
+                        version, 'task', tasks_by_id[version.task_id]
+                    )
+                for task in tasks:
+                    set_committed_value(
+                        task, '_project', projects_by_id[task.project_id]
+                    )
+
+                shot_ids = [
+                    task.id for task in tasks if isinstance(task, Shot)
+                ]
+                if shot_ids:
+                    DBSession.query(Shot)\
+                        .filter(Shot.id.in_(shot_ids))\
+                        .options(
+                            selectinload(Shot.sequences),
+                            selectinload(Shot.scenes)
+                        ).all()
+
+                updates = []
+                for version in batch:
+                    temp_path, temp_filename = version._render_paths()
+                    if temp_path == '':
+                        raise ValueError(
+                            '%s.path can not be an empty string' %
+                            cls.__name__
+                        )
+                    full_path = cls._format_path(
+                        os.path.join(temp_path, temp_filename)
+                    )
+                    if full_path != version.full_path:
+                        moved.append(
+                            (version.id, version.full_path, full_path)
+                        )
+                        updates.append(
+                            {'link_id': version.id, 'full_path': full_path}
+                        )
+                        set_committed_value(version, 'full_path', full_path)
+
+                if updates:
+                    from sqlalchemy import bindparam
+                    DBSession.connection().execute(
+                        links.update()
+                        .where(links.c.id == bindparam('link_id'))
+                        .values(full_path=bindparam('full_path')),
+                        updates
+                    )
+
+        return moved
 
     @property
     def absolute_full_path(self):
@@ -513,6 +666,174 @@ class Version(Link, DAGMixin):
             .order_by(Version.version_number.desc())\
             .first()
 
+    @classmethod
+    def get_latest_versions(cls, tasks, take_name=None):
+        """Returns the latest and the latest published versions of all the
+        takes of the given tasks in one query.
+
+        Use it instead of calling :attr:`.latest_version` and
+        :attr:`.latest_published_version` for each take, when listing the
+        versions of many tasks.
+
+        :param list tasks: A list of :class:`.Task` instances or task ids.
+        :param str take_name: Only return the versions of the given take. The
+          default is None which returns all the takes.
+        :returns: A dictionary of (task id, take name) tuples and (latest
+          version, latest published version) tuples. The latest published
+          version is None for the takes that have no published versions.
+        """
+        from sqlalchemy import and_, or_, case, func, select
+
+        task_ids = [getattr(task, 'id', task) for task in tasks]
+        if not task_ids:
+            return {}
+
+        versions = cls.__table__
+        condition = versions.c.task_id.in_(task_ids)
+        if take_name is not None:
+            condition = and_(condition, versions.c.take_name == take_name)
+
+        latest = select([
+            versions.c.task_id,
+            versions.c.take_name,
+            func.max(versions.c.version_number).label('version_number'),
+            func.max(
+                case(
+                    [(versions.c.is_published, versions.c.version_number)],
+                    else_=None
+                )
+            ).label('published_version_number')
+        ]).where(condition)\
+            .group_by(versions.c.task_id, versions.c.take_name)\
+            .alias('Latest_Versions')
+
+        query = Version.query.join(
+            latest,
+            and_(
+                Version.task_id == latest.c.task_id,
+                Version.take_name == latest.c.take_name,
+                or_(
+                    Version.version_number == latest.c.version_number,
+                    Version.version_number ==
+                    latest.c.published_version_number
+                )
+            )
+        ).add_columns(
+            latest.c.version_number,
+            latest.c.published_version_number
+        )
+
+        result = {}
+        for version, version_number, published_version_number in query:
+            key = (version.task_id, version.take_name)
+            latest_version, latest_published_version = \
+                result.get(key, (None, None))
+            if version.version_number == version_number:
+                latest_version = version
+            if version.version_number == published_version_number:
+                latest_published_version = version
+            result[key] = (latest_version, latest_published_version)
+
+        return result
+
+    @classmethod
+    def allocate_version_number(cls, task, take_name, version_number=None,
+                                connection=None):
+        """Allocates the next version number of the given take in the
+        database.
+
+        The numbers are kept in the ``Version_Counters`` table, one row per
+        take. In PostgreSQL the counter is incremented with one
+        ``INSERT ... ON CONFLICT DO UPDATE ... RETURNING`` statement, which
+        locks the counter row until the end of the transaction. So concurrent
+        transactions publishing to the same take wait for each other and get
+        unique numbers, without reading the latest version first. The other
+        databases update the counter before reading it back, which takes the
+        write lock of the database in SQLite3.
+
+        The allocated number is never lower than the given version_number or
+        the highest version number of the take plus one.
+
+        :param task: A :class:`.Task` instance or a task id.
+        :param str take_name: The take name.
+        :param int version_number: The requested version number. The default
+          is None which allocates the next number.
+        :param connection: The connection to run the query with. The default
+          is None which uses the connection of the :class:`.DBSession`.
+        :returns: The allocated version number as an int.
+        """
+        from sqlalchemy import and_, func, literal, select
+
+        if connection is None:
+            from stalker.db.session import DBSession
+            connection = DBSession.connection()
+
+        task_id = getattr(task, 'id', task)
+        if version_number is None:
+            version_number = 1
+
+        versions = cls.__table__
+        counters = Version_Counters
+        dialect_name = connection.dialect.name
+
+        if dialect_name == 'sqlite':
+            greatest = func.max
+        else:
+            greatest = func.greatest
+
+        # the first number of a take is calculated from the existing
+        # versions, for the databases created before the counters
+        first_number = select([
+            literal(task_id),
+            literal(take_name),
+            greatest(
+                func.coalesce(func.max(versions.c.version_number), 0) + 1,
+                version_number
+            )
+        ]).where(
+            and_(
+                versions.c.task_id == task_id,
+                versions.c.take_name == take_name
+            )
+        )
+        columns = [
+            counters.c.task_id, counters.c.take_name,
+            counters.c.version_number
+        ]
+
+        if dialect_name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            query = insert(counters).from_select(columns, first_number)
+            query = query.on_conflict_do_update(
+                index_elements=[counters.c.task_id, counters.c.take_name],
+                set_={
+                    'version_number': greatest(
+                        counters.c.version_number + 1,
+                        query.excluded.version_number
+                    )
+                }
+            ).returning(counters.c.version_number)
+            return connection.execute(query).scalar()
+
+        this_take = and_(
+            counters.c.task_id == task_id,
+            counters.c.take_name == take_name
+        )
+        result = connection.execute(
+            counters.update().where(this_take).values(
+                version_number=greatest(
+                    counters.c.version_number + 1, version_number
+                )
+            )
+        )
+        if not result.rowcount:
+            connection.execute(
+                counters.insert().from_select(columns, first_number)
+            )
+        return connection.execute(
+            select([counters.c.version_number]).where(this_take)
+        ).scalar()
+
     @validates('created_with')
     def _validate_created_with(self, key, created_with):
         """validates the given created_with value
@@ -587,6 +908,44 @@ class Version(Link, DAGMixin):
         for v in walk_hierarchy(self, 'inputs', method=method):
             yield v
 
+
+@event.listens_for(Version, 'before_insert')
+def allocate_version_number(mapper, connection, version):
+    """allocates the version number of the inserted Version in the database,
+    the paths rendered by :meth:`.Version.update_paths` are updated if the
+    allocated number is different than the one calculated in Python
+    """
+    from sqlalchemy.orm.attributes import set_committed_value
+    version_number = Version.allocate_version_number(
+        version.task, version.take_name, version.version_number,
+        connection=connection
+    )
+    if version_number == version.version_number:
+        return
+
+    logger.debug(
+        'version number %s is already taken, using %s' %
+        (version.version_number, version_number)
+    )
+    set_committed_value(version, 'version_number', version_number)
+    if getattr(version, '_rendered_version_number', None) \
+       not in (None, version_number):
+        version.update_paths()
+
+
+# VERSION COUNTERS
+Version_Counters = Table(
+    "Version_Counters", Base.metadata,
+    Column(
+        "task_id",
+        Integer,
+        ForeignKey("Tasks.id", ondelete="CASCADE"),
+        primary_key=True
+    ),
+    Column("take_name", String(256), primary_key=True),
+    Column("version_number", Integer, nullable=False)
+)
+
 # VERSION INPUTS
 Version_Inputs = Table(
     "Version_Inputs", Base.metadata,
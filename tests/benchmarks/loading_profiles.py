@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Stalker a Production Asset Management System
+# Copyright (C) 2009-2018 Erkan Ozgur Yilmaz
+#
+# This file is part of Stalker.
+#
+# Stalker is free software: you can redistribute it and/or modify
+# it under the terms of the Lesser GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+#
+# Stalker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# Lesser GNU General Public License for more details.
+#
+# You should have received a copy of the Lesser GNU General Public License
+# along with Stalker.  If not, see <http://www.gnu.org/licenses/>
+"""Compares the number of queries and the time spent to list tasks, versions
+and reviews with the default lazy loading and with the loading profiles in
+stalker.db.loading
+"""
+
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+
+import logging
+from stalker import log
+log.logging_level = logging.INFO
+
+import stalker
+from stalker.config import Config
+from stalker import db, Review, Task, Version
+from stalker.db.declarative import Base
+from stalker.db.loading import with_loading_profile
+from stalker.db.session import DBSession
+from stalker.testing import create_random_db, drop_db
+
+from tests.db.test_loading import (create_test_data, render_task_grid,
+                                   render_version_browser,
+                                   render_review_queue)
+
+
+# create a new database for this test only
+database_url, database_name = create_random_db()
+
+# update the config
+config = {
+    'sqlalchemy.url': database_url,
+    'sqlalchemy.poolclass': NullPool
+}
+
+
+try:
+    os.environ.pop(Config.env_key)
+except KeyError:
+    # already removed
+    pass
+
+# regenerate the defaults
+stalker.defaults = Config()
+
+# init database
+db.setup(config)
+db.init()
+
+task_count = 200
+benchmark_start = time.time()
+create_test_data(task_count)
+benchmark_end = time.time()
+print('data created in: %s secs' % (benchmark_end - benchmark_start))
+
+statements = []
+
+
+def count(conn, cursor, statement, *args):
+    statements.append(statement)
+
+
+engine = DBSession.connection().engine
+event.listen(engine, 'before_cursor_execute', count)
+
+
+def run(title, query, render_function):
+    """loads and renders the given query in an empty session and prints the
+    number of queries and the time spent
+    """
+    DBSession.expunge_all()
+    del statements[:]
+    benchmark_start = time.time()
+    render_function(query.all())
+    benchmark_end = time.time()
+    print(
+        '%-24s %5s queries in %.3f secs' %
+        (title, len(statements), benchmark_end - benchmark_start)
+    )
+
+
+for name, query, render_function in [
+        ('task_grid', Task.query.filter(Task.parent_id != None),
+         render_task_grid),
+        ('version_browser', Version.query, render_version_browser),
+        ('review_queue', Review.query, render_review_queue)]:
+    run('%s (lazy)' % name, query, render_function)
+    run(
+        '%s (profile)' % name,
+        with_loading_profile(query, name),
+        render_function
+    )
+
+event.remove(engine, 'before_cursor_execute', count)
+
+# clean up test database
+DBSession.rollback()
+connection = DBSession.connection()
+engine = connection.engine
+connection.close()
+
+Base.metadata.drop_all(engine, checkfirst=True)
+DBSession.remove()
+
+DBSession.close_all()
+drop_db(database_name)
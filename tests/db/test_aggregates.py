@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Stalker a Production Asset Management System
+# Copyright (C) 2009-2018 Erkan Ozgur Yilmaz
+#
+# This file is part of Stalker.
+#
+# Stalker is free software: you can redistribute it and/or modify
+# it under the terms of the Lesser GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+#
+# Stalker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# Lesser GNU General Public License for more details.
+#
+# You should have received a copy of the Lesser GNU General Public License
+# along with Stalker.  If not, see <http://www.gnu.org/licenses/>
+
+import datetime
+
+import pytz
+
+from stalker.testing import UnitTestDBBase
+
+
+def create_test_data():
+    """creates two tasks with time logs and returns them
+    """
+    from stalker import Repository, Project, Task, TimeLog, User, Type
+    from stalker.db.session import DBSession
+
+    user = User(
+        name='Test User',
+        login='tuser',
+        email='tuser@users.com',
+        password='secret'
+    )
+    repository = Repository(name='Test Repository')
+    project = Project(
+        name='Test Project',
+        code='TP',
+        repositories=[repository],
+        type=Type(
+            name='Commercial',
+            code='comm',
+            target_entity_type='Project'
+        )
+    )
+    task1 = Task(name='Task 1', project=project, resources=[user])
+    task2 = Task(name='Task 2', project=project, resources=[user])
+    task3 = Task(name='Task 3', project=project, resources=[user])
+
+    td = datetime.timedelta
+    start = datetime.datetime(2018, 1, 1, 10, 0, tzinfo=pytz.utc)
+    TimeLog(task=task1, resource=user, start=start, end=start + td(hours=2))
+    TimeLog(
+        task=task1, resource=user,
+        start=start + td(hours=3), end=start + td(hours=4)
+    )
+    TimeLog(
+        task=task2, resource=user,
+        start=start + td(hours=4), end=start + td(days=1, hours=4)
+    )
+    DBSession.add_all([task1, task2, task3])
+    DBSession.commit()
+    return task1, task2, task3
+
+
+def test_logged_seconds_with_sqlite3(setup_sqlite3):
+    """testing if logged_seconds() is summing the time logs natively in
+    SQLite3
+    """
+    from stalker import db
+    db.setup()
+    db.init()
+
+    from stalker.db.session import DBSession
+    assert str(DBSession.connection().engine.url) == 'sqlite://'
+
+    task1, task2, task3 = create_test_data()
+
+    from stalker.db.aggregates import logged_seconds
+    assert logged_seconds([task1.id, task2.id, task3.id]) == {
+        task1.id: 10800,
+        task2.id: 86400,
+        task3.id: 0
+    }
+    assert task1.total_logged_seconds == 10800
+
+
+class AggregatesTestDBCase(UnitTestDBBase):
+    """tests the stalker.db.aggregates module
+    """
+
+    def test_logged_seconds(self):
+        """testing if logged_seconds() is summing the time logs of the given
+        tasks
+        """
+        task1, task2, task3 = create_test_data()
+
+        from stalker.db.aggregates import logged_seconds
+        assert logged_seconds([task1.id, task2.id, task3.id]) == {
+            task1.id: 10800,
+            task2.id: 86400,
+            task3.id: 0
+        }
+        assert logged_seconds([]) == {}
+        assert task1.total_logged_seconds == 10800
+
+    def test_sum_durations_by_without_native_support(self):
+        """testing if sum_durations_by() falls back to Python for the
+        databases that are not supported natively
+        """
+        task1, task2, task3 = create_test_data()
+
+        from stalker import TimeLog
+        from stalker.db.aggregates import sum_durations_by
+        from stalker.db.session import DBSession
+        connection = DBSession.connection()
+        time_logs = TimeLog.__table__
+
+        native = sum_durations_by(
+            time_logs.c.task_id, time_logs.c.start, time_logs.c.end,
+            connection=connection
+        )
+        connection.dialect.name = 'not_supported'
+        try:
+            fallback = sum_durations_by(
+                time_logs.c.task_id, time_logs.c.start, time_logs.c.end,
+                connection=connection
+            )
+        finally:
+            connection.dialect.name = 'postgresql'
+
+        assert native == fallback == {task1.id: 10800, task2.id: 86400}
+
+    def test_logged_seconds_sees_flushed_time_logs(self):
+        """testing if the logged_seconds() runs in the transaction of the
+        session
+        """
+        task1, task2, task3 = create_test_data()
+
+        from stalker import TimeLog
+        from stalker.db.session import DBSession
+        start = datetime.datetime(2018, 1, 3, 10, 0, tzinfo=pytz.utc)
+        TimeLog(
+            task=task3, resource=task3.resources[0],
+            start=start, end=start + datetime.timedelta(hours=1)
+        )
+        DBSession.flush()
+
+        assert task3.total_logged_seconds == 3600
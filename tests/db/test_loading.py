@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# Stalker a Production Asset Management System
+# Copyright (C) 2009-2018 Erkan Ozgur Yilmaz
+#
+# This file is part of Stalker.
+#
+# Stalker is free software: you can redistribute it and/or modify
+# it under the terms of the Lesser GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+#
+# Stalker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# Lesser GNU General Public License for more details.
+#
+# You should have received a copy of the Lesser GNU General Public License
+# along with Stalker.  If not, see <http://www.gnu.org/licenses/>
+
+import pytest
+
+from stalker.testing import UnitTestDBBase
+
+
+def create_test_data(task_count=5):
+    """creates a project with parent and child tasks, dependencies, versions
+    and reviews
+    """
+    from stalker import Repository, Project, Review, Task, User, Version
+    from stalker.db.session import DBSession
+
+    users = [
+        User(
+            name='Test User %s' % i,
+            login='tuser%s' % i,
+            email='tuser%s@users.com' % i,
+            password='secret'
+        ) for i in range(3)
+    ]
+    repository = Repository(name='Test Repository')
+    project = Project(
+        name='Test Project', code='TP', repositories=[repository]
+    )
+    parent = Task(name='Parent', project=project, responsible=[users[0]])
+    tasks = []
+    for i in range(task_count):
+        task = Task(
+            name='Task %s' % i,
+            parent=parent,
+            resources=users[1:],
+            watchers=[users[i % 3]],
+            depends=tasks[-1:]
+        )
+        tasks.append(task)
+    DBSession.add_all(users + [parent])
+    DBSession.commit()
+
+    for task in tasks:
+        v1 = Version(task=task)
+        DBSession.add(v1)
+        DBSession.commit()
+        v2 = Version(task=task, inputs=[v1], parent=v1)
+        DBSession.add(v2)
+        DBSession.add(Review(task=task, reviewer=users[0]))
+    DBSession.commit()
+    return tasks
+
+
+def render_task_grid(tasks):
+    """touches the attributes shown in a task grid
+    """
+    return [
+        (task.name, task.status.code, task.type and task.type.name,
+         task.project.code,
+         task.parent.name, len(task.children),
+         [user.name for user in task.resources],
+         [user.name for user in task.responsible],
+         [user.name for user in task.watchers],
+         [dep.depends_to.name for dep in task.task_depends_to])
+        for task in tasks
+    ]
+
+
+def render_version_browser(versions):
+    """touches the attributes shown in a version browser
+    """
+    return [
+        (version.version_number, version.task.name,
+         version.created_by and version.created_by.name,
+         version.type and version.type.name,
+         version.parent and version.parent.version_number,
+         [link.full_path for link in version.inputs],
+         [link.full_path for link in version.outputs])
+        for version in versions
+    ]
+
+
+def render_review_queue(reviews):
+    """touches the attributes shown in a review queue
+    """
+    return [
+        (review.status.code, review.reviewer.name,
+         review.created_by and review.created_by.name,
+         review.task.name, review.task.status.code, review.task.project.code)
+        for review in reviews
+    ]
+
+
+class LoadingProfilesTestDBCase(UnitTestDBBase):
+    """tests the stalker.db.loading module
+    """
+
+    def count_queries(self, query_function, render_function):
+        """returns the result of the render function and the number of the
+        queries run to load and render the query in a new session
+        """
+        from sqlalchemy import event
+        from stalker.db.session import DBSession
+        DBSession.expunge_all()
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = DBSession.connection().engine
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            result = render_function(query_function().all())
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+        return result, len(statements)
+
+    def check_profile(self, query_function, render_function, name, count):
+        """checks if the given profile loads the same data with the given
+        number of queries
+        """
+        from stalker.db.loading import with_loading_profile
+        lazy, lazy_count = \
+            self.count_queries(query_function, render_function)
+        eager, eager_count = self.count_queries(
+            lambda: with_loading_profile(query_function(), name),
+            render_function
+        )
+        assert eager == lazy
+        assert eager_count == count
+        assert lazy_count > eager_count
+        return lazy_count
+
+    def test_task_grid_profile_is_working_properly(self):
+        """testing if the task_grid profile loads the tasks with a constant
+        number of queries
+        """
+        create_test_data()
+        from stalker import Task
+
+        def query():
+            return Task.query.filter(Task.parent_id != None)\
+                .order_by(Task.id)
+
+        lazy_count = self.check_profile(
+            query, render_task_grid, 'task_grid', 9
+        )
+        assert lazy_count >= 5 * 7
+
+    def test_version_browser_profile_is_working_properly(self):
+        """testing if the version_browser profile loads the versions with a
+        constant number of queries
+        """
+        create_test_data()
+        from stalker import Version
+
+        def query():
+            return Version.query.order_by(Version.id)
+
+        lazy_count = self.check_profile(
+            query, render_version_browser, 'version_browser', 5
+        )
+        assert lazy_count >= 10 * 3
+
+    def test_review_queue_profile_is_working_properly(self):
+        """testing if the review_queue profile loads the reviews with a
+        constant number of queries
+        """
+        create_test_data()
+        from stalker import Review
+
+        def query():
+            return Review.query.order_by(Review.id)
+
+        lazy_count = self.check_profile(
+            query, render_review_queue, 'review_queue', 3
+        )
+        assert lazy_count >= 5 * 2
+
+    def test_with_loading_profile_with_a_wrong_query(self):
+        """testing if a TypeError will be raised when the profile is used with
+        a query of another class
+        """
+        from stalker import Version
+        from stalker.db.loading import with_loading_profile
+        with pytest.raises(TypeError) as cm:
+            with_loading_profile(Version.query, 'task_grid')
+
+        assert str(cm.value) == \
+            'the task_grid profile can only be used with Task queries, not ' \
+            'Version'
+
+    def test_loading_options_with_a_wrong_name(self):
+        """testing if a ValueError will be raised when there is no profile
+        with the given name
+        """
+        from stalker.db.loading import loading_options
+        with pytest.raises(ValueError) as cm:
+            loading_options('no_profile')
+
+        assert str(cm.value) == \
+            "name should be one of ['review_queue', 'task_grid', " \
+            "'version_browser'], not no_profile"
+
+    def test_register_loading_profile_is_working_properly(self):
+        """testing if a new profile can be registered and used
+        """
+        from sqlalchemy.orm import selectinload
+        from stalker import Task
+        from stalker.db import loading
+
+        def options():
+            return [selectinload(Task.resources)]
+
+        loading.register_loading_profile('resources', 'Task', options)
+        try:
+            query = loading.with_loading_profile(Task.query, 'resources')
+            assert query.all() == []
+        finally:
+            loading.loading_profiles.pop('resources')
+
+        with pytest.raises(TypeError) as cm:
+            loading.register_loading_profile('resources', 'Task', 'options')
+
+        assert str(cm.value) == \
+            'options_function should be a callable, not str'
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+# Stalker a Production Asset Management System
+# Copyright (C) 2009-2018 Erkan Ozgur Yilmaz
+#
+# This file is part of Stalker.
+#
+# Stalker is free software: you can redistribute it and/or modify
+# it under the terms of the Lesser GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+#
+# Stalker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# Lesser GNU General Public License for more details.
+#
+# You should have received a copy of the Lesser GNU General Public License
+# along with Stalker.  If not, see <http://www.gnu.org/licenses/>
+
+import datetime
+
+import pytest
+import pytz
+
+from stalker.testing import UnitTestDBBase
+
+
+def create_test_data():
+    """creates two users with time logs in two projects, 2018-01-01 is a
+    Monday
+    """
+    from stalker import (Department, Repository, Project, Task, TimeLog,
+                         User)
+    from stalker.db.session import DBSession
+
+    user1 = User(
+        name='Test User 1',
+        login='tuser1',
+        email='tuser1@users.com',
+        password='secret'
+    )
+    user2 = User(
+        name='Test User 2',
+        login='tuser2',
+        email='tuser2@users.com',
+        password='secret'
+    )
+    department = Department(name='Test Department', users=[user1, user2])
+    repository = Repository(name='Test Repository')
+    project1 = Project(
+        name='Test Project 1', code='TP1', repositories=[repository]
+    )
+    project2 = Project(
+        name='Test Project 2', code='TP2', repositories=[repository]
+    )
+    task1 = Task(
+        name='Task 1', project=project1, resources=[user1, user2],
+        schedule_timing=40, schedule_unit='h'
+    )
+    task2 = Task(
+        name='Task 2', project=project2, resources=[user1],
+        schedule_timing=10, schedule_unit='h'
+    )
+
+    dt = datetime.datetime
+    td = datetime.timedelta
+    monday = dt(2018, 1, 1, tzinfo=pytz.utc)
+
+    # 9:00 - 12:00 on Monday, 3h of working time
+    TimeLog(
+        task=task1, resource=user1,
+        start=monday + td(hours=9), end=monday + td(hours=12)
+    )
+    # 17:00 - 20:00 on Monday, 1h of working time, the default working
+    # hours are 9:00 - 18:00
+    TimeLog(
+        task=task2, resource=user1,
+        start=monday + td(hours=17), end=monday + td(hours=20)
+    )
+    # Tuesday 10:00 - 14:00
+    TimeLog(
+        task=task1, resource=user2,
+        start=monday + td(days=1, hours=10),
+        end=monday + td(days=1, hours=14)
+    )
+    # next Monday 9:00 - 11:00
+    TimeLog(
+        task=task1, resource=user2,
+        start=monday + td(days=7, hours=9),
+        end=monday + td(days=7, hours=11)
+    )
+    DBSession.add_all([department, task1, task2])
+    DBSession.commit()
+    return {
+        'user1': user1, 'user2': user2, 'department': department,
+        'project1': project1, 'project2': project2,
+        'task1': task1, 'task2': task2, 'monday': monday
+    }
+
+
+def test_bucket_of_is_working_properly():
+    """testing if the bucket_of() function returns the first day of the
+    bucket
+    """
+    from stalker.db.reports import bucket_of
+    date = datetime.date(2018, 1, 10)
+    assert bucket_of(date, 'day') == date
+    assert bucket_of(date, 'week') == datetime.date(2018, 1, 8)
+    assert bucket_of(date, 'month') == datetime.date(2018, 1, 1)
+
+    with pytest.raises(ValueError) as cm:
+        bucket_of(date, 'year')
+
+    assert str(cm.value) == \
+        "bucket should be one of ['day', 'week', 'month'], not year"
+
+
+def test_working_windows_is_working_properly():
+    """testing if the working_windows() function clips the working hours
+    with the given range
+    """
+    from stalker.db.reports import working_windows
+    dt = datetime.datetime
+    working_hours = {
+        'mon': [[540, 720], [780, 1080]],
+        'tue': [[540, 1080]],
+        'wed': [], 'thu': [], 'fri': [], 'sat': [], 'sun': []
+    }
+    buckets, windows = working_windows(
+        dt(2018, 1, 1, 10, tzinfo=pytz.utc),
+        dt(2018, 1, 3, tzinfo=pytz.utc),
+        working_hours=working_hours
+    )
+    assert buckets == [
+        datetime.date(2018, 1, 1),
+        datetime.date(2018, 1, 2),
+        datetime.date(2018, 1, 3)
+    ]
+    assert windows == [
+        (0, dt(2018, 1, 1, 10, tzinfo=pytz.utc),
+         dt(2018, 1, 1, 12, tzinfo=pytz.utc)),
+        (0, dt(2018, 1, 1, 13, tzinfo=pytz.utc),
+         dt(2018, 1, 1, 18, tzinfo=pytz.utc)),
+        (1, dt(2018, 1, 2, 9, tzinfo=pytz.utc),
+         dt(2018, 1, 2, 18, tzinfo=pytz.utc)),
+    ]
+
+    # whole days
+    buckets, windows = working_windows(
+        dt(2018, 1, 1, 10, tzinfo=pytz.utc),
+        dt(2018, 1, 3, tzinfo=pytz.utc),
+        bucket='week',
+        working_hours_only=False
+    )
+    assert buckets == [datetime.date(2018, 1, 1)]
+    assert windows == [
+        (0, dt(2018, 1, 1, 10, tzinfo=pytz.utc),
+         dt(2018, 1, 2, tzinfo=pytz.utc)),
+        (0, dt(2018, 1, 2, tzinfo=pytz.utc),
+         dt(2018, 1, 3, tzinfo=pytz.utc)),
+    ]
+
+
+def test_timesheet_with_sqlite3(setup_sqlite3):
+    """testing if the timesheet() is working with SQLite3
+    """
+    from stalker import db
+    db.setup()
+    db.init()
+
+    data = create_test_data()
+
+    from stalker.db.reports import timesheet
+    monday = data['monday']
+    grid = timesheet(
+        monday, monday + datetime.timedelta(days=2),
+        users=[data['user1'], data['user2']]
+    )
+    assert grid['keys'] == [data['user1'].id, data['user2'].id]
+    assert grid['seconds'] == [[4 * 3600, 0, 0], [0, 4 * 3600, 0]]
+
+
+
+def test_timesheet_with_more_than_500_windows_with_sqlite3(setup_sqlite3):
+    """testing if the timesheet() is working with SQLite3 when there are more
+    windows than the terms allowed in a compound SELECT
+    """
+    from stalker import db
+    db.setup()
+    db.init()
+
+    data = create_test_data()
+
+    from stalker.db.reports import timesheet
+    monday = data['monday']
+    grid = timesheet(
+        monday, monday + datetime.timedelta(days=730),
+        users=[data['user1'], data['user2']], working_hours_only=False
+    )
+    assert len(grid['buckets']) == 731
+    assert grid['seconds'][0] == [6 * 3600] + [0] * 730
+    assert grid['seconds'][1] == \
+        [0, 4 * 3600] + [0] * 5 + [2 * 3600] + [0] * 723
+
+class ReportsTestDBCase(UnitTestDBBase):
+    """tests the stalker.db.reports module
+    """
+
+    def test_timesheet_is_working_properly(self):
+        """testing if the timesheet() returns the working time of the users
+        per day
+        """
+        data = create_test_data()
+        from stalker.db.reports import timesheet
+        monday = data['monday']
+        td = datetime.timedelta
+        grid = timesheet(monday, monday + td(days=8))
+
+        assert grid['keys'] == sorted([data['user1'].id, data['user2'].id])
+        assert grid['buckets'] == [
+            datetime.date(2018, 1, 1) + td(days=i) for i in range(9)
+        ]
+        seconds = dict(zip(grid['keys'], grid['seconds']))
+        # only 1 hour of the 17:00 - 20:00 time log is in the working hours
+        assert seconds[data['user1'].id] == [4 * 3600] + [0] * 8
+        assert seconds[data['user2'].id] == \
+            [0, 4 * 3600, 0, 0, 0, 0, 0, 2 * 3600, 0]
+
+    def test_timesheet_without_working_hours(self):
+        """testing if the timesheet() counts the whole time logs when the
+        working_hours_only is False
+        """
+        data = create_test_data()
+        from stalker.db.reports import timesheet
+        monday = data['monday']
+        grid = timesheet(
+            monday, monday + datetime.timedelta(days=1),
+            users=[data['user1']], working_hours_only=False
+        )
+        assert grid['seconds'] == [[6 * 3600, 0]]
+
+    def test_time_log_totals_by_project_and_department(self):
+        """testing if the time_log_totals() is grouping the time logs by
+        projects and departments
+        """
+        data = create_test_data()
+        from stalker.db.reports import time_log_totals
+        monday = data['monday']
+        td = datetime.timedelta
+
+        totals = time_log_totals(
+            'project', monday, monday + td(days=14), bucket='week'
+        )
+        assert totals['buckets'] == [
+            datetime.date(2018, 1, 1),
+            datetime.date(2018, 1, 8),
+            datetime.date(2018, 1, 15)
+        ]
+        seconds = dict(zip(totals['keys'], totals['seconds']))
+        assert seconds == {
+            data['project1'].id: [7 * 3600, 2 * 3600, 0],
+            data['project2'].id: [3600, 0, 0],
+        }
+
+        totals = time_log_totals(
+            'department', monday, monday + td(days=14), bucket='month'
+        )
+        assert totals == {
+            'keys': [data['department'].id],
+            'buckets': [datetime.date(2018, 1, 1)],
+            'seconds': [[10 * 3600]]
+        }
+
+    def test_time_log_totals_with_a_wrong_group(self):
+        """testing if a ValueError will be raised when the by argument is not
+        one of the supported groups
+        """
+        from stalker.db.reports import time_log_totals
+        now = datetime.datetime.now(pytz.utc)
+        with pytest.raises(ValueError) as cm:
+            time_log_totals('studio', now, now)
+
+        assert str(cm.value) == \
+            "by should be one of ['user', 'task', 'project', 'department'], " \
+            "not studio"
+
+    def test_burn_down_is_working_properly(self):
+        """testing if the burn_down() returns the weekly logged and remaining
+        seconds of a project
+        """
+        data = create_test_data()
+        from stalker.db.reports import burn_down
+        monday = data['monday']
+        td = datetime.timedelta
+
+        burn = burn_down(
+            data['project1'], monday + td(days=1), monday + td(days=14)
+        )
+        assert burn['schedule_seconds'] == 40 * 3600
+        assert burn['buckets'] == [
+            datetime.date(2018, 1, 1),
+            datetime.date(2018, 1, 8),
+            datetime.date(2018, 1, 15)
+        ]
+        assert burn['logged_seconds'] == [4 * 3600, 2 * 3600, 0]
+        # the 3 hours logged on Monday is burned before the report starts
+        assert burn['remaining_seconds'] == \
+            [33 * 3600, 31 * 3600, 31 * 3600]
+
+    def test_time_log_totals_summed_in_chunks(self):
+        """testing if the time_log_totals() is summing the windows in chunks
+        correctly when the windows of a bucket are in different chunks
+        """
+        data = create_test_data()
+        from stalker.db import reports
+        monday = data['monday']
+        td = datetime.timedelta
+        expected = reports.time_log_totals(
+            'user', monday, monday + td(days=14), bucket='week'
+        )
+
+        windows_per_query = reports.WINDOWS_PER_QUERY
+        reports.WINDOWS_PER_QUERY = 3
+        try:
+            result = reports.time_log_totals(
+                'user', monday, monday + td(days=14), bucket='week'
+            )
+        finally:
+            reports.WINDOWS_PER_QUERY = windows_per_query
+
+        assert result == expected
+        seconds = dict(zip(result['keys'], result['seconds']))
+        assert seconds[data['user2'].id] == [4 * 3600, 2 * 3600, 0]
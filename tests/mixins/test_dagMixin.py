@@ -394,3 +394,170 @@ class DAGMixinDBTestDBCase(UnitTestDBBase):
 
         all_data = DAGMixinFooMixedInClass.query.all()
         assert len(all_data) == 0
+
+    def test_dag_path_is_set_on_flush(self):
+        """testing if the dag_path attribute is set to the ids of the parents
+        when the data is flushed
+        """
+        kwargs = copy.copy(self.kwargs)
+        d1 = DAGMixinFooMixedInClass(**kwargs)
+        d2 = DAGMixinFooMixedInClass(**kwargs)
+        d3 = DAGMixinFooMixedInClass(**kwargs)
+        d4 = DAGMixinFooMixedInClass(**kwargs)
+
+        d1.children = [d2, d3]
+        d2.children = [d4]
+
+        from stalker.db.session import DBSession
+        DBSession.add_all([d1, d2, d3, d4])
+        DBSession.commit()
+
+        assert d1.dag_path == '|'
+        assert d2.dag_path == '|%s|' % d1.id
+        assert d3.dag_path == '|%s|' % d1.id
+        assert d4.dag_path == '|%s|%s|' % (d1.id, d2.id)
+
+        # and it is stored in the database
+        table = DAGMixinFooMixedInClass.__table__
+        paths = dict(
+            DBSession.connection().execute(
+                table.select().with_only_columns([table.c.id,
+                                                  table.c.dag_path])
+            ).fetchall()
+        )
+        assert paths == {
+            d1.id: '|',
+            d2.id: '|%s|' % d1.id,
+            d3.id: '|%s|' % d1.id,
+            d4.id: '|%s|%s|' % (d1.id, d2.id),
+        }
+
+    def test_dag_path_of_descendants_is_updated_when_reparented(self):
+        """testing if the dag_path of the descendants are updated when one of
+        their parents is re-parented
+        """
+        kwargs = copy.copy(self.kwargs)
+        d1 = DAGMixinFooMixedInClass(**kwargs)
+        d2 = DAGMixinFooMixedInClass(**kwargs)
+        d3 = DAGMixinFooMixedInClass(**kwargs)
+        d4 = DAGMixinFooMixedInClass(**kwargs)
+        d5 = DAGMixinFooMixedInClass(**kwargs)
+
+        d1.children = [d2, d3]
+        d2.children = [d4]
+        d4.children = [d5]
+
+        from stalker.db.session import DBSession
+        DBSession.add_all([d1, d2, d3, d4, d5])
+        DBSession.commit()
+
+        d2.parent = d3
+        DBSession.commit()
+
+        assert d2.dag_path == '|%s|%s|' % (d1.id, d3.id)
+        assert d4.dag_path == '|%s|%s|%s|' % (d1.id, d3.id, d2.id)
+        assert d5.dag_path == \
+            '|%s|%s|%s|%s|' % (d1.id, d3.id, d2.id, d4.id)
+
+        # check the database values
+        d5_id = d5.id
+        DBSession.expire_all()
+        d5 = DBSession.query(DAGMixinFooMixedInClass).get(d5_id)
+        assert d5.dag_path == \
+            '|%s|%s|%s|%s|' % (d1.id, d3.id, d2.id, d4.id)
+        assert d5.parents == [d1, d3, d2, d4]
+
+        # make it a root
+        d2.parent = None
+        DBSession.commit()
+        DBSession.expire_all()
+        assert d2.dag_path == '|'
+        assert d5.dag_path == '|%s|%s|' % (d2.id, d4.id)
+        assert d5.parents == [d2, d4]
+
+    def test_parents_is_using_dag_path(self):
+        """testing if the parents attribute is retrieving all of the parents
+        with one query by using the dag_path
+        """
+        kwargs = copy.copy(self.kwargs)
+        d1 = DAGMixinFooMixedInClass(**kwargs)
+        d2 = DAGMixinFooMixedInClass(parent=d1, **kwargs)
+        d3 = DAGMixinFooMixedInClass(parent=d2, **kwargs)
+        d4 = DAGMixinFooMixedInClass(parent=d3, **kwargs)
+
+        from stalker.db.session import DBSession
+        DBSession.add_all([d1, d2, d3, d4])
+        DBSession.commit()
+        ids = [d1.id, d2.id, d3.id, d4.id]
+        DBSession.expunge_all()
+
+        d4 = DBSession.query(DAGMixinFooMixedInClass).get(ids[3])
+
+        from sqlalchemy import event
+        statements = []
+
+        def count(*args):
+            statements.append(args)
+
+        engine = DBSession.connection().engine
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            parents = d4.parents
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+
+        assert [p.id for p in parents] == ids[:3]
+        assert len(statements) == 1
+
+    def test_parents_is_working_properly_with_pending_reparenting(self):
+        """testing if the parents attribute is still correct when there are
+        parent changes that are not flushed yet
+        """
+        kwargs = copy.copy(self.kwargs)
+        d1 = DAGMixinFooMixedInClass(**kwargs)
+        d2 = DAGMixinFooMixedInClass(parent=d1, **kwargs)
+        d3 = DAGMixinFooMixedInClass(parent=d2, **kwargs)
+        d4 = DAGMixinFooMixedInClass(**kwargs)
+
+        from stalker.db.session import DBSession
+        DBSession.add_all([d1, d2, d3, d4])
+        DBSession.commit()
+
+        d2.parent = d4
+        with DBSession.no_autoflush:
+            assert d3.parents == [d4, d2]
+
+    def test_rebuild_dag_paths(self):
+        """testing if the rebuild_dag_paths() method is recalculating the
+        dag_path values
+        """
+        kwargs = copy.copy(self.kwargs)
+        d1 = DAGMixinFooMixedInClass(**kwargs)
+        d2 = DAGMixinFooMixedInClass(parent=d1, **kwargs)
+        d3 = DAGMixinFooMixedInClass(parent=d2, **kwargs)
+
+        from stalker.db.session import DBSession
+        DBSession.add_all([d1, d2, d3])
+        DBSession.commit()
+
+        table = DAGMixinFooMixedInClass.__table__
+        DBSession.connection().execute(table.update().values(dag_path=None))
+
+        assert DAGMixinFooMixedInClass.rebuild_dag_paths() == 3
+        DBSession.commit()
+        DBSession.expire_all()
+        assert d1.dag_path == '|'
+        assert d3.dag_path == '|%s|%s|' % (d1.id, d2.id)
+        assert DAGMixinFooMixedInClass.rebuild_dag_paths() == 0
+
+    def test_dag_path_index_supports_prefix_queries(self):
+        """testing if the dag_path index is created with the
+        varchar_pattern_ops operator class in PostgreSQL so the LIKE 'prefix%'
+        queries can use it
+        """
+        from stalker.db.session import DBSession
+        result = DBSession.connection().execute(
+            "select indexdef from pg_indexes "
+            "where indexname = 'ix_Tasks_dag_path'"
+        ).fetchone()
+        assert 'varchar_pattern_ops' in result[0]
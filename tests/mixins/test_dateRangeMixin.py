@@ -576,6 +576,29 @@ class DateRangeMixinTester(unittest.TestCase):
             datetime.datetime(2013, 5, 31, 18, 0, tzinfo=pytz.utc)
         assert new_foo_obj.computed_total_seconds == 8 * 60 * 60
 
+    def test_normalize_dates_is_working_properly(self):
+        """testing if the normalize_dates() function calculates the missing
+        values and rounds them without an instance
+        """
+        from stalker.models.mixins import normalize_dates
+        start = datetime.datetime(2013, 5, 31, 10, 2, tzinfo=pytz.utc)
+        end = datetime.datetime(2013, 5, 31, 18, 0, tzinfo=pytz.utc)
+        duration = datetime.timedelta(hours=2)
+
+        assert normalize_dates(start, None, duration) == (
+            datetime.datetime(2013, 5, 31, 10, 0, tzinfo=pytz.utc),
+            datetime.datetime(2013, 5, 31, 12, 0, tzinfo=pytz.utc),
+            duration
+        )
+        assert normalize_dates(None, end, duration) == (
+            datetime.datetime(2013, 5, 31, 16, 0, tzinfo=pytz.utc),
+            end,
+            duration
+        )
+        new_foo_obj = DateRangeMixFooMixedInClass(**self.kwargs)
+        assert new_foo_obj._validate_dates(start, end, None) == \
+            normalize_dates(start, end, None)
+
 
 class DateRangeMixinDBTester(UnitTestDBBase):
     """tests that needs a database
@@ -273,6 +273,42 @@ class FilenameTemplateTester(unittest.TestCase):
         assert ft3 != ft4
 
 
+    def test_render_path_and_render_filename_are_working_properly(self):
+        """testing if the render_path() and render_filename() methods are
+        rendering the path and filename template codes
+        """
+        self.kwargs['path'] = 'ASSETS/{{asset_code}}'
+        self.kwargs['filename'] = '{{asset_code}}_v{{"%03d"|format(number)}}'
+        ft = FilenameTemplate(**self.kwargs)
+        assert ft.render_path(asset_code='char1') == 'ASSETS/char1'
+        assert ft.render_filename(asset_code='char1', number=3) == \
+            'char1_v003'
+
+    def test_compile_template_is_caching_the_compiled_templates(self):
+        """testing if the compile_template() function returns the same
+        compiled template for the same template code and removes the least
+        recently used templates
+        """
+        from stalker.models import template
+        max_size = template.compiled_templates_max_size
+        template._compiled_templates.clear()
+        template.compiled_templates_max_size = 2
+        try:
+            compiled1 = template.compile_template('{{a}}')
+            assert template.compile_template('{{a}}') is compiled1
+            assert compiled1.render(a=1) == '1'
+
+            compiled2 = template.compile_template('{{b}}')
+            # use the first one so the second one is the least recently used
+            template.compile_template('{{a}}')
+            template.compile_template('{{c}}')
+            assert list(template._compiled_templates) == ['{{a}}', '{{c}}']
+            assert template.compile_template('{{a}}') is compiled1
+            assert template.compile_template('{{b}}') is not compiled2
+        finally:
+            template.compiled_templates_max_size = max_size
+            template._compiled_templates.clear()
+
 class FilenameTemplateDBTestDBCase(UnitTestDBBase):
     """Tests the stalker.models.task.Task class with a DB
     """
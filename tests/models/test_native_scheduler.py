@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+# Stalker a Production Asset Management System
+# Copyright (C) 2009-2018 Erkan Ozgur Yilmaz
+#
+# This file is part of Stalker.
+#
+# Stalker is free software: you can redistribute it and/or modify
+# it under the terms of the Lesser GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License.
+#
+# Stalker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# Lesser GNU General Public License for more details.
+#
+# You should have received a copy of the Lesser GNU General Public License
+# along with Stalker.  If not, see <http://www.gnu.org/licenses/>
+
+import pytest
+import pytz
+import datetime
+from stalker import NativeScheduler
+from stalker.testing import UnitTestDBBase
+
+
+class NativeSchedulerDBTester(UnitTestDBBase):
+    """tests the stalker.models.scheduler.NativeScheduler class
+    """
+
+    def setUp(self):
+        """set up the test
+        """
+        super(self.__class__, self).setUp()
+
+        # create resources
+        from stalker import User
+        from stalker.db.session import DBSession
+        self.test_user1 = User(
+            login='user1',
+            name='User1',
+            email='user1@users.com',
+            password='1234',
+        )
+        DBSession.add(self.test_user1)
+
+        self.test_user2 = User(
+            login='user2',
+            name='User2',
+            email='user2@users.com',
+            password='1234',
+        )
+        DBSession.add(self.test_user2)
+
+        self.test_user3 = User(
+            login='user3',
+            name='User3',
+            email='user3@users.com',
+            password='1234',
+        )
+        DBSession.add(self.test_user3)
+
+        self.test_user4 = User(
+            login='user4',
+            name='User4',
+            email='user4@users.com',
+            password='1234',
+        )
+        DBSession.add(self.test_user4)
+
+        self.test_user5 = User(
+            login='user5',
+            name='User5',
+            email='user5@users.com',
+            password='1234',
+        )
+        DBSession.add(self.test_user5)
+
+        # repository
+        from stalker import Repository
+        self.test_repo = Repository(
+            name='Test Repository',
+            linux_path='/mnt/T/',
+            windows_path='T:/',
+            osx_path='/Volumes/T/'
+        )
+        DBSession.add(self.test_repo)
+
+        # create one project
+        from stalker import Project
+        self.test_proj1 = Project(
+            name='Test Project 1',
+            code='TP1',
+            repository=self.test_repo,
+            start=datetime.datetime(2013, 4, 4, tzinfo=pytz.utc),
+            end=datetime.datetime(2013, 5, 4, tzinfo=pytz.utc)
+        )
+        DBSession.add(self.test_proj1)
+
+        # create two tasks with the same resources
+        from stalker import Task
+        self.test_task1 = Task(
+            name='Task1',
+            project=self.test_proj1,
+            resources=[self.test_user1, self.test_user2],
+            alternative_resources=[
+                self.test_user3, self.test_user4, self.test_user5
+            ],
+            schedule_model=0,
+            schedule_timing=50,
+            schedule_unit='h',
+        )
+        DBSession.add(self.test_task1)
+
+        self.test_task2 = Task(
+            name='Task2',
+            project=self.test_proj1,
+            resources=[self.test_user1, self.test_user2],
+            alternative_resources=[
+                self.test_user3, self.test_user4, self.test_user5
+            ],
+            depends=[self.test_task1],
+            schedule_model=0,
+            schedule_timing=60,
+            schedule_unit='h',
+            priority=800
+        )
+        DBSession.save(self.test_task2)
+
+        # and the studio
+        from stalker import Studio
+        self.test_studio = Studio(
+            name='Test Studio',
+            now=datetime.datetime(2013, 4, 16, 0, 0, tzinfo=pytz.utc)
+        )
+        self.test_studio.start = \
+            datetime.datetime(2013, 4, 16, 0, 0, tzinfo=pytz.utc)
+        self.test_studio.end = \
+            datetime.datetime(2013, 4, 30, 0, 0, tzinfo=pytz.utc)
+        self.test_studio.daily_working_hours = 9
+        DBSession.add(self.test_studio)
+        DBSession.commit()
+
+    def _schedule(self, **kwargs):
+        """schedules the studio with a NativeScheduler and commits the
+        results
+        """
+        scheduler = NativeScheduler(**kwargs)
+        scheduler.studio = self.test_studio
+        scheduler.schedule()
+        from stalker.db.session import DBSession
+        DBSession.commit()
+        return scheduler
+
+    def test_native_scheduler_is_a_scheduler(self):
+        """testing if the NativeScheduler is derived from SchedulerBase
+        """
+        from stalker import SchedulerBase
+        assert isinstance(NativeScheduler(), SchedulerBase)
+
+    def test_compute_resources_argument_is_skipped(self):
+        """testing if the compute_resources attribute will be False if the
+        compute_resources argument is skipped
+        """
+        assert NativeScheduler().compute_resources is False
+
+    def test_projects_argument_is_not_a_list(self):
+        """testing if a TypeError will be raised when the projects argument
+        value is not a list
+        """
+        with pytest.raises(TypeError) as cm:
+            NativeScheduler(projects='not a list of projects')
+
+        assert str(cm.value) == \
+            'NativeScheduler.projects should be a list of ' \
+            'stalker.models.project.Project instances, not str'
+
+    def test_schedule_will_not_work_when_the_studio_attribute_is_None(self):
+        """testing if a TypeError will be raised when the studio attribute is
+        None
+        """
+        native_sched = NativeScheduler()
+        native_sched.studio = None
+        with pytest.raises(TypeError) as cm:
+            native_sched.schedule()
+
+        assert str(cm.value) == \
+            'NativeScheduler.studio should be an instance of ' \
+            'stalker.models.studio.Studio, not NoneType'
+
+    def test_tasks_are_correctly_scheduled(self):
+        """testing if the tasks are correctly scheduled
+        """
+        self._schedule(compute_resources=True)
+
+        # check if the task and project timings are all adjusted
+        assert \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc) == \
+            self.test_proj1.computed_start
+        assert \
+            datetime.datetime(2013, 4, 24, 10, 0, tzinfo=pytz.utc) == \
+            self.test_proj1.computed_end
+
+        assert \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc) == \
+            self.test_task1.computed_start
+        assert \
+            datetime.datetime(2013, 4, 18, 16, 0, tzinfo=pytz.utc) == \
+            self.test_task1.computed_end
+        assert sorted(self.test_task1.computed_resources,
+                      key=lambda x: x.id) == \
+            [self.test_user1, self.test_user2]
+
+        assert \
+            datetime.datetime(2013, 4, 18, 16, 0, tzinfo=pytz.utc) == \
+            self.test_task2.computed_start
+        assert \
+            datetime.datetime(2013, 4, 24, 10, 0, tzinfo=pytz.utc) == \
+            self.test_task2.computed_end
+        assert sorted(self.test_task2.computed_resources,
+                      key=lambda x: x.id) == \
+            [self.test_user1, self.test_user2]
+
+    def test_studio_schedule_is_working_with_native_scheduler(self):
+        """testing if the Studio.schedule() method is working properly with
+        the NativeScheduler
+        """
+        self.test_studio.scheduler = NativeScheduler()
+        self.test_studio.schedule()
+        from stalker.db.session import DBSession
+        DBSession.commit()
+
+        assert \
+            datetime.datetime(2013, 4, 24, 10, 0, tzinfo=pytz.utc) == \
+            self.test_task2.computed_end
+
+    def test_alternative_resources_are_used_when_resources_are_busy(self):
+        """testing if the alternative resources are used when the resources
+        are busy with other tasks
+        """
+        from stalker import Task
+        from stalker.db.session import DBSession
+        self.test_task2.depends = []
+        task3 = Task(
+            name='Task3',
+            project=self.test_proj1,
+            resources=[self.test_user1],
+            schedule_timing=9,
+            schedule_unit='h',
+            priority=900
+        )
+        DBSession.add(task3)
+        DBSession.commit()
+
+        self._schedule(compute_resources=True)
+
+        # task3 has the highest priority so it takes user1 first
+        assert task3.computed_start == \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc)
+        assert task3.computed_end == \
+            datetime.datetime(2013, 4, 16, 18, 0, tzinfo=pytz.utc)
+
+        # task2 starts at the same time with an alternative resource
+        assert self.test_task2.computed_start == \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc)
+        assert self.test_user1 not in self.test_task2.computed_resources
+        assert self.test_user2 in self.test_task2.computed_resources
+        assert len(self.test_task2.computed_resources) == 2
+
+        # and task1 uses the rest
+        assert self.test_task1.computed_start == \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc)
+        assert len(self.test_task1.computed_resources) == 2
+        assert not (
+            set(self.test_task1.computed_resources) &
+            set(self.test_task2.computed_resources)
+        )
+
+    def test_length_and_duration_schedule_models(self):
+        """testing if the length and duration schedule models are correctly
+        scheduled
+        """
+        self.test_task1.schedule_model = 'length'
+        self.test_task1.schedule_timing = 2
+        self.test_task1.schedule_unit = 'd'
+
+        self.test_task2.schedule_model = 'duration'
+        self.test_task2.schedule_timing = 3
+        self.test_task2.schedule_unit = 'd'
+        from stalker.db.session import DBSession
+        DBSession.commit()
+
+        self._schedule()
+
+        assert self.test_task1.computed_start == \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc)
+        assert self.test_task1.computed_end == \
+            datetime.datetime(2013, 4, 17, 18, 0, tzinfo=pytz.utc)
+
+        assert self.test_task2.computed_start == \
+            datetime.datetime(2013, 4, 17, 18, 0, tzinfo=pytz.utc)
+        assert self.test_task2.computed_end == \
+            datetime.datetime(2013, 4, 20, 18, 0, tzinfo=pytz.utc)
+
+    def test_dependency_target_and_gap(self):
+        """testing if the dependency targets and gaps are considered
+        """
+        dependency = self.test_task2.task_depends_to[0]
+        dependency.dependency_target = 'onstart'
+        dependency.gap_timing = 2
+        dependency.gap_unit = 'h'
+        dependency.gap_model = 'length'
+        from stalker.db.session import DBSession
+        DBSession.commit()
+
+        self._schedule()
+
+        assert self.test_task2.computed_start == \
+            datetime.datetime(2013, 4, 16, 11, 0, tzinfo=pytz.utc)
+
+    def test_dependencies_of_parent_tasks_are_inherited(self):
+        """testing if the dependencies of the parent tasks are inherited by
+        the child tasks
+        """
+        from stalker import Task
+        from stalker.db.session import DBSession
+        child_task = Task(
+            name='Child Task',
+            parent=self.test_task2,
+            resources=[self.test_user3],
+            schedule_timing=4,
+            schedule_unit='h'
+        )
+        DBSession.add(child_task)
+        DBSession.commit()
+
+        self._schedule()
+
+        assert child_task.computed_start == \
+            datetime.datetime(2013, 4, 18, 16, 0, tzinfo=pytz.utc)
+        assert child_task.computed_end == \
+            datetime.datetime(2013, 4, 19, 11, 0, tzinfo=pytz.utc)
+
+        # the container spans its children
+        assert self.test_task2.computed_start == child_task.computed_start
+        assert self.test_task2.computed_end == child_task.computed_end
+
+    def test_vacations_are_considered(self):
+        """testing if the Studio and User vacations are considered
+        """
+        from stalker import Vacation
+        from stalker.db.session import DBSession
+        studio_vacation = Vacation(
+            start=datetime.datetime(2013, 4, 16, 0, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2013, 4, 17, 0, 0, tzinfo=pytz.utc)
+        )
+        user_vacation = Vacation(
+            user=self.test_user1,
+            start=datetime.datetime(2013, 4, 17, 0, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2013, 4, 18, 0, 0, tzinfo=pytz.utc)
+        )
+        self.test_task1.alternative_resources = []
+        DBSession.add_all([studio_vacation, user_vacation])
+        DBSession.commit()
+
+        self._schedule()
+
+        # 9 hours of user2 on 17th, 18 hours of both on 18th and 19th and
+        # the remaining 5 hours on 22nd
+        assert self.test_task1.computed_start == \
+            datetime.datetime(2013, 4, 17, 9, 0, tzinfo=pytz.utc)
+        assert self.test_task1.computed_end == \
+            datetime.datetime(2013, 4, 22, 12, 0, tzinfo=pytz.utc)
+
+    def test_time_logs_are_booked(self):
+        """testing if the time logs are counted towards the effort and
+        the resources are not double booked
+        """
+        from stalker import TimeLog
+        from stalker.db.session import DBSession
+        time_log = TimeLog(
+            resource=self.test_user1,
+            task=self.test_task1,
+            start=datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2013, 4, 16, 18, 0, tzinfo=pytz.utc)
+        )
+        DBSession.add(time_log)
+        DBSession.commit()
+
+        self.test_studio.now = \
+            datetime.datetime(2013, 4, 17, 0, 0, tzinfo=pytz.utc)
+        self._schedule(compute_resources=True)
+
+        # 9 hours are booked, 41 hours remaining are shared by user1 and user2
+        # starting from 17th
+        assert self.test_task1.computed_start == \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc)
+        assert self.test_task1.computed_end == \
+            datetime.datetime(2013, 4, 19, 12, 0, tzinfo=pytz.utc)
+        assert self.test_user1 in self.test_task1.computed_resources
+
+    def test_end_constraint_schedules_as_late_as_possible(self):
+        """testing if the tasks with a constrained end are scheduled as late
+        as possible
+        """
+        from stalker.models.task import CONSTRAIN_END
+        self.test_task1.schedule_constraint = CONSTRAIN_END
+        self.test_task1.start = \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc)
+        self.test_task1.end = \
+            datetime.datetime(2013, 4, 26, 18, 0, tzinfo=pytz.utc)
+        self.test_task2.depends = []
+        self.test_task1.schedule_timing = 18
+        from stalker.db.session import DBSession
+        DBSession.commit()
+
+        self._schedule()
+
+        assert self.test_task1.computed_start == \
+            datetime.datetime(2013, 4, 26, 9, 0, tzinfo=pytz.utc)
+        assert self.test_task1.computed_end == \
+            datetime.datetime(2013, 4, 26, 18, 0, tzinfo=pytz.utc)
+
+    def test_tasks_of_given_projects_are_correctly_scheduled(self):
+        """testing if only the tasks of the given projects are scheduled and
+        the computed resources of the other tasks are kept intact
+        """
+        self._schedule(compute_resources=True)
+
+        from stalker import Project, Task
+        dummy_project = Project(
+            name='Dummy Project',
+            code='DP',
+            repository=self.test_repo
+        )
+        dt1 = Task(
+            name='Dummy Task 1',
+            project=dummy_project,
+            schedule_timing=4,
+            schedule_unit='h',
+            resources=[self.test_user1]
+        )
+        from stalker.db.session import DBSession
+        DBSession.add_all([dummy_project, dt1])
+        DBSession.commit()
+
+        self._schedule(compute_resources=True, projects=[dummy_project])
+
+        assert dt1.computed_start == \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc)
+        assert dt1.computed_end == \
+            datetime.datetime(2013, 4, 16, 13, 0, tzinfo=pytz.utc)
+        assert dt1.computed_resources == [self.test_user1]
+
+        # the first project is untouched
+        assert self.test_task2.computed_end == \
+            datetime.datetime(2013, 4, 24, 10, 0, tzinfo=pytz.utc)
+        assert len(self.test_task2.computed_resources) == 2
+
+    def test_tasks_not_fitting_in_the_studio_time_frame(self):
+        """testing if a RuntimeError will be raised when the tasks can not be
+        fitted in to the studio time frame
+        """
+        self.test_task2.schedule_timing = 600
+        from stalker.db.session import DBSession
+        DBSession.commit()
+
+        native_sched = NativeScheduler()
+        native_sched.studio = self.test_studio
+        with pytest.raises(RuntimeError) as cm:
+            native_sched.schedule()
+
+        assert str(cm.value).startswith(
+            'Task_%s does not fit in to the Studio time frame' %
+            self.test_task2.id
+        )
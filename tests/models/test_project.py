@@ -1896,6 +1896,69 @@ task Task_{{task3.id}} "Task_{{task3.id}}" {
 
         assert self.test_project.percent_complete == (1.0 / 44.0 * 100)
 
+    def test_progress_summary_is_working_properly(self):
+        """testing if the progress_summary attribute returns the logged and
+        scheduled seconds, the percent complete and the status counts
+        """
+        from stalker import TimeLog
+        import datetime
+        import pytz
+        TimeLog(
+            task=self.test_task1,
+            resource=self.test_task1.resources[0],
+            start=datetime.datetime(2013, 8, 1, 1, 0, tzinfo=pytz.utc),
+            duration=datetime.timedelta(hours=1)
+        )
+        TimeLog(
+            task=self.test_task10,
+            resource=self.test_task10.resources[0],
+            start=datetime.datetime(2013, 8, 1, 3, 0, tzinfo=pytz.utc),
+            duration=datetime.timedelta(hours=3)
+        )
+        from stalker.db.session import DBSession
+        DBSession.commit()
+
+        summary = self.test_project.progress_summary
+        assert summary['total_logged_seconds'] == 4 * 3600
+        assert summary['schedule_seconds'] == 44 * 3600
+        assert summary['percent_complete'] == 4.0 / 44.0 * 100
+
+        from stalker import Task
+        all_tasks = Task.query.filter(Task.project == self.test_project).all()
+        expected_counts = {}
+        for task in all_tasks:
+            expected_counts[task.status.code] = \
+                expected_counts.get(task.status.code, 0) + 1
+        assert summary['status_counts'] == expected_counts
+        assert sum(summary['status_counts'].values()) == len(all_tasks)
+
+    def test_get_progress_summaries_for_multiple_projects(self):
+        """testing if the get_progress_summaries() method returns the
+        summaries of all the given projects
+        """
+        from stalker import Project
+        from stalker.db.session import DBSession
+        self.kwargs['name'] = 'New Project Name'
+        self.kwargs['code'] = 'NPN'
+        new_project = Project(**self.kwargs)
+        DBSession.add(new_project)
+        DBSession.commit()
+
+        summaries = Project.get_progress_summaries(
+            [self.test_project, new_project]
+        )
+        assert sorted(summaries.keys()) == \
+            sorted([self.test_project.id, new_project.id])
+        assert summaries[self.test_project.id]['schedule_seconds'] == \
+            44 * 3600
+        assert summaries[new_project.id] == {
+            'total_logged_seconds': 0,
+            'schedule_seconds': 0,
+            'percent_complete': 0,
+            'status_counts': {}
+        }
+        assert Project.get_progress_summaries([]) == {}
+
     def test_clients_argument_is_skipped(self):
         """testing if the clients attribute will be set to None when the
         clients argument is skipped
@@ -957,6 +957,253 @@ class RepositoryTester(UnitTestDBBase):
         test_path = '$REPO%s/some/path/to/a/file.ma' % new_repo1.id
         assert Repository.find_repo(test_path) == new_repo1
 
+    def test_find_repo_returns_the_repository_with_the_longest_root(self):
+        """testing if the find_repo class method returns the repository with
+        the longest matching root path for nested repositories and only
+        matches the whole path components
+        """
+        from stalker import Repository
+        from stalker.db.session import DBSession
+        nested_repo = Repository(
+            name='Nested Repository',
+            linux_path='/mnt/M/Projects/Nested',
+            osx_path='/Volumes/M/Projects/Nested',
+            windows_path='M:/Projects/Nested'
+        )
+        DBSession.add(nested_repo)
+        DBSession.commit()
+
+        assert Repository.find_repo('M:/Projects/Nested/file.ma') == \
+            nested_repo
+        assert Repository.find_repo('M:\\Projects\\Nested\\file.ma') == \
+            nested_repo
+        assert Repository.find_repo('/mnt/M/Projects/Nest/file.ma') == \
+            self.test_repo
+        assert Repository.find_repo('/mnt/M/ProjectsX/file.ma') is None
+        assert Repository.find_repo('/mnt/M/Projects') is None
+        assert Repository.find_repo('') is None
+
+    def test_find_repo_sees_updated_and_deleted_repositories(self):
+        """testing if the find_repo class method is not using the old root
+        paths of the updated and deleted repositories
+        """
+        from stalker import Repository
+        from stalker.db.session import DBSession
+        test_path = '/mnt/M/Projects/some/file.ma'
+        assert Repository.find_repo(test_path) == self.test_repo
+
+        self.test_repo.linux_path = '/mnt/N/Projects'
+        DBSession.commit()
+        assert Repository.find_repo(test_path) is None
+        assert Repository.find_repo('/mnt/N/Projects/some/file.ma') == \
+            self.test_repo
+
+        DBSession.delete(self.test_repo)
+        DBSession.commit()
+        assert Repository.find_repo('/mnt/N/Projects/some/file.ma') is None
+
+    def test_find_repo_sees_repositories_added_by_another_session(self):
+        """testing if the find_repo class method finds the repositories which
+        are inserted or re-rooted by another session
+        """
+        from stalker import Repository
+        from stalker.db.session import DBSession
+        from sqlalchemy.orm import sessionmaker
+        # build the trie
+        assert Repository.find_repo('/mnt/R2/a/b.ma') is None
+        DBSession.commit()
+
+        session = sessionmaker(bind=DBSession.connection().engine)()
+        try:
+            new_repo = Repository(
+                name='Another Repository',
+                linux_path='/mnt/R2',
+                osx_path='/Volumes/R2',
+                windows_path='R2:/'
+            )
+            session.add(new_repo)
+            session.flush()
+            # rebuild the trie dropped by the listeners in this process before
+            # the other session commits, as if it is done in another process
+            assert Repository.find_repo('/mnt/R2/a/b.ma') is None
+            session.commit()
+            new_repo_id = new_repo.id
+
+            repo = Repository.find_repo('/mnt/R2/a/b.ma')
+            assert repo is not None
+            assert repo.id == new_repo_id
+
+            # re-root it with plain SQL
+            import datetime
+            import pytz
+            from stalker import SimpleEntity
+            session.execute(
+                Repository.__table__.update()
+                .where(Repository.__table__.c.id == new_repo_id)
+                .values(linux_path='/mnt/R3/')
+            )
+            session.execute(
+                SimpleEntity.__table__.update()
+                .where(SimpleEntity.__table__.c.id == new_repo_id)
+                .values(date_updated=datetime.datetime.now(pytz.utc))
+            )
+            session.commit()
+        finally:
+            session.close()
+
+        DBSession.commit()
+        assert Repository.find_repo('/mnt/R2/a/b.ma') is None
+        assert Repository.find_repo('/mnt/R3/a/b.ma').id == new_repo_id
+
+    def test_find_repos_is_working_properly(self):
+        """testing if the find_repos class method returns the repositories of
+        the given paths in order with one query
+        """
+        from stalker import Repository
+        from stalker.db.session import DBSession
+        new_repo1 = Repository(
+            name='New Repository',
+            linux_path='/mnt/T/Projects',
+            osx_path='/Volumes/T/Projects',
+            windows_path='T:/Projects'
+        )
+        DBSession.add(new_repo1)
+        DBSession.commit()
+
+        # build the trie
+        Repository.find_repo('/mnt/T/Projects/file.ma')
+
+        from sqlalchemy import event
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = DBSession.connection().engine
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            result = Repository.find_repos([
+                'T:/Projects/a.ma',
+                '/some/other/path/b.ma',
+                '/Volumes/M/Projects/c.ma',
+                '$REPO%s/d.ma' % new_repo1.id
+            ])
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+
+        assert result == [new_repo1, None, self.test_repo, new_repo1]
+        # the signature and the repositories
+        assert len(statements) == 2
+        assert Repository.find_repos([]) == []
+
+    def test_to_os_independent_paths_is_working_properly(self):
+        """testing if the to_os_independent_paths class method is converting
+        all the given paths
+        """
+        from stalker import Repository
+        result = Repository.to_os_independent_paths([
+            'M:/Projects/a/b.ma',
+            '/not/in/a/repo.ma',
+            '/Volumes/M/Projects/c.ma'
+        ])
+        assert result == [
+            '$REPO%s/a/b.ma' % self.test_repo.id,
+            '/not/in/a/repo.ma',
+            '$REPO%s/c.ma' % self.test_repo.id
+        ]
+
+    def test_to_linux_path_only_replaces_the_root_at_the_start_of_the_path(self):
+        """testing if the to_linux_path is not replacing the root path when it
+        appears again in the middle of the given path
+        """
+        self.test_repo.windows_path = 'T:/Projects'
+        self.test_repo.linux_path = '/mnt/T/Projects'
+        self.test_repo.osx_path = '/Volumes/T/Projects'
+        test_path = '/Volumes/T/Projects/backup/Volumes/T/Projects/file.ma'
+        assert self.test_repo.to_linux_path(test_path) == \
+            '/mnt/T/Projects/backup/Volumes/T/Projects/file.ma'
+
+    def test_translate_paths_is_working_properly(self):
+        """testing if the translate_paths class method converts the paths of
+        all the repositories to the given os
+        """
+        from stalker import Repository
+        from stalker.db.session import DBSession
+        new_repo1 = Repository(
+            name='New Repository',
+            linux_path='/mnt/T/Projects',
+            osx_path='/Volumes/T/Projects',
+            windows_path='T:/Projects'
+        )
+        DBSession.add(new_repo1)
+        DBSession.commit()
+
+        test_paths = [
+            'M:/Projects/Sero/file.ma',
+            'T:\\Projects\\Sero\\file.ma',
+            '/Volumes/T/Projects/backup/Volumes/T/Projects/file.ma',
+            '$REPO%s/Sero/file.ma' % new_repo1.id,
+            '/some/other/path/file.ma',
+        ]
+        assert list(Repository.translate_paths(test_paths, 'linux')) == [
+            '/mnt/M/Projects/Sero/file.ma',
+            '/mnt/T/Projects/Sero/file.ma',
+            '/mnt/T/Projects/backup/Volumes/T/Projects/file.ma',
+            '/mnt/T/Projects/Sero/file.ma',
+            '/some/other/path/file.ma',
+        ]
+        assert list(Repository.translate_paths(test_paths, 'windows')) == [
+            'M:/Projects/Sero/file.ma',
+            'T:/Projects/Sero/file.ma',
+            'T:/Projects/backup/Volumes/T/Projects/file.ma',
+            'T:/Projects/Sero/file.ma',
+            '/some/other/path/file.ma',
+        ]
+
+        assert list(Repository.translate_paths(test_paths[1:2], 'osx')) == \
+            [new_repo1.to_osx_path(test_paths[1])]
+
+        self.patcher.patch('Windows')
+        assert list(Repository.translate_paths(test_paths[:1])) == \
+            ['M:/Projects/Sero/file.ma']
+
+    def test_translate_paths_is_a_generator(self):
+        """testing if the translate_paths class method yields the converted
+        paths one by one
+        """
+        import itertools
+        from stalker import Repository
+
+        def paths():
+            for i in itertools.count():
+                yield '/mnt/M/Projects/file_%s.ma' % i
+
+        result = Repository.translate_paths(paths(), 'windows')
+        assert next(result) == 'M:/Projects/file_0.ma'
+        assert next(result) == 'M:/Projects/file_1.ma'
+
+    def test_translate_paths_with_a_wrong_target(self):
+        """testing if a ValueError will be raised when the target argument is
+        not one of the supported platforms
+        """
+        from stalker import Repository
+        with pytest.raises(ValueError) as cm:
+            Repository.translate_paths([], 'amiga')
+
+        assert str(cm.value) == \
+            "target should be one of ['linux', 'windows', 'osx', " \
+            "'native'], not amiga"
+
+    def test_translate_paths_with_a_path_that_is_not_a_string(self):
+        """testing if a TypeError will be raised when one of the paths is not
+        a string
+        """
+        from stalker import Repository
+        with pytest.raises(TypeError) as cm:
+            list(Repository.translate_paths(['/mnt/M/Projects/a.ma', 123]))
+
+        assert str(cm.value) == 'Repository.path should be a string, not int'
+
     def test_env_var_property_is_working_properly(self):
         """testing if the env_var property is working properly
         """
@@ -221,3 +221,70 @@ class StatusListTest(unittest.TestCase):
         # get the len and compare it wiht len(statuses)
         assert len(self.test_status_list.statuses) == \
             len(self.test_status_list)
+
+    def test_indexing_get_string_indexes_after_statuses_changed(self):
+        """testing if string indexes are still working properly after the
+        statuses are changed
+        """
+        status1 = Status(name="Complete", code="CMPLT")
+        status2 = Status(name="Work in Progress", code="WIP")
+        status3 = Status(name="Pending Review", code="PRev")
+
+        a_status_list = StatusList(name="Asset Status List",
+                                   statuses=[status1, status2],
+                                   target_entity_type="Asset")
+        assert a_status_list["prev"] is None
+        assert a_status_list["wip"] is status2
+
+        a_status_list.statuses.append(status3)
+        assert a_status_list["prev"] is status3
+
+        a_status_list.statuses.remove(status2)
+        assert a_status_list["wip"] is None
+
+        a_status_list.statuses = [status2]
+        assert a_status_list["wip"] is status2
+        assert a_status_list["complete"] is None
+
+        # renamed statuses
+        status2.code = "WP"
+        assert a_status_list["wip"] is None
+        assert a_status_list["wp"] is status2
+
+    def test_indexing_a_missing_key_does_not_rebuild_the_lookup(self):
+        """testing if the cached status lookup is not built again when a
+        missing name or code is indexed
+        """
+        status1 = Status(name="Complete", code="CMPLT")
+        status2 = Status(name="Work in Progress", code="WIP")
+
+        a_status_list = StatusList(name="Asset Status List",
+                                   statuses=[status1, status2],
+                                   target_entity_type="Asset")
+        assert a_status_list["wip"] is status2
+        cache = a_status_list.__dict__['_status_lookup']
+
+        assert a_status_list["OH"] is None
+        assert a_status_list.get_statuses('STOP', 'cmplt') == [None, status1]
+        assert a_status_list.__dict__['_status_lookup'] is cache
+
+        # but it is built again when a Status is renamed
+        status1.name = "Completed"
+        assert a_status_list["completed"] is status1
+        assert a_status_list.__dict__['_status_lookup'] is not cache
+
+    def test_get_statuses_is_working_properly(self):
+        """testing if the get_statuses() method returns the statuses with the
+        given names or codes in the given order
+        """
+        status1 = Status(name="Complete", code="CMPLT")
+        status2 = Status(name="Work in Progress", code="WIP")
+        status3 = Status(name="Pending Review", code="PRev")
+
+        a_status_list = StatusList(name="Asset Status List",
+                                   statuses=[status1, status2, status3],
+                                   target_entity_type="Asset")
+
+        assert a_status_list.get_statuses('PREV', 'cmplt', 'OH', 'WIP') == \
+            [status3, status1, None, status2]
+        assert a_status_list.get_statuses() == []
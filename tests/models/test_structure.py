@@ -266,6 +266,50 @@ class StructureTester(unittest.TestCase):
         assert self.test_structure != new_structure3
         assert self.test_structure != new_structure4
 
+    def test_get_template_is_working_properly(self):
+        """testing if the get_template() method returns the template for the
+        given entity type
+        """
+        assert self.test_structure.get_template('Asset') is \
+            self.asset_template
+        assert self.test_structure.get_template('Shot') is \
+            self.shot_template
+        assert self.test_structure.get_template('Task') is None
+
+    def test_get_template_returns_the_first_template(self):
+        """testing if the get_template() method returns the first template
+        when there are more than one templates for the same entity type
+        """
+        from stalker import FilenameTemplate
+        new_template = FilenameTemplate(
+            name="Test Asset Template 2",
+            target_entity_type="Asset",
+        )
+        self.test_structure.templates.append(new_template)
+        assert self.test_structure.get_template('Asset') is \
+            self.asset_template
+
+    def test_get_template_is_updated_when_the_templates_change(self):
+        """testing if the get_template() method returns the current templates
+        when the templates are changed
+        """
+        from stalker import FilenameTemplate
+        assert self.test_structure.get_template('Task') is None
+        task_template = FilenameTemplate(
+            name="Test Task Template",
+            target_entity_type="Task",
+        )
+        self.test_structure.templates.append(task_template)
+        assert self.test_structure.get_template('Task') is task_template
+
+        self.test_structure.templates.remove(self.asset_template)
+        assert self.test_structure.get_template('Asset') is None
+
+        self.test_structure.templates = [self.asset_template]
+        assert self.test_structure.get_template('Task') is None
+        assert self.test_structure.get_template('Asset') is \
+            self.asset_template
+
     def test_plural_class_name(self):
         """testing the plural name of Structure class
         """
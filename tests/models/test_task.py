@@ -4606,6 +4606,335 @@ class TaskDBTestDBCase(UnitTestDBBase):
         assert new_task.total_logged_seconds == 20 * 3600
         assert new_task.percent_complete == 20.0 / 9.0 * 100.0
 
+    def test_bulk_update_schedule_info_is_working_properly(self):
+        """testing if the bulk_update_schedule_info() method is calculating
+        and storing the schedule_seconds and total_logged_seconds of the whole
+        hierarchy
+        """
+        kwargs = copy.copy(self.kwargs)
+        kwargs['depends'] = []
+        kwargs['resources'] = [self.test_user1]
+        kwargs['alternative_resources'] = []
+
+        from stalker import defaults
+        defaults.daily_working_hours = 9
+
+        parent1 = Task(**kwargs)
+        child1 = Task(parent=parent1, **kwargs)
+        child2 = Task(parent=parent1, **kwargs)
+        child3 = Task(parent=child2, **kwargs)
+        child4 = Task(parent=child2, **kwargs)
+        child4.schedule_timing = 2
+
+        dt = datetime.datetime
+        td = datetime.timedelta
+        now = dt(2013, 4, 8, 10, 0, tzinfo=pytz.utc)
+
+        from stalker import TimeLog
+        TimeLog(
+            task=child1,
+            resource=self.test_user1,
+            start=now,
+            end=now + td(hours=2)
+        )
+        TimeLog(
+            task=child1,
+            resource=self.test_user1,
+            start=now + td(hours=3),
+            end=now + td(hours=4)
+        )
+        TimeLog(
+            task=child3,
+            resource=self.test_user1,
+            start=now + td(hours=5),
+            end=now + td(hours=10)
+        )
+
+        from stalker.db.session import DBSession
+        DBSession.add(parent1)
+        DBSession.commit()
+
+        # clear the cached values
+        DBSession.connection().execute(
+            Task.__table__.update().values(
+                schedule_seconds=None,
+                total_logged_seconds=None
+            )
+        )
+
+        info = Task.bulk_update_schedule_info(project=self.test_project1)
+        assert info[child1.id] == (9 * 3600, 3 * 3600)
+        assert info[child3.id] == (9 * 3600, 5 * 3600)
+        assert info[child4.id] == (18 * 3600, 0)
+        assert info[child2.id] == (27 * 3600, 5 * 3600)
+        assert info[parent1.id] == (36 * 3600, 8 * 3600)
+
+        # loaded tasks are updated
+        assert parent1._schedule_seconds == 36 * 3600
+        assert parent1._total_logged_seconds == 8 * 3600
+        assert parent1.percent_complete == pytest.approx(8.0 / 36.0 * 100)
+
+        # and the values are stored in the database
+        DBSession.commit()
+        DBSession.expire_all()
+        assert parent1._schedule_seconds == 36 * 3600
+        assert child2._total_logged_seconds == 5 * 3600
+
+        # for a sub tree
+        info = Task.bulk_update_schedule_info(task=child2)
+        assert sorted(info.keys()) == \
+            sorted([child2.id, child3.id, child4.id])
+        assert info[child2.id] == (27 * 3600, 5 * 3600)
+
+    def test_bulk_update_schedule_info_without_a_project_or_task(self):
+        """testing if a TypeError will be raised when the
+        bulk_update_schedule_info() is called without a project or task
+        """
+        with pytest.raises(TypeError) as cm:
+            Task.bulk_update_schedule_info()
+
+        assert str(cm.value) == \
+            'Task.bulk_update_schedule_info() needs a project or a task'
+
+    def test_rollup_columns_are_updated_on_flush(self):
+        """testing if the schedule_seconds and total_logged_seconds columns of
+        all the ancestors are updated when the hierarchy, the schedule info or
+        the time logs are changed
+        """
+        kwargs = copy.copy(self.kwargs)
+        kwargs['depends'] = []
+        kwargs['resources'] = [self.test_user1]
+        kwargs['alternative_resources'] = []
+        kwargs['schedule_timing'] = 1
+        kwargs['schedule_unit'] = 'h'
+
+        parent1 = Task(**kwargs)
+        parent2 = Task(**kwargs)
+        child1 = Task(parent=parent1, **kwargs)
+        child2 = Task(parent=child1, **kwargs)
+        child3 = Task(parent=child1, **kwargs)
+
+        from stalker.db.session import DBSession
+        DBSession.add_all([parent1, parent2])
+        DBSession.commit()
+
+        def stored(task):
+            return tuple(DBSession.connection().execute(
+                select([
+                    Task.__table__.c.schedule_seconds,
+                    Task.__table__.c.total_logged_seconds
+                ]).where(Task.__table__.c.id == task.id)
+            ).fetchone())
+
+        from sqlalchemy import select
+        assert stored(child1) == (2 * 3600, 0)
+        assert stored(parent1) == (2 * 3600, 0)
+
+        # time logs
+        dt = datetime.datetime
+        td = datetime.timedelta
+        now = dt(2013, 4, 8, 10, 0, tzinfo=pytz.utc)
+
+        from stalker import TimeLog
+        tlog = TimeLog(
+            task=child2,
+            resource=self.test_user1,
+            start=now,
+            end=now + td(hours=3)
+        )
+        DBSession.add(tlog)
+        DBSession.commit()
+        assert stored(child1) == (2 * 3600, 3 * 3600)
+        assert stored(parent1) == (2 * 3600, 3 * 3600)
+        assert parent1.total_logged_seconds == 3 * 3600
+
+        # schedule info
+        child3.schedule_timing = 5
+        DBSession.commit()
+        assert stored(parent1) == (6 * 3600, 3 * 3600)
+        assert parent1.schedule_seconds == 6 * 3600
+
+        # re-parenting
+        child1.parent = parent2
+        DBSession.commit()
+        assert stored(parent2) == (6 * 3600, 3 * 3600)
+        assert parent2.percent_complete == pytest.approx(50.0)
+
+        # deleting
+        DBSession.delete(tlog)
+        DBSession.commit()
+        assert stored(child1) == (6 * 3600, 0)
+        assert stored(parent2) == (6 * 3600, 0)
+
+    def test_rollup_columns_are_updated_with_deltas(self):
+        """testing if the changes of the rollup columns are applied without
+        recomputing the sub trees and the columns stay in sync when the
+        leaf tasks become containers and vice versa
+        """
+        kwargs = copy.copy(self.kwargs)
+        kwargs['depends'] = []
+        kwargs['resources'] = [self.test_user1]
+        kwargs['alternative_resources'] = []
+        kwargs['schedule_timing'] = 1
+        kwargs['schedule_unit'] = 'h'
+
+        parent1 = Task(**kwargs)
+        parent2 = Task(**kwargs)
+        child1 = Task(parent=parent1, **kwargs)
+        child2 = Task(parent=child1, **kwargs)
+        child3 = Task(parent=child1, **kwargs)
+
+        from stalker.db.session import DBSession
+        DBSession.add_all([parent1, parent2])
+        DBSession.commit()
+
+        from stalker import TimeLog
+        dt = datetime.datetime
+        td = datetime.timedelta
+        now = dt(2013, 4, 8, 10, 0, tzinfo=pytz.utc)
+
+        # a new time log doesn't scan the sub trees
+        from sqlalchemy import event
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = DBSession.connection().engine
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            tlog = TimeLog(
+                task=child2,
+                resource=self.test_user1,
+                start=now,
+                end=now + td(hours=3)
+            )
+            DBSession.add(tlog)
+            DBSession.commit()
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+        assert not [s for s in statements if 'LIKE' in s]
+        assert Task.verify_schedule_info(project=self.test_project1) == {}
+
+        # moving the time log
+        tlog.task = child3
+        tlog.end = now + td(hours=2)
+        DBSession.commit()
+        assert Task.verify_schedule_info(project=self.test_project1) == {}
+
+        # a leaf becoming a container
+        child3.parent = parent2
+        DBSession.commit()
+        assert Task.verify_schedule_info(project=self.test_project1) == {}
+
+        # and a container becoming a leaf, with its parent moved in the same
+        # flush
+        child2.parent = parent2
+        child1.parent = child3
+        DBSession.commit()
+        assert Task.verify_schedule_info(project=self.test_project1) == {}
+
+        # deleting a container
+        DBSession.delete(child3)
+        DBSession.commit()
+        assert Task.verify_schedule_info(project=self.test_project1) == {}
+        assert parent2.schedule_seconds == 3600
+
+    def test_rollup_columns_do_not_depend_on_the_listener_order(self):
+        """testing if the rollup columns are updated properly when the
+        listener that updates the dag paths runs after the rollup listener
+        """
+        kwargs = copy.copy(self.kwargs)
+        kwargs['depends'] = []
+        kwargs['resources'] = [self.test_user1]
+        kwargs['alternative_resources'] = []
+        kwargs['schedule_timing'] = 1
+        kwargs['schedule_unit'] = 'h'
+
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+        from stalker.models.task import update_rollup_columns
+        from stalker.db.session import DBSession
+
+        # register the rollup listener again to run it first
+        event.remove(Session, 'after_flush', update_rollup_columns)
+        event.listen(
+            Session, 'after_flush', update_rollup_columns, insert=True
+        )
+        try:
+            parent1 = Task(**kwargs)
+            parent2 = Task(**kwargs)
+            child1 = Task(parent=parent1, **kwargs)
+            Task(parent=child1, **kwargs)
+            Task(parent=child1, **kwargs)
+            DBSession.add_all([parent1, parent2])
+            DBSession.commit()
+            assert Task.verify_schedule_info(project=self.test_project1) == {}
+
+            child1.parent = parent2
+            DBSession.commit()
+            assert Task.verify_schedule_info(project=self.test_project1) == {}
+            assert parent2.schedule_seconds == 2 * 3600
+        finally:
+            event.remove(Session, 'after_flush', update_rollup_columns)
+            event.listen(Session, 'after_flush', update_rollup_columns)
+
+    def test_verify_schedule_info_is_working_properly(self):
+        """testing if the verify_schedule_info() method is reporting and
+        repairing the drifted rollup columns of the container tasks
+        """
+        kwargs = copy.copy(self.kwargs)
+        kwargs['depends'] = []
+        kwargs['resources'] = [self.test_user1]
+        kwargs['alternative_resources'] = []
+        kwargs['schedule_timing'] = 2
+        kwargs['schedule_unit'] = 'h'
+
+        parent1 = Task(**kwargs)
+        child1 = Task(parent=parent1, **kwargs)
+        child2 = Task(parent=child1, **kwargs)
+        Task(parent=child1, **kwargs)
+
+        from stalker.db.session import DBSession
+        DBSession.add(parent1)
+        DBSession.commit()
+
+        assert Task.verify_schedule_info(project=self.test_project1) == {}
+
+        # change the values by bypassing the ORM
+        DBSession.connection().execute(
+            Task.__table__.update()
+            .where(Task.__table__.c.id.in_([parent1.id, child1.id]))
+            .values(schedule_seconds=10, total_logged_seconds=None)
+        )
+
+        drift = Task.verify_schedule_info(project=self.test_project1)
+        assert drift == {
+            parent1.id: ((10, None), (4 * 3600, 0)),
+            child1.id: ((10, None), (4 * 3600, 0)),
+        }
+
+        # for a sub tree
+        assert list(Task.verify_schedule_info(task=child1).keys()) == \
+            [child1.id]
+        assert Task.verify_schedule_info(task=child2) == {}
+
+        # repair
+        Task.verify_schedule_info(project=self.test_project1, repair=True)
+        assert Task.verify_schedule_info(project=self.test_project1) == {}
+        DBSession.expire_all()
+        assert parent1._schedule_seconds == 4 * 3600
+
+    def test_verify_schedule_info_without_a_project_or_task(self):
+        """testing if a TypeError will be raised when the
+        verify_schedule_info() is called without a project or task
+        """
+        with pytest.raises(TypeError) as cm:
+            Task.verify_schedule_info()
+
+        assert str(cm.value) == \
+            'Task.verify_schedule_info() needs a project or a task'
+
     def test_time_logs_attribute_is_working_properly(self):
         """testing if the time_log attribute is working properly
         """
@@ -33,6 +33,9 @@ class TaskJugglerSchedulerDBTester(UnitTestDBBase):
         """
         super(self.__class__, self).setUp()
 
+        # do not use the tjp cache of the previous tests
+        TaskJugglerScheduler.clear_tjp_cache()
+
         # create departments
         from stalker import Department
         self.test_dep1 = Department(name='Dep1')
@@ -789,3 +792,466 @@ taskreport breakdown "{{csv_path}}"{
         # print tjp_content
         tjp_sched._clean_up()
         assert tjp_content == expected_tjp_content
+
+    def test_incremental_argument_is_skipped(self):
+        """testing if the incremental attribute will be False if the
+        incremental argument is skipped
+        """
+        tjp_sched = TaskJugglerScheduler()
+        assert tjp_sched.incremental is False
+
+    def test_incremental_argument_is_working_properly(self):
+        """testing if the incremental argument value is correctly passed to
+        the incremental attribute
+        """
+        tjp_sched = TaskJugglerScheduler(incremental=True)
+        assert tjp_sched.incremental is True
+
+    def _create_dummy_project(self):
+        """creates a second project with one task
+        """
+        from stalker import Project, Task
+        dummy_project = Project(
+            name='Dummy Project',
+            code='DP',
+            repository=self.test_repo
+        )
+        dummy_task = Task(
+            name='Dummy Task 1',
+            project=dummy_project,
+            schedule_timing=4,
+            schedule_unit='h',
+            resources=[self.test_user1]
+        )
+        from stalker.db.session import DBSession
+        DBSession.save([dummy_project, dummy_task])
+        return dummy_project, dummy_task
+
+    def _create_test_studio(self):
+        """creates a studio for the tjp rendering tests
+        """
+        from stalker import Studio
+        test_studio = Studio(
+            name='Test Studio',
+            now=datetime.datetime(2013, 4, 16, 0, 0, tzinfo=pytz.utc)
+        )
+        test_studio.start = \
+            datetime.datetime(2013, 4, 16, 0, 0, tzinfo=pytz.utc)
+        test_studio.end = \
+            datetime.datetime(2013, 4, 30, 0, 0, tzinfo=pytz.utc)
+        from stalker.db.session import DBSession
+        DBSession.save(test_studio)
+        return test_studio
+
+    def test_incremental_mode_renders_the_same_tjp_content(self):
+        """testing if the incremental mode generates the same tjp content with
+        the regular mode
+        """
+        self._create_dummy_project()
+        test_studio = self._create_test_studio()
+
+        tjp_sched = TaskJugglerScheduler(studio=test_studio)
+        tjp_sched._create_tjp_file()
+        tjp_sched._create_tjp_file_content()
+
+        tjp_sched_inc = TaskJugglerScheduler(
+            studio=test_studio, incremental=True
+        )
+        tjp_sched_inc._create_tjp_file()
+        tjp_sched_inc.temp_file_name = tjp_sched.temp_file_name
+        tjp_sched_inc.temp_file_full_path = tjp_sched.temp_file_full_path
+
+        # render it twice, first one fills the cache
+        tjp_sched_inc._create_tjp_file_content()
+        assert tjp_sched_inc.tjp_content == tjp_sched.tjp_content
+
+        tjp_sched_inc._create_tjp_file_content()
+        assert tjp_sched_inc.tjp_content == tjp_sched.tjp_content
+
+    def test_incremental_mode_only_renders_changed_projects(self):
+        """testing if the incremental mode uses the cached tjp of the projects
+        that are not changed and renders the changed projects again
+        """
+        dummy_project, dummy_task = self._create_dummy_project()
+        test_studio = self._create_test_studio()
+
+        tjp_sched = TaskJugglerScheduler(studio=test_studio, incremental=True)
+        tjp_sched._create_tjp_file()
+        tjp_sched._create_tjp_file_content()
+
+        from stalker.models.schedulers import _tjp_fragment_cache
+        proj1_cache = _tjp_fragment_cache[self.test_proj1.id]
+        dummy_project_cache = _tjp_fragment_cache[dummy_project.id]
+
+        # update a task in the dummy project
+        dummy_task.schedule_timing = 12
+        from stalker.db.session import DBSession
+        DBSession.commit()
+
+        tjp_sched._create_tjp_file_content()
+
+        assert _tjp_fragment_cache[self.test_proj1.id] is proj1_cache
+        assert _tjp_fragment_cache[dummy_project.id] is not \
+            dummy_project_cache
+        assert 'effort 12.0h' in tjp_sched.tjp_content
+
+    def test_incremental_mode_detects_new_time_logs(self):
+        """testing if the incremental mode renders the project again when a
+        new TimeLog is entered
+        """
+        test_studio = self._create_test_studio()
+
+        tjp_sched = TaskJugglerScheduler(studio=test_studio, incremental=True)
+        tjp_sched._create_tjp_file()
+        tjp_sched._create_tjp_file_content()
+        assert 'booking' not in tjp_sched.tjp_content
+
+        from stalker import TimeLog
+        tlog1 = TimeLog(
+            resource=self.test_user1,
+            task=self.test_task1,
+            start=datetime.datetime(2013, 4, 16, 6, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc)
+        )
+        from stalker.db.session import DBSession
+        DBSession.save(tlog1)
+
+        tjp_sched._create_tjp_file_content()
+        assert 'booking User_%s 2013-04-16-06:00:00 - ' \
+               '2013-04-16-09:00:00 { overtime 2 }' % self.test_user1.id in \
+            tjp_sched.tjp_content
+
+    def test_clear_tjp_cache_is_working_properly(self):
+        """testing if the clear_tjp_cache() method will clear the cache of the
+        given projects
+        """
+        dummy_project, dummy_task = self._create_dummy_project()
+        test_studio = self._create_test_studio()
+
+        tjp_sched = TaskJugglerScheduler(studio=test_studio, incremental=True)
+        tjp_sched._create_tjp_file()
+        tjp_sched._create_tjp_file_content()
+
+        from stalker.models.schedulers import _tjp_fragment_cache
+        assert self.test_proj1.id in _tjp_fragment_cache
+        assert dummy_project.id in _tjp_fragment_cache
+
+        TaskJugglerScheduler.clear_tjp_cache([dummy_project.id])
+        assert self.test_proj1.id in _tjp_fragment_cache
+        assert dummy_project.id not in _tjp_fragment_cache
+
+        TaskJugglerScheduler.clear_tjp_cache()
+        assert _tjp_fragment_cache == {}
+
+    def test_workers_argument_is_skipped(self):
+        """testing if the workers attribute will be 1 if the workers argument
+        is skipped
+        """
+        tjp_sched = TaskJugglerScheduler()
+        assert tjp_sched.workers == 1
+
+    def test_workers_argument_is_not_an_integer(self):
+        """testing if a TypeError will be raised when the workers argument is
+        not an integer
+        """
+        with pytest.raises(TypeError) as cm:
+            TaskJugglerScheduler(workers='4')
+
+        assert str(cm.value) == \
+            'TaskJugglerScheduler.workers should be an integer, not str'
+
+    def test_workers_attribute_is_not_a_positive_integer(self):
+        """testing if a ValueError will be raised when the workers attribute
+        is set to an integer smaller than 1
+        """
+        tjp_sched = TaskJugglerScheduler()
+        with pytest.raises(ValueError) as cm:
+            tjp_sched.workers = 0
+
+        assert str(cm.value) == \
+            'TaskJugglerScheduler.workers should be a positive integer, not 0'
+
+    def test_workers_argument_is_working_properly(self):
+        """testing if the workers argument value is correctly passed to the
+        workers attribute
+        """
+        tjp_sched = TaskJugglerScheduler(workers=4)
+        assert tjp_sched.workers == 4
+
+    def test_multiple_workers_render_the_same_tjp_content(self):
+        """testing if rendering the projects with multiple workers generates
+        the same tjp content with a single worker
+        """
+        for i in range(3):
+            self._create_dummy_project()
+        test_studio = self._create_test_studio()
+        from stalker.db.session import DBSession
+        DBSession.commit()
+
+        tjp_sched = TaskJugglerScheduler(studio=test_studio)
+        tjp_sched._create_tjp_file()
+        tjp_sched._create_tjp_file_content()
+
+        for incremental in [False, True]:
+            tjp_sched_mt = TaskJugglerScheduler(
+                studio=test_studio, workers=3, incremental=incremental
+            )
+            tjp_sched_mt._create_tjp_file()
+            tjp_sched_mt.temp_file_name = tjp_sched.temp_file_name
+            tjp_sched_mt.temp_file_full_path = tjp_sched.temp_file_full_path
+            tjp_sched_mt._create_tjp_file_content()
+
+            assert tjp_sched_mt.tjp_content == tjp_sched.tjp_content
+
+    def test_streaming_argument_is_skipped(self):
+        """testing if the streaming attribute will be False if the streaming
+        argument is skipped
+        """
+        tjp_sched = TaskJugglerScheduler()
+        assert tjp_sched.streaming is False
+
+    def test_streaming_argument_is_working_properly(self):
+        """testing if the streaming argument value is correctly passed to the
+        streaming attribute
+        """
+        tjp_sched = TaskJugglerScheduler(streaming=True)
+        assert tjp_sched.streaming is True
+
+    def test_streaming_mode_writes_the_same_tjp_file(self):
+        """testing if the streaming mode writes the same tjp file content
+        with the regular mode
+        """
+        self._create_dummy_project()
+        test_studio = self._create_test_studio()
+
+        tjp_sched = TaskJugglerScheduler(studio=test_studio)
+        tjp_sched._create_tjp_file()
+        tjp_sched._create_tjp_file_content()
+
+        for incremental in [False, True, True]:
+            tjp_sched_st = TaskJugglerScheduler(
+                studio=test_studio, streaming=True, incremental=incremental
+            )
+            tjp_sched_st._create_tjp_file()
+            tjp_sched_st.temp_file_name = tjp_sched.temp_file_name
+            tjp_sched_st.temp_file_full_path = tjp_sched.temp_file_full_path
+            tjp_sched_st._fill_tjp_file()
+
+            # the content is not kept in memory
+            assert tjp_sched_st.tjp_content == ''
+
+            with open(tjp_sched_st.tjp_file_full_path) as f:
+                assert f.read() == tjp_sched.tjp_content
+            tjp_sched_st._clean_up()
+
+    def test_streaming_to_a_file_like_object(self):
+        """testing if the tjp content can be streamed to any file like object
+        """
+        self._create_dummy_project()
+        test_studio = self._create_test_studio()
+
+        tjp_sched = TaskJugglerScheduler(studio=test_studio)
+        tjp_sched._create_tjp_file()
+        tjp_sched._create_tjp_file_content()
+
+        import io
+        stream = io.StringIO()
+        tjp_sched._write_tjp(stream)
+        assert stream.getvalue() == tjp_sched.tjp_content
+
+    def test_use_pipes_argument_is_skipped(self):
+        """testing if the use_pipes attribute will be False if the use_pipes
+        argument is skipped
+        """
+        tjp_sched = TaskJugglerScheduler()
+        assert tjp_sched.use_pipes is False
+
+    def test_use_pipes_argument_is_working_properly(self):
+        """testing if the use_pipes argument value is correctly passed to the
+        use_pipes attribute
+        """
+        tjp_sched = TaskJugglerScheduler(use_pipes=True)
+        assert tjp_sched.use_pipes is True
+
+    def test_parse_csv_lines_is_working_properly(self):
+        """testing if the _parse_csv_lines() method updates the tasks with
+        the given csv rows
+        """
+        from stalker.db.session import DBSession
+        DBSession.commit()
+
+        tjp_sched = TaskJugglerScheduler(compute_resources=True)
+        tjp_sched._parse_csv_lines([
+            ['Project_%s' % self.test_proj1.id, '2013-04-16-09:00',
+             '2013-04-24-10:00', ''],
+            ['Project_%s.Task_%s' % (self.test_proj1.id, self.test_task1.id),
+             '2013-04-16-09:00', '2013-04-18-16:00',
+             'User_%s (User_%s), User_%s (User_%s)' % (
+                 self.test_user3.id, self.test_user3.id,
+                 self.test_user4.id, self.test_user4.id
+             )],
+        ])
+        DBSession.commit()
+
+        assert self.test_proj1.computed_start == \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc)
+        assert self.test_proj1.computed_end == \
+            datetime.datetime(2013, 4, 24, 10, 0, tzinfo=pytz.utc)
+        assert self.test_task1.computed_start == \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc)
+        assert self.test_task1.computed_end == \
+            datetime.datetime(2013, 4, 18, 16, 0, tzinfo=pytz.utc)
+        assert sorted(self.test_task1.computed_resources,
+                      key=lambda x: x.id) == \
+            [self.test_user3, self.test_user4]
+
+    def test_tasks_are_correctly_scheduled_with_pipes(self):
+        """testing if the tasks are correctly scheduled when the tjp content
+        and the csv report are passed through pipes
+        """
+        tjp_sched = TaskJugglerScheduler(compute_resources=True,
+                                         use_pipes=True)
+        test_studio = self._create_test_studio()
+        tjp_sched.studio = test_studio
+        tjp_sched.schedule()
+        from stalker.db.session import DBSession
+        DBSession.commit()
+
+        # no temp files are created
+        assert tjp_sched.tjp_file_full_path is None
+        assert tjp_sched.csv_file_full_path is None
+
+        assert \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc) == \
+            self.test_task1.computed_start
+        assert \
+            datetime.datetime(2013, 4, 18, 16, 0, tzinfo=pytz.utc) == \
+            self.test_task1.computed_end
+        assert \
+            datetime.datetime(2013, 4, 18, 16, 0, tzinfo=pytz.utc) == \
+            self.test_task2.computed_start
+        assert \
+            datetime.datetime(2013, 4, 24, 10, 0, tzinfo=pytz.utc) == \
+            self.test_task2.computed_end
+        assert len(self.test_task2.computed_resources) == 2
+
+    def test_parse_csv_lines_routes_the_rows_per_table(self):
+        """testing if the _parse_csv_lines() method only updates the Projects
+        with the project rows and the Tasks with the task rows
+        """
+        from stalker.db.session import DBSession
+        DBSession.commit()
+
+        tjp_sched = TaskJugglerScheduler(compute_resources=True)
+        tjp_sched._parse_csv_lines([
+            # the resources of the project rows are skipped
+            ['Project_%s' % self.test_proj1.id, '2013-04-16-09:00',
+             '2013-04-24-10:00', 'User_%s (User_%s)' % (
+                 self.test_user1.id, self.test_user1.id
+             )],
+            ['Project_%s.Task_%s' % (self.test_proj1.id, self.test_task2.id),
+             '2013-04-18-16:00', '2013-04-24-10:00', ''],
+        ])
+        DBSession.commit()
+
+        assert self.test_proj1.computed_end == \
+            datetime.datetime(2013, 4, 24, 10, 0, tzinfo=pytz.utc)
+        assert self.test_task1.computed_start is None
+        assert self.test_task2.computed_start == \
+            datetime.datetime(2013, 4, 18, 16, 0, tzinfo=pytz.utc)
+
+    def test_update_computed_dates_without_copy(self):
+        """testing if the _update_computed_dates() method updates the dates
+        with an executemany update when COPY can not be used
+        """
+        from stalker import Task
+        from stalker.db.session import DBSession
+        DBSession.commit()
+
+        connection = DBSession.connection()
+        driver = connection.dialect.driver
+        connection.dialect.driver = 'not psycopg2'
+        try:
+            TaskJugglerScheduler._update_computed_dates(
+                Task.__table__,
+                [(self.test_task1.id, '2013-04-16-09:00', '2013-04-18-16:00')],
+                connection
+            )
+        finally:
+            connection.dialect.driver = driver
+        DBSession.commit()
+
+        assert self.test_task1.computed_start == \
+            datetime.datetime(2013, 4, 16, 9, 0, tzinfo=pytz.utc)
+        assert self.test_task1.computed_end == \
+            datetime.datetime(2013, 4, 18, 16, 0, tzinfo=pytz.utc)
+
+    def test_parse_tj_date_is_working_properly(self):
+        """testing if the parse_tj_date() function is working properly
+        """
+        from stalker.models.schedulers import parse_tj_date
+        assert parse_tj_date('2013-04-16-09:30') == \
+            datetime.datetime(2013, 4, 16, 9, 30, tzinfo=pytz.utc)
+
+    def _computed_resource_pairs(self):
+        """returns the (task_id, resource_id) pairs in the
+        Task_Computed_Resources table
+        """
+        from stalker.db.session import DBSession
+        from stalker.models.task import Task_Computed_Resources
+        return sorted(
+            tuple(row) for row in DBSession.connection().execute(
+                Task_Computed_Resources.select()
+            )
+        )
+
+    def test_update_computed_resources_only_applies_the_changes(self):
+        """testing if the _update_computed_resources() method only deletes the
+        removed and inserts the added pairs of the given tasks
+        """
+        from stalker.db.session import DBSession
+        self.test_task1.computed_resources = \
+            [self.test_user1, self.test_user2]
+        self.test_task2.computed_resources = \
+            [self.test_user1, self.test_user2]
+        DBSession.commit()
+
+        added, removed = TaskJugglerScheduler._update_computed_resources(
+            {self.test_task1.id: set([self.test_user1.id,
+                                      self.test_user3.id])},
+            DBSession.connection()
+        )
+        DBSession.commit()
+
+        assert (added, removed) == (1, 1)
+        # the other tasks are not touched
+        assert self._computed_resource_pairs() == sorted([
+            (self.test_task1.id, self.test_user1.id),
+            (self.test_task1.id, self.test_user3.id),
+            (self.test_task2.id, self.test_user1.id),
+            (self.test_task2.id, self.test_user2.id),
+        ])
+
+    def test_parse_csv_lines_keeps_computed_resources_of_other_tasks(self):
+        """testing if the _parse_csv_lines() method only updates the computed
+        resources of the tasks in the csv rows
+        """
+        from stalker.db.session import DBSession
+        self.test_task1.computed_resources = [self.test_user1]
+        self.test_task2.computed_resources = \
+            [self.test_user1, self.test_user2]
+        DBSession.commit()
+
+        tjp_sched = TaskJugglerScheduler(compute_resources=True)
+        tjp_sched._parse_csv_lines([
+            ['Project_%s.Task_%s' % (self.test_proj1.id, self.test_task1.id),
+             '2013-04-16-09:00', '2013-04-18-16:00',
+             'User_%s (User_%s)' % (self.test_user3.id, self.test_user3.id)],
+        ])
+        DBSession.commit()
+
+        assert self._computed_resource_pairs() == sorted([
+            (self.test_task1.id, self.test_user3.id),
+            (self.test_task2.id, self.test_user1.id),
+            (self.test_task2.id, self.test_user2.id),
+        ])
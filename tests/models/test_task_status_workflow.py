@@ -2199,6 +2199,52 @@ class TaskStatusWorkflowTestCase(unittest.TestCase):
         assert self.status_rts == self.test_task5.status
 
 
+    def test_propagate_statuses_is_working_properly(self):
+        """testing if the propagate_statuses() method updates the statuses of
+        the dependent tasks and the parents in topological order
+        """
+        self.test_task3.status = self.status_cmpl
+        self.test_task4.status = self.status_wfd
+        self.test_task5.status = self.status_wfd
+        self.test_task6.status = self.status_rts
+
+        from stalker import Task
+        updated_tasks = Task.propagate_statuses([self.test_task3])
+
+        assert self.status_cmpl == self.test_task3.status
+        assert self.status_rts == self.test_task4.status
+        assert self.status_wfd == self.test_task5.status
+        assert self.status_rts == self.test_task6.status
+
+        assert len(updated_tasks) == 4
+        assert updated_tasks.index(self.test_task3) < \
+            updated_tasks.index(self.test_task4) < \
+            updated_tasks.index(self.test_task5) < \
+            updated_tasks.index(self.test_task1)
+
+        # the parent status is the same with the one calculated by the per
+        # task method
+        parent_status = self.test_task1.status
+        self.test_task1.update_status_with_children_statuses()
+        assert parent_status == self.test_task1.status
+
+    def test_propagate_statuses_uses_calculated_upstream_statuses(self):
+        """testing if the propagate_statuses() method uses the newly
+        calculated statuses of the upstream tasks
+        """
+        self.test_task3.status = self.status_cmpl
+        self.test_task4.status = self.status_wfd
+        self.test_task5.status = self.status_rts
+        self.test_task5.depends = [self.test_task4]
+
+        from stalker import Task
+        Task.propagate_statuses([self.test_task3])
+
+        # test task 4 becomes RTS, so test task 5 should wait for it
+        assert self.status_rts == self.test_task4.status
+        assert self.status_wfd == self.test_task5.status
+
+
 class TaskStatusWorkflowDBTestDBCase(UnitTestDBBase):
     """tests that needs a database to work
     """
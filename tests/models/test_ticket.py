@@ -255,6 +255,72 @@ class TicketTester(UnitTestDBBase):
         assert ticket1.number == 2
         assert ticket2.number == 3
 
+    def test_number_argument_is_working_properly(self):
+        """testing if the number argument value is used as the ticket number
+        """
+        from stalker import Ticket
+        self.kwargs['number'] = 12
+        new_ticket = Ticket(**self.kwargs)
+        assert new_ticket.number == 12
+        assert new_ticket.name == 'Ticket #12'
+
+    def test_number_argument_is_not_an_integer(self):
+        """testing if a TypeError will be raised when the number argument is
+        not an integer
+        """
+        from stalker import Ticket
+        self.kwargs['number'] = '12'
+        with pytest.raises(TypeError) as cm:
+            Ticket(**self.kwargs)
+
+        assert str(cm.value) == 'Ticket.number should be an integer, not str'
+
+    def test_reserve_ticket_numbers_is_working_properly(self):
+        """testing if the reserve_ticket_numbers() class method reserves the
+        ticket numbers from the sequence
+        """
+        from stalker import Ticket
+        from stalker.db.session import DBSession
+        numbers = Ticket.reserve_ticket_numbers(3)
+        assert numbers == [2, 3, 4]
+
+        tickets = [Ticket(number=number, **self.kwargs) for number in numbers]
+        DBSession.add_all(tickets)
+        DBSession.commit()
+        assert [ticket.number for ticket in tickets] == [2, 3, 4]
+
+        # the next ticket continues after the reserved numbers
+        new_ticket = Ticket(**self.kwargs)
+        assert new_ticket.number == 5
+
+        # the reserved numbers are not given again after a rollback
+        DBSession.rollback()
+        assert Ticket.reserve_ticket_numbers() == [6]
+
+    def test_reserve_ticket_numbers_count_is_not_an_integer(self):
+        """testing if a TypeError will be raised when the count argument of
+        the reserve_ticket_numbers() is not an integer
+        """
+        from stalker import Ticket
+        with pytest.raises(TypeError) as cm:
+            Ticket.reserve_ticket_numbers('3')
+
+        assert str(cm.value) == \
+            'Ticket.reserve_ticket_numbers() count should be an integer, ' \
+            'not str'
+
+    def test_reserve_ticket_numbers_count_is_not_positive(self):
+        """testing if a ValueError will be raised when the count argument of
+        the reserve_ticket_numbers() is not a positive integer
+        """
+        from stalker import Ticket
+        with pytest.raises(ValueError) as cm:
+            Ticket.reserve_ticket_numbers(0)
+
+        assert str(cm.value) == \
+            'Ticket.reserve_ticket_numbers() count should be a positive ' \
+            'integer, not 0'
+
     def test_links_argument_accepts_anything_derived_from_SimpleEntity(self):
         """testing if links accepting anything derived from SimpleEntity
         """
@@ -776,3 +842,36 @@ class TicketTester(UnitTestDBBase):
         assert self.test_ticket.summary != test_value
         self.test_ticket.summary = test_value
         assert self.test_ticket.summary == test_value
+
+
+def test_reserve_ticket_numbers_with_sqlite3(setup_sqlite3):
+    """testing if the ticket numbers are reserved from the counter table in
+    SQLite3
+    """
+    from stalker import db
+    db.setup()
+    db.init()
+
+    from stalker import Project, Repository, Ticket
+    from stalker.db.session import DBSession
+    project = Project(
+        name='Test Project',
+        code='TP',
+        repositories=[Repository(name='Test Repository')]
+    )
+    ticket1 = Ticket(project=project)
+    DBSession.add(ticket1)
+    DBSession.commit()
+    assert ticket1.number == 1
+
+    assert Ticket.reserve_ticket_numbers(3) == [2, 3, 4]
+
+    ticket2 = Ticket(project=project)
+    assert ticket2.number == 5
+    DBSession.add(ticket2)
+    DBSession.commit()
+
+    # the counter is rolled back with the transaction
+    assert Ticket.reserve_ticket_numbers(2) == [6, 7]
+    DBSession.rollback()
+    assert Ticket.reserve_ticket_numbers() == [6]
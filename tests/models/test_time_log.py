@@ -27,6 +27,75 @@ from stalker import TimeLog
 from stalker.testing import UnitTestDBBase
 
 
+def test_find_overlapping_interval():
+    """testing if find_overlapping_interval() returns the interval which
+    overlaps with the given range
+    """
+    from stalker.models.task import find_overlapping_interval
+    intervals = [(1, 3), (5, 8), (10, 11)]
+    assert find_overlapping_interval(intervals, 0, 1) is None
+    assert find_overlapping_interval(intervals, 0, 2) == (1, 3)
+    assert find_overlapping_interval(intervals, 3, 5) is None
+    assert find_overlapping_interval(intervals, 4, 12) == (10, 11)
+    assert find_overlapping_interval(intervals, 6, 7) == (5, 8)
+    assert find_overlapping_interval(intervals, 11, 20) is None
+    assert find_overlapping_interval([], 0, 20) is None
+
+
+def test_overbooking_is_detected_with_sqlite3(setup_sqlite3):
+    """testing if the overlapping time logs of a resource are detected in
+    SQLite3, which doesn't have the exclusion constraint
+    """
+    from stalker import db, Project, Repository, Task, User
+    from stalker.db.session import DBSession
+    db.setup()
+    db.init()
+
+    user = User(
+        name='Test User',
+        login='tuser',
+        email='tuser@users.com',
+        password='secret'
+    )
+    project = Project(
+        name='Test Project',
+        code='TP',
+        repositories=[Repository(name='Test Repository')]
+    )
+    task = Task(name='Task 1', project=project, resources=[user])
+    start = datetime.datetime(2018, 1, 1, 10, 0, tzinfo=pytz.utc)
+    td = datetime.timedelta
+    DBSession.add(
+        TimeLog(task=task, resource=user, start=start, end=start + td(hours=2))
+    )
+    DBSession.commit()
+
+    from stalker.exceptions import OverBookedError
+    with pytest.raises(OverBookedError):
+        TimeLog(
+            task=task, resource=user,
+            start=start - td(hours=1), end=start + td(hours=3)
+        )
+    # the failed TimeLog is still attached to the task
+    DBSession.rollback()
+
+    with pytest.raises(OverBookedError):
+        TimeLog.bulk_create([{
+            'task': task, 'resource': user,
+            'start': start + td(hours=1), 'end': start + td(hours=3)
+        }])
+
+    # no overlap
+    TimeLog(
+        task=task, resource=user,
+        start=start + td(hours=2), end=start + td(hours=3)
+    )
+    TimeLog.bulk_create([{
+        'task': task, 'resource': user,
+        'start': start - td(hours=2), 'end': start
+    }])
+
+
 class TimeLogDBTester(UnitTestDBBase):
     """tests the TimeLog class
     """
@@ -691,6 +760,59 @@ class TimeLogDBTester(UnitTestDBBase):
         # no warning
         self.test_resource2.time_logs.append(time_log1)
 
+    def test_OverbookedError_with_a_time_log_inside_the_new_one(self):
+        """testing if a OverBookedError will be raised when the new time log
+        contains another time log of the resource.
+
+        Simple case diagram:
+          ###
+        #######
+        """
+        kwargs = copy.copy(self.kwargs)
+        kwargs['resource'] = self.test_resource2
+        kwargs['start'] = datetime.datetime(2013, 3, 22, 4, 0, tzinfo=pytz.utc)
+        kwargs['duration'] = datetime.timedelta(2)
+        time_log1 = TimeLog(**kwargs)
+
+        from stalker.db.session import DBSession
+        DBSession.add(time_log1)
+        DBSession.commit()
+
+        kwargs['start'] = datetime.datetime(2013, 3, 20, 4, 0, tzinfo=pytz.utc)
+        kwargs['duration'] = datetime.timedelta(10)
+
+        from stalker.exceptions import OverBookedError
+        with pytest.raises(OverBookedError):
+            TimeLog(**kwargs)
+
+    def test_get_clashing_time_log_is_working_properly(self):
+        """testing if the get_clashing_time_log() method returns the dates of
+        the time log that overlaps with the given range
+        """
+        td = datetime.timedelta
+        start = self.test_time_log.start
+        end = self.test_time_log.end
+        resource_id = self.test_resource1.id
+
+        assert TimeLog.get_clashing_time_log(
+            resource_id, start - td(hours=1), start + td(hours=1)
+        ) == (start, end)
+        assert TimeLog.get_clashing_time_log(
+            resource_id, start - td(days=1), end + td(days=1)
+        ) == (start, end)
+        assert TimeLog.get_clashing_time_log(
+            resource_id, end, end + td(hours=1)
+        ) is None
+        assert TimeLog.get_clashing_time_log(
+            resource_id, start - td(hours=1), start
+        ) is None
+        assert TimeLog.get_clashing_time_log(
+            self.test_resource2.id, start, end
+        ) is None
+        assert TimeLog.get_clashing_time_log(
+            resource_id, start, end, exclude_id=self.test_time_log.id
+        ) is None
+
     def test_OverbookedError_11(self):
         """testing if a IntegrityError will be raised by the database backend
         when the resource is already booked for the given time period and it is
@@ -1141,3 +1263,219 @@ class TimeLogDBTester(UnitTestDBBase):
             datetime.datetime(2014, 3, 16, 10, 0, tzinfo=pytz.utc)
         )
 
+
+    def test_bulk_create_is_working_properly(self):
+        """testing if the bulk_create() method is creating the time logs and
+        updating the task statuses and the parent rollups
+        """
+        from stalker import Task
+        from stalker.db.session import DBSession
+        parent = Task(name='Parent Task', project=self.test_project)
+        child1 = Task(
+            name='Child Task 1', parent=parent,
+            resources=[self.test_resource1, self.test_resource2]
+        )
+        child2 = Task(
+            name='Child Task 2', parent=parent,
+            resources=[self.test_resource1]
+        )
+        DBSession.add(parent)
+        DBSession.commit()
+        assert child1.status == self.status_rts
+
+        dt = datetime.datetime
+        td = datetime.timedelta
+        start = dt(2014, 1, 1, 10, 0, tzinfo=pytz.utc)
+        ids = TimeLog.bulk_create([
+            {
+                'task': child1,
+                'resource': self.test_resource1,
+                'start': start,
+                'end': start + td(hours=2)
+            },
+            {
+                'task': child1.id,
+                'resource': self.test_resource2.id,
+                'start': start,
+                'end': start + td(hours=3)
+            },
+            {
+                'task': child2,
+                'resource': self.test_resource1,
+                'start': start + td(hours=2),
+                'duration': td(hours=1)
+            },
+        ], created_by=self.test_resource2)
+        DBSession.commit()
+
+        assert len(ids) == 3
+        time_logs = [TimeLog.query.get(id_) for id_ in ids]
+        assert time_logs[0].task == child1
+        assert time_logs[0].resource == self.test_resource1
+        assert time_logs[0].created_by == self.test_resource2
+        assert time_logs[1].end == start + td(hours=3)
+        assert time_logs[2].end == start + td(hours=3)
+        assert sorted(tlog.id for tlog in child1.time_logs) == sorted(ids[:2])
+
+        assert child1.status == self.status_wip
+        assert child2.status == self.status_wip
+        assert parent.status == self.status_wip
+
+        assert child1.total_logged_seconds == 5 * 3600
+        assert parent._total_logged_seconds == 6 * 3600
+        assert Task.verify_schedule_info(project=self.test_project) == {}
+
+    def test_bulk_create_with_overlapping_data(self):
+        """testing if an OverBookedError will be raised when the given data
+        has overlapping time logs for the same resource, and nothing is
+        created
+        """
+        start = datetime.datetime(2014, 1, 1, 10, 0, tzinfo=pytz.utc)
+        td = datetime.timedelta
+        time_log_count = TimeLog.query.count()
+        from stalker.exceptions import OverBookedError
+        with pytest.raises(OverBookedError) as cm:
+            TimeLog.bulk_create([
+                {
+                    'task': self.test_task1,
+                    'resource': self.test_resource1,
+                    'start': start,
+                    'end': start + td(hours=2)
+                },
+                {
+                    'task': self.test_task2,
+                    'resource': self.test_resource1,
+                    'start': start + td(hours=1),
+                    'end': start + td(hours=3)
+                },
+            ])
+
+        assert str(cm.value) == \
+            'The resource has another TimeLog between %s and %s' % (
+                start, start + td(hours=2)
+            )
+        assert TimeLog.query.count() == time_log_count
+
+    def test_bulk_create_overlapping_with_an_existing_time_log(self):
+        """testing if an OverBookedError will be raised when the given data
+        clashes with a time log in the database
+        """
+        td = datetime.timedelta
+        from stalker.exceptions import OverBookedError
+        with pytest.raises(OverBookedError) as cm:
+            TimeLog.bulk_create([{
+                'task': self.test_task2,
+                'resource': self.test_resource1,
+                'start': self.test_time_log.start - td(hours=1),
+                'end': self.test_time_log.start + td(hours=1)
+            }])
+
+        assert str(cm.value) == \
+            'The resource has another TimeLog between %s and %s' % (
+                self.test_time_log.start, self.test_time_log.end
+            )
+
+        # the other resource is free
+        TimeLog.bulk_create([{
+            'task': self.test_task2,
+            'resource': self.test_resource2,
+            'start': self.test_time_log.start - td(hours=1),
+            'end': self.test_time_log.start + td(hours=1)
+        }])
+
+    def test_bulk_create_for_a_OH_task(self):
+        """testing if a StatusError will be raised when the bulk_create() is
+        called with a OH task
+        """
+        from stalker.db.session import DBSession
+        self.test_task2.status = self.status_oh
+        DBSession.commit()
+
+        from stalker.exceptions import StatusError
+        with pytest.raises(StatusError) as cm:
+            TimeLog.bulk_create([{
+                'task': self.test_task2,
+                'resource': self.test_resource2,
+                'start': datetime.datetime(2014, 1, 1, 10, tzinfo=pytz.utc),
+                'duration': datetime.timedelta(hours=1)
+            }])
+
+        assert str(cm.value) == \
+            'test task 2 is a OH task, and it is not allowed to create ' \
+            'TimeLogs for a OH task, please supply a RTS, WIP, HREV or DREV ' \
+            'task!'
+
+    def test_bulk_create_for_a_container_task(self):
+        """testing if a ValueError will be raised when the bulk_create() is
+        called with a container task
+        """
+        from stalker import Task
+        from stalker.db.session import DBSession
+        parent = Task(name='Parent Task', project=self.test_project)
+        Task(name='Child Task', parent=parent)
+        DBSession.add(parent)
+        DBSession.commit()
+
+        with pytest.raises(ValueError) as cm:
+            TimeLog.bulk_create([{
+                'task': parent,
+                'resource': self.test_resource2,
+                'start': datetime.datetime(2014, 1, 1, 10, tzinfo=pytz.utc),
+                'duration': datetime.timedelta(hours=1)
+            }])
+
+        assert str(cm.value) == \
+            'Parent Task (id: %s) is a container task, and it is not ' \
+            'allowed to create TimeLogs for a container task' % parent.id
+
+    def test_bulk_create_violating_a_dependency(self):
+        """testing if a DependencyViolationError will be raised when the
+        bulk_create() is called with a time log that violates a dependency
+        relation
+        """
+        from stalker import Task
+        from stalker.db.session import DBSession
+        task = self.test_task1
+        task.status = self.status_cmpl
+        task.start = datetime.datetime(2014, 3, 16, 10, 0, tzinfo=pytz.utc)
+        task.end = datetime.datetime(2014, 3, 25, 19, 0, tzinfo=pytz.utc)
+        dep_task = Task(
+            name="test task 3",
+            project=self.test_project,
+            depends=[task],
+            resources=[self.test_resource2]
+        )
+        dep_task.status = self.status_rts
+        DBSession.add(dep_task)
+        DBSession.commit()
+
+        from stalker.exceptions import DependencyViolationError
+        with pytest.raises(DependencyViolationError) as cm:
+            TimeLog.bulk_create([{
+                'task': dep_task,
+                'resource': self.test_resource2,
+                'start': datetime.datetime(2014, 3, 25, 18, tzinfo=pytz.utc),
+                'duration': datetime.timedelta(hours=1)
+            }])
+
+        assert str(cm.value) == \
+            'It is not possible to create a TimeLog before %s, which ' \
+            'violates the dependency relation of "%s" to "%s"' % (
+                datetime.datetime(2014, 3, 25, 19, 0, tzinfo=pytz.utc),
+                dep_task.name,
+                task.name
+            )
+
+    def test_bulk_create_with_a_wrong_task(self):
+        """testing if a TypeError will be raised when the task value is not a
+        Task instance or an id
+        """
+        with pytest.raises(TypeError) as cm:
+            TimeLog.bulk_create([{
+                'task': 'not a task',
+                'resource': self.test_resource2,
+            }])
+
+        assert str(cm.value) == \
+            'TimeLog.task should be an instance of ' \
+            'stalker.models.task.Task not str'
@@ -415,6 +415,76 @@ class VersionDBTester(UnitTestDBBase):
 
         assert new_version.version_number == 4
 
+    def test_version_numbers_are_allocated_in_the_database(self):
+        """testing if the versions of the same take that are flushed together
+        get unique version numbers and their paths are updated
+        """
+        from stalker import FilenameTemplate, Version
+        from stalker.db.session import DBSession
+        ft = FilenameTemplate(
+            name='Task Filename Template',
+            target_entity_type='Task',
+            path='{{project.code}}/{{task.nice_name}}',
+            filename='{{task.nice_name}}'
+                     '_v{{"%03d"|format(version.version_number)}}'
+        )
+        self.test_project.structure.templates.append(ft)
+        DBSession.add(self.test_version)
+        DBSession.commit()
+
+        with DBSession.no_autoflush:
+            new_version1 = Version(**self.kwargs)
+            new_version1.update_paths()
+            new_version2 = Version(**self.kwargs)
+            new_version2.update_paths()
+            assert new_version1.version_number == 2
+            assert new_version2.version_number == 2
+            assert new_version2.filename == 'Task1_v002'
+
+        DBSession.add_all([new_version1, new_version2])
+        DBSession.commit()
+
+        assert new_version1.version_number == 2
+        assert new_version1.filename == 'Task1_v002'
+        assert new_version2.version_number == 3
+        assert new_version2.filename == 'Task1_v003'
+
+    def test_allocate_version_number_with_a_concurrent_transaction(self):
+        """testing if a version number allocated by another transaction is
+        not given to a new version
+        """
+        from stalker import Version
+        from stalker.db.session import DBSession
+        DBSession.add(self.test_version)
+        DBSession.commit()
+
+        new_version = Version(**self.kwargs)
+        assert new_version.version_number == 2
+
+        # another connection publishes to the same take
+        engine = DBSession.connection().engine
+        connection = engine.connect()
+        transaction = connection.begin()
+        try:
+            assert Version.allocate_version_number(
+                self.test_task1, 'TestTake', connection=connection
+            ) == 2
+            transaction.commit()
+        finally:
+            connection.close()
+
+        DBSession.add(new_version)
+        DBSession.commit()
+        assert new_version.version_number == 3
+
+        # requested numbers are respected
+        assert Version.allocate_version_number(
+            self.test_task1.id, 'TestTake', version_number=10
+        ) == 10
+        assert Version.allocate_version_number(
+            self.test_task1.id, 'TestTake'
+        ) == 11
+
     def test_version_number_attribute_is_starting_from_1(self):
         """testing if the version_number attribute is starting from 1
         """
@@ -722,9 +792,11 @@ class VersionDBTester(UnitTestDBBase):
         with pytest.raises(CircularDependencyError) as cm:
             self.test_version.parent = version2
 
+        # version1 and version2 are flushed together, so version2 gets the
+        # next number in the database
         assert str(cm.value) == \
             '<tp_SH001_Task1_TestTake_v001 (Version)> (Version) and ' \
-            '<tp_SH001_Task1_TestTake_v002 (Version)> (Version) creates a ' \
+            '<tp_SH001_Task1_TestTake_v003 (Version)> (Version) creates a ' \
             'circular dependency in their "children" attribute'
 
     def test_children_attribute_is_set_to_None(self):
@@ -910,6 +982,63 @@ class VersionDBTester(UnitTestDBBase):
         new_version1.extension = '.ma'
         assert new_version1.filename == 'Task1_TestTake_v002.ma'
 
+    def test_bulk_update_paths_is_working_properly(self):
+        """testing if the bulk_update_paths() class method renders the paths
+        of the given versions again, stores the changed ones and returns them
+        """
+        from stalker import FilenameTemplate, Task, Version
+        from stalker.db.session import DBSession
+        ft = FilenameTemplate(
+            name='Task Filename Template',
+            target_entity_type='Task',
+            path='{{project.code}}/{%- for parent_task in parent_tasks -%}'
+                 '{{parent_task.nice_name}}/{%- endfor -%}',
+            filename='{{task.nice_name}}_{{version.take_name}}'
+                     '_v{{"%03d"|format(version.version_number)}}'
+                     '{{extension}}'
+        )
+        self.test_project.structure.templates.append(ft)
+        test_task2 = Task(name='Task2', parent=self.test_shot1)
+        DBSession.add(test_task2)
+        DBSession.commit()
+
+        self.test_version.update_paths()
+        self.test_version.extension = '.ma'
+        self.kwargs['task'] = test_task2
+        new_version = Version(**self.kwargs)
+        new_version.update_paths()
+        new_version.extension = '.ma'
+        DBSession.add(new_version)
+        DBSession.commit()
+        assert self.test_version.full_path == \
+            'tp/SH001/Task1/Task1_TestTake_v001.ma'
+
+        # nothing is changed
+        assert Version.bulk_update_paths([self.test_version, new_version]) \
+            == []
+
+        ft.path = 'projects/{{project.code}}/{{task.nice_name}}'
+        DBSession.commit()
+        version_ids = [self.test_version.id, new_version.id]
+        DBSession.expunge_all()
+
+        moved = Version.bulk_update_paths(version_ids, batch_size=1)
+        assert moved == [
+            (version_ids[0], 'tp/SH001/Task1/Task1_TestTake_v001.ma',
+             'projects/tp/Task1/Task1_TestTake_v001.ma'),
+            (version_ids[1], 'tp/SH001/Task2/Task2_TestTake_v001.ma',
+             'projects/tp/Task2/Task2_TestTake_v001.ma'),
+        ]
+        DBSession.commit()
+        DBSession.expunge_all()
+
+        version = Version.query.get(version_ids[0])
+        assert version.full_path == 'projects/tp/Task1/Task1_TestTake_v001.ma'
+        # the same as update_paths()
+        version.update_paths()
+        version.extension = '.ma'
+        assert version.full_path == 'projects/tp/Task1/Task1_TestTake_v001.ma'
+
     def test_update_paths_will_preserve_extension(self):
         """testing if update_paths method will preserve the extension.
         """
@@ -1093,6 +1222,56 @@ class VersionDBTester(UnitTestDBBase):
         assert new_version4.latest_published_version == new_version4
         assert new_version5.latest_published_version == new_version4
 
+    def test_get_latest_versions_is_working_properly(self):
+        """testing if the get_latest_versions() class method returns the latest
+        and the latest published versions of all the takes of the given tasks
+        """
+        from stalker.db.session import DBSession
+        from stalker import Task, Version
+        test_task2 = Task(name='Task2', parent=self.test_shot1)
+        DBSession.add(test_task2)
+
+        kwargs = dict(self.kwargs)
+        v1 = Version(**kwargs)
+        DBSession.add(v1)
+        DBSession.commit()
+        v2 = Version(**kwargs)
+        DBSession.add(v2)
+        DBSession.commit()
+        v3 = Version(**kwargs)
+        DBSession.add(v3)
+        DBSession.commit()
+
+        kwargs['take_name'] = 'Other'
+        v4 = Version(**kwargs)
+        DBSession.add(v4)
+        DBSession.commit()
+
+        kwargs['task'] = test_task2
+        kwargs['take_name'] = 'TestTake'
+        v5 = Version(**kwargs)
+        DBSession.add(v5)
+        DBSession.commit()
+
+        v2.is_published = True
+        v5.is_published = True
+        DBSession.commit()
+
+        result = Version.get_latest_versions([self.test_task1, test_task2])
+        assert result == {
+            (self.test_task1.id, 'TestTake'): (v3, v2),
+            (self.test_task1.id, 'Other'): (v4, None),
+            (test_task2.id, 'TestTake'): (v5, v5),
+        }
+
+        # with task ids and a take name
+        result = Version.get_latest_versions(
+            [self.test_task1.id], take_name='Other'
+        )
+        assert result == {(self.test_task1.id, 'Other'): (v4, None)}
+
+        assert Version.get_latest_versions([]) == {}
+
     def test_is_latest_published_version_is_working_properly(self):
         """testing if the is_latest_published_version is working properly
         """
@@ -1871,3 +2050,37 @@ class VersionTester(unittest.TestCase):
             '<tp_SH001_Task1_TestTake_v004 (Version)> (Version) and ' \
             '<tp_SH001_Task1_TestTake_v002 (Version)> (Version) creates a ' \
             'circular dependency in their "children" attribute'
+
+
+def test_version_numbers_are_allocated_with_sqlite3(setup_sqlite3):
+    """testing if the version numbers are allocated with the counters table in
+    SQLite3
+    """
+    from stalker import db
+    db.setup()
+    db.init()
+
+    from stalker import Project, Repository, Task, Version
+    from stalker.db.session import DBSession
+    project = Project(
+        name='Test Project',
+        code='TP',
+        repositories=[Repository(name='Test Repository')]
+    )
+    task = Task(name='Test Task', project=project)
+    DBSession.add(task)
+    DBSession.commit()
+
+    version1 = Version(task=task)
+    DBSession.add(version1)
+    DBSession.commit()
+    assert version1.version_number == 1
+
+    # allocated by another client
+    assert Version.allocate_version_number(task, version1.take_name) == 2
+
+    version2 = Version(task=task)
+    assert version2.version_number == 2
+    DBSession.add(version2)
+    DBSession.commit()
+    assert version2.version_number == 3